@@ -0,0 +1,1071 @@
+"""
+Benchmarks for the Mark Drama deck tools. Nothing here needs a display.
+
+Usage:
+    python mark_bench.py parse --scenes 100000
+    python mark_bench.py scan --scenes 100000
+    python mark_bench.py cache
+    python mark_bench.py reload --scenes 100000
+    python mark_bench.py decks --scenes 5000 [--decks 24]
+    python mark_bench.py sequence
+    python mark_bench.py validate --scenes 100000
+    python mark_bench.py pool
+    python mark_bench.py distractors
+    python mark_bench.py engine
+    python mark_bench.py imports [--budget-ms 50]
+    python mark_bench.py windows (needs a display)
+    python mark_bench.py schedule
+    python mark_bench.py history
+    python mark_bench.py grade --scenes 2000
+    python mark_bench.py search --scenes 25000
+    python mark_bench.py latency
+    python mark_bench.py store --scenes 100000
+    python mark_bench.py reveal
+    python mark_bench.py log
+    python mark_bench.py export [--scenes 500]
+    python mark_bench.py bank --scenes 10000
+    python mark_bench.py replay
+
+Time to first window of the real app is printed by: python mark_drama.py --timing [--no-cache]
+
+Every benchmark builds its own synthetic deck in a temporary directory, so the real knowledge base is never touched.
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import mark_deck
+import mark_engine
+import mark_export
+import mark_grade
+import mark_history
+import mark_latency
+import mark_log
+import mark_replay
+import mark_search
+import mark_schedule
+
+PART_NAMES = ["Part One", "Part Two", "Part Three", "Part Four", "Part Five", "Part Six"]
+
+
+def write_synthetic_deck(directory, n_scenes, lines_per_scene=4, name=None):
+    # Write a dialogue file and an event order file with n_scenes unique scenes spread evenly over the six parts.
+    # With a name, the files are named as deck `name` in a deck directory (see mark_deck.find_decks).
+    if name is None:
+        dialogue_path = os.path.join(directory, mark_deck.DIALOGUE_FILE)
+        events_path = os.path.join(directory, mark_deck.EVENT_ORDER_FILE)
+    else:
+        dialogue_path = os.path.join(directory, name + mark_deck.DIALOGUE_SUFFIX)
+        events_path = os.path.join(directory, name + mark_deck.EVENT_ORDER_SUFFIX)
+    per_part = max(1, -(-n_scenes // len(PART_NAMES)))
+    with open(dialogue_path, "w", encoding="utf-8") as dialogue, open(events_path, "w", encoding="utf-8") as events:
+        events.write("=" * 40 + "\n= Synthetic event order\n" + "=" * 40 + "\n")
+        for i in range(n_scenes):
+            if i % per_part == 0:
+                part = PART_NAMES[min(i // per_part, len(PART_NAMES) - 1)]
+                dialogue.write("=" * 40 + f"\n[{part}]\n")
+                events.write(f"\n{part}:\n")
+            dialogue.write(f"- Scene {i}\n")
+            for j in range(lines_per_scene):
+                dialogue.write(f"*Something happens in scene {i}* and Jesus says line {j} of it.\n")
+            dialogue.write("\n")
+            events.write(f" - Scene {i}\n")
+    return dialogue_path, events_path
+
+
+def timed(func, *args, repeat=3):
+    # Best of `repeat` runs, in seconds, plus the last result.
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(name, seconds, count, unit):
+    print(f"  {name:<40} {seconds * 1000:>10.1f} ms   {count / seconds:>14,.0f} {unit}/s")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Deck parsing
+
+def _legacy_parse_dialogue(path):
+    # The original line loop from mark_drama.py, kept here only as a baseline to compare against.
+    entries = {}
+    current_part = None
+    current_event = None
+    with open(path, 'r') as file:
+        for line in file:
+            if line.startswith('=') or not line.strip() or line.startswith("#"):
+                continue
+            elif line.startswith('['):
+                current_part = line.replace('[', "").replace(']', "").strip()
+                entries[current_part] = {}
+            elif line.startswith(' -') or line.startswith('-'):
+                current_event = line.replace("-", "").strip()
+                entries[current_part][current_event] = []
+            else:
+                entries[current_part][current_event].append(line.strip())
+    return entries
+
+
+def _first_record(path):
+    return next(mark_deck.iter_deck_file(path, mark_deck.DIALOGUE))
+
+
+def bench_parse(args):
+    with tempfile.TemporaryDirectory() as directory:
+        dialogue_path, events_path = write_synthetic_deck(directory, args.scenes)
+        size_mb = (os.path.getsize(dialogue_path) + os.path.getsize(events_path)) / 1e6
+        print(f"Parsing a synthetic deck of {args.scenes:,} scenes ({size_mb:.1f} MB)")
+
+        seconds, _ = timed(_legacy_parse_dialogue, dialogue_path)
+        report("legacy dialogue line loop", seconds, args.scenes, "scenes")
+        seconds, _ = timed(mark_deck.compile_dialogue, dialogue_path)
+        report("compile_dialogue", seconds, args.scenes, "scenes")
+        seconds, _ = timed(mark_deck.compile_events, events_path)
+        report("compile_events", seconds, args.scenes, "scenes")
+        seconds, _ = timed(mark_deck.compile_deck, dialogue_path, events_path)
+        report("compile_deck (both files)", seconds, args.scenes, "scenes")
+        seconds, _ = timed(_first_record, dialogue_path)
+        print(f"  {'time to first streamed record':<40} {seconds * 1000:>10.3f} ms")
+
+
+def _streamed_dialogue(path):
+    return mark_deck.build_dialogue(mark_deck.iter_deck_file(path, mark_deck.DIALOGUE))
+
+
+def _streamed_events(path):
+    return mark_deck.build_events(mark_deck.iter_deck_file(path, mark_deck.EVENT_ORDER), {})
+
+
+def bench_scan(args):
+    # The same number of lines each time, in short scenes and long ones.
+    n_lines = args.scenes * 4
+    for lines_per_scene in (1, 4, 40):
+        with tempfile.TemporaryDirectory() as directory:
+            n_scenes = max(1, n_lines // lines_per_scene)
+            dialogue_path, events_path = write_synthetic_deck(directory, n_scenes, lines_per_scene)
+            dialogue_mb = os.path.getsize(dialogue_path) / 1e6
+            events_mb = os.path.getsize(events_path) / 1e6
+            print(f"{n_scenes:,} scenes of {lines_per_scene} lines ({dialogue_mb:.1f} MB of dialogue)")
+            for label, func, path, size_mb in (
+                    ("dialogue, legacy line loop", _legacy_parse_dialogue, dialogue_path, dialogue_mb),
+                    ("dialogue, streamed (iter_deck)", _streamed_dialogue, dialogue_path, dialogue_mb),
+                    ("dialogue, memory-mapped scan", mark_deck.compile_dialogue, dialogue_path, dialogue_mb),
+                    ("events, streamed (iter_deck)", _streamed_events, events_path, events_mb),
+                    ("events, memory-mapped scan", mark_deck.compile_events, events_path, events_mb)):
+                seconds, _ = timed(func, path, repeat=2)
+                print(f"  {label:<40} {seconds * 1000:>10.1f} ms   {size_mb / seconds:>14,.1f} MB/s")
+
+
+def bench_cache(args):
+    with tempfile.TemporaryDirectory() as directory:
+        dialogue_path, events_path = write_synthetic_deck(directory, args.scenes)
+        cache_path = os.path.join(directory, mark_deck.CACHE_FILE)
+        print(f"Loading a synthetic deck of {args.scenes:,} scenes")
+
+        seconds, _ = timed(mark_deck.load_deck, dialogue_path, events_path, cache_path, False)
+        report("load_deck without cache", seconds, args.scenes, "scenes")
+        seconds, _ = timed(mark_deck.load_deck, dialogue_path, events_path, cache_path, repeat=1)
+        report("load_deck, cold (parse + write cache)", seconds, args.scenes, "scenes")
+        seconds, _ = timed(mark_deck.load_deck, dialogue_path, events_path, cache_path)
+        report("load_deck, warm cache", seconds, args.scenes, "scenes")
+        print(f"  {'cache size':<40} {os.path.getsize(cache_path) / 1e6:>10.1f} MB")
+
+        # Touch without editing: the stamp changes, so the content hash has to vouch for the cache.
+        os.utime(dialogue_path)
+        seconds, _ = timed(mark_deck.load_deck, dialogue_path, events_path, cache_path, repeat=1)
+        report("load_deck, touched (hash check)", seconds, args.scenes, "scenes")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Deck memory
+
+def traced_bytes(func, *args):
+    # (bytes still allocated by func's result once it returns, the result), from tracemalloc.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = func(*args)
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0] - before, result
+    finally:
+        tracemalloc.stop()
+
+
+def _legacy_start_mode1(dialogue, parts):
+    # What start_mode1 used to hold: the selected parts copied into mode1_questions and again into remaining_questions.
+    mode1_questions = {}
+    for part in mark_engine.select_parts(dialogue, parts).values():
+        mode1_questions.update(part)
+    return mode1_questions, dict(mode1_questions)
+
+
+def _dict_session(dialogue, parts):
+    # A flashcard session before DialogueStore: one merged dict of the selected parts, plus a QuestionPool of names.
+    questions = {}
+    for part in mark_engine.select_parts(dialogue, parts).values():
+        questions.update(part)
+    return questions, mark_engine.QuestionPool(questions)
+
+
+def _same_cards(dialogue, selections):
+    # Whether flashcard sessions over a DialogueStore ask the cards merging the selected parts' dicts in order gave:
+    # the same names in the same order, each with the same lines.
+    store = mark_deck.DialogueStore(dialogue)
+    for parts in selections:
+        merged = _legacy_start_mode1(dialogue, parts)[0]
+        session = mark_engine.FlashcardSession(store, parts)
+        if [(store.names[i], store.lines(i)) for i in session.questions] != list(merged.items()):
+            return False
+    return True
+
+
+def _with_repeated_name(dialogue):
+    # A copy of dialogue with the first scene of the first part also in the last part, with different lines.
+    first_part, *_, last_part = dialogue
+    scene = next(iter(dialogue[first_part]))
+    copy = {part: dict(scenes) for part, scenes in dialogue.items()}
+    copy[last_part][scene] = ["The same scene name again, with other lines."]
+    return copy
+
+
+def _store_only(dialogue_path):
+    # A DialogueStore with nothing else holding on to the deck it was built from.
+    return mark_deck.DialogueStore(mark_deck.compile_dialogue(dialogue_path))
+
+
+def bench_store(args):
+    parts = list(range(1, len(PART_NAMES) + 1))
+    with tempfile.TemporaryDirectory() as directory:
+        dialogue_path, _ = write_synthetic_deck(directory, args.scenes)
+        print(f"Memory held for a synthetic deck of {args.scenes:,} scenes, from tracemalloc")
+        # The store on its own first, while nothing else holds the (interned) scene names.
+        store_bytes = traced_bytes(_store_only, dialogue_path)[0]
+        dict_bytes, dialogue = traced_bytes(mark_deck.compile_dialogue, dialogue_path)
+        print(f"  {'dialogue dict of lists of str':<40} {dict_bytes / 1e6:>10.1f} MB")
+        print(f"  {'DialogueStore on its own':<40} {store_bytes / 1e6:>10.1f} MB")
+        shared_bytes, store = traced_bytes(mark_deck.DialogueStore, dialogue)
+        print(f"  {'DialogueStore next to the dict':<40} {shared_bytes / 1e6:>10.1f} MB   (scene names shared)")
+        selections = [[1], [len(PART_NAMES)], [1, len(PART_NAMES)], parts]
+        for label, deck in (("", dialogue), (", a name in two parts", _with_repeated_name(dialogue))):
+            same = _same_cards(deck, selections)
+            print(f"  same cards as the merged dicts{label}: {same}")
+            if not same:
+                sys.exit("DialogueStore sessions ask different cards from the merged dicts of the selected parts")
+
+        print("Memory held per flashcard session over every part")
+        legacy_bytes = traced_bytes(_legacy_start_mode1, dialogue, parts)[0]
+        print(f"  {'start_mode1, two dict copies':<40} {legacy_bytes / 1e6:>10.1f} MB")
+        dict_session_bytes = traced_bytes(_dict_session, dialogue, parts)[0]
+        print(f"  {'merged dict + QuestionPool':<40} {dict_session_bytes / 1e6:>10.1f} MB")
+        session_bytes = traced_bytes(mark_engine.FlashcardSession, store, parts)[0]
+        print(f"  {'FlashcardSession, ids into the store':<40} {session_bytes / 1e6:>10.1f} MB")
+
+        seconds, _ = timed(mark_deck.DialogueStore, dialogue)
+        report("DialogueStore build", seconds, args.scenes, "scenes")
+        seconds, _ = timed(_dict_session, dialogue, parts)
+        report("session start, merged dict + QuestionPool", seconds, args.scenes, "scenes")
+        seconds, _ = timed(mark_engine.FlashcardSession, store, parts)
+        report("session start, FlashcardSession", seconds, args.scenes, "scenes")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Revealing flashcard answers
+
+def _legacy_reveals(dialogue, n_reveals):
+    # The old reveal_mode1_answer: the answer rebuilt line by line with += on every reveal.
+    scenes = [lines for part in dialogue.values() for lines in part.values()]
+    for i in range(n_reveals):
+        correct_answer = ""
+        for line in scenes[i % len(scenes)]:
+            correct_answer += f"{line}\n"
+        if correct_answer[0].strip() == "":
+            correct_answer = "blank"
+
+
+def _store_reveals(store, n_reveals):
+    for i in range(n_reveals):
+        store.reveal_text(i % len(store))
+
+
+def bench_reveal(args):
+    n_reveals = 200
+    for lines_per_scene in (10, 1_000, 10_000):
+        dialogue = {"Part One": {f"Scene {i}": [f"*Something happens in scene {i}* and Jesus says line {j} of it."
+                                                for j in range(lines_per_scene)] for i in range(20)}}
+        store = mark_deck.DialogueStore(dialogue)
+        print(f"Revealing {n_reveals} answers of {lines_per_scene:,} lines")
+        seconds, _ = timed(_legacy_reveals, dialogue, n_reveals)
+        report("rebuilt with += every reveal", seconds, n_reveals, "reveals")
+        print(f"  {'  per reveal':<40} {seconds / n_reveals * 1000:>10.3f} ms")
+        seconds, _ = timed(_store_reveals, store, n_reveals)
+        report("DialogueStore.reveal_text", seconds, n_reveals, "reveals")
+        print(f"  {'  per reveal':<40} {seconds / n_reveals * 1000:>10.3f} ms")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Multiple choice sessions
+
+def _legacy_mode2_session(scenes, rng):
+    # What a full multiple-choice session cost with list.index lookups, slicing and pop(index).
+    event_sequence = list(scenes)
+    remaining = list(scenes)
+    while remaining:
+        question = rng.choice(remaining[1:-1]) if len(remaining) > 2 else remaining[0]
+        after = event_sequence.index(question) + 1
+        answer = event_sequence[min(after, len(event_sequence) - 1)]
+        event_sequence[max(0, min(event_sequence.index(answer) + rng.randint(-3, 3), len(event_sequence) - 1))]
+        remaining.pop(remaining.index(question))
+
+
+def _indexed_mode2_session(scenes, rng):
+    sequence = mark_engine.EventSequence(scenes)
+    while sequence.remaining:
+        question = sequence.random_remaining(rng)
+        answer = sequence.after(question) or sequence.before(question)
+        sequence.clamped(sequence.index(answer) + rng.randint(-3, 3))
+        sequence.remove(question)
+
+
+def bench_sequence(args):
+    rng = random.Random(0)
+    print("Full multiple-choice sessions, every answer correct")
+    for n in sorted({1_000, 10_000, args.scenes}):
+        scenes = [f"Scene {i}" for i in range(n)]
+        if n <= 10_000:
+            seconds, _ = timed(_legacy_mode2_session, scenes, rng, repeat=1)
+            report(f"list.index, {n:,} events", seconds, n, "questions")
+        seconds, _ = timed(_indexed_mode2_session, scenes, rng, repeat=1)
+        report(f"EventSequence, {n:,} events", seconds, n, "questions")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Remaining question pools
+
+def _legacy_mode1_session(scenes, rng):
+    remaining = dict.fromkeys(scenes)
+    while remaining:
+        remaining.pop(rng.choice(list(remaining.keys())))
+
+
+def _pool_mode1_session(scenes, rng):
+    pool = mark_engine.QuestionPool(scenes)
+    while pool:
+        pool.remove(pool.draw(rng))
+
+
+def _pool_ordered_session(scenes, rng):
+    pool = mark_engine.QuestionPool(scenes)
+    while pool:
+        pool.remove(pool.first())
+
+
+def bench_pool(args):
+    rng = random.Random(0)
+    print("Full flashcard sessions, every answer correct")
+    for n in sorted({1_000, 10_000, args.scenes}):
+        scenes = [f"Scene {i}" for i in range(n)]
+        if n <= 10_000:
+            seconds, _ = timed(_legacy_mode1_session, scenes, rng, repeat=1)
+            report(f"list(keys) + random.choice, {n:,} cards", seconds, n, "questions")
+        seconds, _ = timed(_pool_mode1_session, scenes, rng)
+        report(f"QuestionPool.draw, {n:,} cards", seconds, n, "questions")
+        seconds, _ = timed(_pool_ordered_session, scenes, rng)
+        report(f"QuestionPool.first, {n:,} cards", seconds, n, "questions")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Multiple choice distractors
+
+def _legacy_options(sequence, question, correct, rng):
+    # The old rejection-sampling loop from update_mode2_question.
+    four_options = [correct]
+    sneaky = 0
+    while len(four_options) < 4:
+        if sneaky >= 2:
+            _new = rng.choice(sequence)
+        else:
+            _new = sequence.clamped(sequence.index(correct) + rng.randint(-3, 3))
+            sneaky += 1
+        if _new not in four_options and _new not in question:
+            four_options.append(_new)
+    rng.shuffle(four_options)
+    return four_options
+
+
+def _generate_options(generate, sequence, questions, rng):
+    for question, correct in questions:
+        generate(sequence, question, correct, rng)
+
+
+def bench_distractors(args):
+    rng = random.Random(0)
+    rounds = 20_000
+    print(f"Generating options for {rounds:,} questions")
+    for n, label in ((args.scenes, "whole deck"), (6, "tiny part selection")):
+        # Long, similar names so the old substring check has work to do.
+        sequence = mark_engine.EventSequence(f"Jesus heals somebody in scene {i}" for i in range(n))
+        engine = mark_engine.DistractorEngine(sequence)
+        questions = []
+        for _ in range(rounds):
+            question = sequence[rng.randrange(n - 1)]
+            questions.append((question, sequence.after(question)))
+
+        seconds, _ = timed(_generate_options, _legacy_options, sequence, questions, rng)
+        report(f"rejection loop, {label}", seconds, rounds, "questions")
+        for n_options in (4, 5):
+            if n_options <= engine.max_options():
+                generate = lambda seq, q, c, r, k=n_options: engine.options(q, c, k, r)
+                seconds, _ = timed(_generate_options, generate, sequence, questions, rng)
+                report(f"DistractorEngine x{n_options}, {label}", seconds, rounds, "questions")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Headless engine
+
+def synthetic_engine(n_scenes, lines_per_scene=4):
+    # A QuizEngine over an in-memory synthetic deck, no files involved.
+    dialogue_lines = []
+    event_lines = []
+    per_part = max(1, -(-n_scenes // len(PART_NAMES)))
+    for i in range(n_scenes):
+        if i % per_part == 0:
+            part = PART_NAMES[min(i // per_part, len(PART_NAMES) - 1)]
+            dialogue_lines.append(f"[{part}]\n")
+            event_lines.append(f"{part}:\n")
+        dialogue_lines.append(f"- Scene {i}\n")
+        dialogue_lines.extend(f"*Something happens in scene {i}* and Jesus says line {j} of it.\n"
+                              for j in range(lines_per_scene))
+        event_lines.append(f" - Scene {i}\n")
+    duplicates = {}
+    events = mark_deck.build_events(mark_deck.iter_deck(event_lines, mark_deck.EVENT_ORDER), duplicates)
+    dialogue = mark_deck.build_dialogue(mark_deck.iter_deck(dialogue_lines, mark_deck.DIALOGUE))
+    return mark_engine.QuizEngine(dialogue, events, duplicates)
+
+
+def _simulate_answers(engine, n_answers, rng, multiple_choice=True):
+    # Play sessions back to back until n_answers have been graded, answering correctly about 70% of the time.
+    parts = list(range(1, len(PART_NAMES) + 1))
+    session = None
+    for _ in range(n_answers):
+        if session is None or session.finished:
+            if multiple_choice:
+                session = engine.start_multiple_choice(parts, ordered=False, direction=None, rng=rng)
+            else:
+                session = engine.start_flashcards(parts, ordered=False, rng=rng)
+        question = session.next_question()
+        if multiple_choice:
+            session.answer(question.correct_index if rng.random() < 0.7 else rng.randrange(len(question.options)))
+        else:
+            session.mark(rng.random() < 0.7)
+
+
+def bench_engine(args):
+    rng = random.Random(0)
+    n_answers = 200_000
+    engine = synthetic_engine(min(args.scenes, 10_000))
+    print(f"Simulated answers through the headless engine ({n_answers:,} per run)")
+    for label, multiple_choice in (("multiple choice", True), ("flashcards", False)):
+        seconds, _ = timed(_simulate_answers, engine, n_answers, rng, multiple_choice, repeat=1)
+        report(label, seconds, n_answers, "answers")
+        print(f"  {label + ', per minute':<40} {'':>13} {n_answers / seconds * 60:>14,.0f} answers/min")
+    print(f"  tkinter imported: {'tkinter' in sys.modules}")
+
+
+def _start_sessions(start, n_sessions):
+    for _ in range(n_sessions):
+        start().next_question()
+
+
+def _ask_questions(start, n_questions):
+    # Every question answered right, so each session asks each scene once, then the next one starts.
+    session = start()
+    for _ in range(n_questions):
+        if session.finished:
+            session = start()
+        question = session.next_question()
+        session.answer(question.correct_index)
+
+
+def bench_bank(args):
+    parts = list(range(1, len(PART_NAMES) + 1))
+    n_questions = 100_000
+    print("Multiple choice from a precomputed question bank vs generated live")
+    for n_scenes in sorted({84, min(args.scenes, 10_000)}):
+        engine = synthetic_engine(n_scenes)
+        seconds, _ = timed(engine.question_bank, parts, repeat=1)
+        print(f"  {n_scenes:,} scenes: bank built once in {seconds * 1000:.1f} ms")
+        n_sessions = max(10, 200_000 // n_scenes)
+
+        def live():
+            return mark_engine.MultipleChoiceSession(engine.events, parts, False, None, 4, rng,
+                                                     engine.duplicate_scenes)
+
+        def banked():
+            return engine.start_multiple_choice(parts, False, None, 4, rng)
+
+        for label, start in (("live", live), ("bank", banked)):
+            rng = random.Random(0)
+            seconds, _ = timed(_start_sessions, start, n_sessions)
+            report(f"start + first question, {label}", seconds, n_sessions, "starts")
+            rng = random.Random(0)
+            seconds, _ = timed(_ask_questions, start, n_questions, repeat=1)
+            report(f"ask + answer, {label}", seconds, n_questions, "questions")
+
+
+def _record_sessions(engine, n_sessions, rng):
+    # Seeded sessions played to the end, answering right about 70% of the time, as recordings.
+    parts = list(range(1, len(PART_NAMES) + 1))
+    recordings = []
+    for number in range(n_sessions):
+        if number % 2:
+            session = engine.start_multiple_choice(parts, ordered=False, direction=None, seed=rng.getrandbits(63))
+            while not session.finished:
+                question = session.next_question()
+                session.answer(question.correct_index if rng.random() < 0.7 else rng.randrange(len(question.options)))
+        else:
+            session = engine.start_flashcards(parts, ordered=False, seed=rng.getrandbits(63))
+            while not session.finished:
+                session.next_question()
+                session.mark(rng.random() < 0.7)
+        recordings.append(session.recording)
+    return recordings
+
+
+def bench_replay(args):
+    engine = synthetic_engine(min(args.scenes, 500))
+    recordings = _record_sessions(engine, 20, random.Random(0))
+    answers = sum(len(recording) for recording in recordings)
+    n_runs = 7
+    print(f"Replaying {len(recordings)} recorded sessions ({answers:,} answers), {n_runs} runs")
+    runs = []
+    for _ in range(n_runs):
+        seconds, failures = mark_replay.replay_all(engine, recordings)
+        if failures:
+            raise SystemExit(f"Replay played out differently: {failures[0][1]}")
+        runs.append(seconds)
+    runs.sort()
+    report("best run", runs[0], answers, "answers")
+    report("median run", runs[n_runs // 2], answers, "answers")
+    print(f"  spread (worst / best): {runs[-1] / runs[0]:.2f}x")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Quiz sheets
+
+def bench_export(args):
+    engine = synthetic_engine(min(args.scenes, 500))
+    deck = (engine.dialogue, engine.events, engine.duplicate_scenes)
+    n_sheets = 5_000
+    print(f"Quiz sheet export, {n_sheets:,} sheets of 10 multiple choice + 5 written ({os.cpu_count()} CPUs)")
+    with tempfile.TemporaryDirectory() as directory:
+        outputs = {}
+        for label, processes in (("in process", 1), ("process pool", None)):
+            out = os.path.join(directory, str(processes))
+            seconds, _ = timed(mark_export.export_sheets, deck, out, n_sheets, "text", range(1, 7), 10, 5, None, 0,
+                               processes, repeat=1)
+            report(label, seconds, n_sheets, "sheets")
+            with open(os.path.join(out, "answers.txt"), "rb") as file:
+                outputs[label] = file.read()
+        print(f"  same sheets either way: {len(set(outputs.values())) == 1}")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Spaced repetition
+
+def _scheduled_session(engine, scheduler, rng):
+    session = engine.start_flashcards(list(range(1, len(PART_NAMES) + 1)), scheduler=scheduler)
+    answers = 0
+    while session.next_question() is not None:
+        session.mark(rng.random() < 0.7)
+        answers += 1
+    return answers
+
+
+def bench_schedule(args):
+    rng = random.Random(0)
+    print("Full spaced repetition flashcard sessions, 70% right")
+    for n in sorted({1_000, 10_000, args.scenes}):
+        engine = synthetic_engine(n, lines_per_scene=1)
+        # A fake clock that moves a few seconds per answer, so wrong cards really do come back later.
+        clock = iter(range(0, 10 ** 9, 5)).__next__
+        with tempfile.TemporaryDirectory() as directory:
+            scheduler = mark_schedule.Scheduler(os.path.join(directory, mark_schedule.USER_DATA_FILE), clock)
+            # Studying ahead, so every session goes on until each card has been got right rather than stopping at the
+            # first one that isn't due yet.
+            scheduler.study_ahead = True
+            seconds, answers = timed(_scheduled_session, engine, scheduler, rng, repeat=1)
+            report(f"first session, {n:,} cards", seconds, answers, "answers")
+            seconds, answers = timed(_scheduled_session, engine, scheduler, rng, repeat=1)
+            report(f"second session, {n:,} cards", seconds, answers, "answers")
+            seconds, _ = timed(scheduler.save, repeat=1)
+            report(f"save user_data, {n:,} cards", seconds, n, "cards")
+            seconds, _ = timed(mark_schedule.Scheduler.load, scheduler.path)
+            report(f"load user_data, {n:,} cards", seconds, n, "cards")
+
+
+def _edit_one_part(dialogue_path, events_path, edit):
+    # Rename the first scene of the last part in both files, the way a quick fix in Notepad would.
+    last_scene = f"Scene {edit}"
+    for path in (dialogue_path, events_path):
+        with open(path, "r", encoding="utf-8") as file:
+            text = file.read()
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text.replace(f"- {last_scene}\n", f"- {last_scene} (edited)\n", 1))
+
+
+def bench_reload(args):
+    with tempfile.TemporaryDirectory() as directory:
+        dialogue_path, events_path = write_synthetic_deck(directory, args.scenes)
+        cache_path = os.path.join(directory, mark_deck.CACHE_FILE)
+        print(f"Reloading a synthetic deck of {args.scenes:,} scenes after one part is edited")
+        dialogue, events, duplicates = mark_deck.load_deck(dialogue_path, events_path, cache_path)
+        engine = mark_engine.QuizEngine(dialogue, events, duplicates)
+        session = engine.start_multiple_choice(list(range(1, 7)), rng=random.Random(1))
+
+        seconds, watcher = timed(mark_deck.DeckWatcher, dialogue, events, duplicates, dialogue_path, events_path,
+                                 cache_path, repeat=1)
+        report("DeckWatcher start (read + split)", seconds, args.scenes, "scenes")
+        seconds, _ = timed(watcher.poll)
+        report("poll, nothing changed", seconds, 1, "polls")
+        # What the app does at startup: the watcher from the load's own stamps and hashes, no second read.
+        seconds, _ = timed(mark_deck.load_deck, dialogue_path, events_path, cache_path)
+        report("load_deck, warm cache", seconds, args.scenes, "scenes")
+        seconds, (_, seeded) = timed(mark_deck.load_watched_deck, dialogue_path, events_path, cache_path)
+        report("load_watched_deck, warm cache", seconds, args.scenes, "scenes")
+        # And once the window is up, on a thread of its own.
+        _, prepared = mark_deck.load_watched_deck(dialogue_path, events_path, cache_path)
+        seconds, _ = timed(prepared.prepare, repeat=1)
+        report("DeckWatcher.prepare (read + split)", seconds, args.scenes, "scenes")
+
+        # Restart-style reload: parse everything again, then build a new session.
+        edit = args.scenes - 1
+        _edit_one_part(dialogue_path, events_path, edit)
+        seconds, _ = timed(mark_deck.compile_deck, dialogue_path, events_path, repeat=1)
+        report("full re-parse (restart)", seconds, args.scenes, "scenes")
+
+        _edit_one_part(dialogue_path, events_path, edit)
+        seconds, changes = timed(watcher.poll, repeat=1)
+        report(f"poll, re-parse {', '.join(changes[mark_deck.DIALOGUE])} only", seconds, args.scenes, "scenes")
+        seconds, changes = timed(prepared.poll, repeat=1)
+        report(f"first poll, prepared ({', '.join(changes[mark_deck.DIALOGUE])} only)", seconds, args.scenes, "scenes")
+        seconds, changes = timed(seeded.poll, repeat=1)
+        report(f"first poll, unprepared ({', '.join(changes[mark_deck.DIALOGUE])}, whole file)", seconds,
+               args.scenes, "scenes")
+        seconds, _ = timed(engine.reload_session, session, repeat=1)
+        report("reload_session (patch the pools)", seconds, args.scenes, "scenes")
+
+
+def _load_decks_one_by_one(directory, use_cache):
+    return {name: mark_deck.load_deck(dialogue_path, events_path, mark_deck.deck_cache_path(directory, name), use_cache)
+            for name, (dialogue_path, events_path) in mark_deck.find_decks(directory).items()}
+
+
+def _load_decks_in_background(directory, use_cache):
+    # Poll like the title screen does and keep the longest time a single poll held up the caller.
+    loader = mark_deck.DeckLoader(directory, use_cache).start()
+    longest_poll = 0
+    while not loader.finished:
+        start = time.perf_counter()
+        loader.poll()
+        longest_poll = max(longest_poll, time.perf_counter() - start)
+        time.sleep(0.005)
+    return longest_poll
+
+
+def bench_decks(args):
+    with tempfile.TemporaryDirectory() as directory:
+        for i in range(args.decks):
+            write_synthetic_deck(directory, args.scenes, name=f"course_{i:02}")
+        print(f"Loading a directory of {args.decks} decks of {args.scenes:,} scenes each")
+        n_scenes = args.decks * args.scenes
+
+        seconds, _ = timed(_load_decks_one_by_one, directory, False, repeat=1)
+        report("one by one, no cache", seconds, n_scenes, "scenes")
+        seconds, longest_poll = timed(_load_decks_in_background, directory, False, repeat=1)
+        report("DeckLoader, no cache", seconds, n_scenes, "scenes")
+        print(f"  {'  longest the UI thread waited on a poll':<40} {longest_poll * 1000:>10.3f} ms")
+
+        _load_decks_one_by_one(directory, True)
+        seconds, _ = timed(_load_decks_one_by_one, directory, True)
+        report("one by one, warm cache", seconds, n_scenes, "scenes")
+        seconds, longest_poll = timed(_load_decks_in_background, directory, True)
+        report("DeckLoader, warm cache", seconds, n_scenes, "scenes")
+        print(f"  {'  longest the UI thread waited on a poll':<40} {longest_poll * 1000:>10.3f} ms")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Auto-grading typed answers
+
+def _difflib_grades(answers):
+    # The obvious way without an index: compare the answer with the scene's whole text character by character.
+    import difflib
+    for scene, text, answer in answers:
+        difflib.SequenceMatcher(None, answer.lower(), text.lower()).ratio()
+
+
+def _index_grades(index, answers):
+    for scene, text, answer in answers:
+        index.grade(scene, text, answer)
+
+
+def bench_grade(args):
+    # Long speeches: 40 lines a scene.
+    engine = synthetic_engine(args.scenes, lines_per_scene=40)
+    scenes = [(scene, lines) for part in engine.dialogue.values() for scene, lines in part.items()]
+    rng = random.Random(1)
+    # Half the answers are the whole speech, half a few lines of it.
+    answers = [(scene, "\n".join(lines), " ".join(lines if i % 2 else rng.sample(lines, 3)))
+               for i, (scene, lines) in enumerate(rng.sample(scenes, min(200, len(scenes))))]
+    print(f"Grading {len(answers)} typed answers against a deck of {len(scenes):,} scenes of 40 lines")
+
+    seconds, index = timed(mark_grade.AnswerIndex, engine.dialogue, repeat=1)
+    report("AnswerIndex build (once per deck)", seconds, len(scenes), "scenes")
+    seconds, _ = timed(_difflib_grades, answers[:20], repeat=1)
+    report("difflib ratio per answer, no index", seconds, 20, "answers")
+    print(f"  {'  per answer':<40} {seconds / 20 * 1000:>10.3f} ms")
+    seconds, _ = timed(_index_grades, index, answers)
+    report("AnswerIndex.grade", seconds, len(answers), "answers")
+    print(f"  {'  per answer':<40} {seconds / len(answers) * 1000:>10.3f} ms")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Search
+
+def _scan_search(dialogue, query):
+    # Without an index: every line of every scene, checked for every word of the query.
+    query_words = query.lower().split()
+    return [(part, scene) for part, scenes in dialogue.items() for scene, lines in scenes.items()
+            if all(any(word in line.lower() for line in lines) or word in scene.lower() for word in query_words)]
+
+
+def bench_search(args):
+    engine = synthetic_engine(args.scenes)
+    n_lines = sum(len(lines) for scenes in engine.dialogue.values() for lines in scenes.values())
+    print(f"Searching a synthetic deck of {args.scenes:,} scenes, {n_lines:,} lines")
+    seconds, index = timed(mark_search.SearchIndex, engine.dialogue, repeat=1)
+    report("SearchIndex build (once per deck)", seconds, n_lines, "lines")
+
+    queries = [f"scene {args.scenes // 2}", "jesus says line 3", "somethi"]
+    for query in queries:
+        seconds, results = timed(index.search, query)
+        report(f"search {query!r} ({len(results)} shown)", seconds, 1, "queries")
+    seconds, results = timed(_scan_search, engine.dialogue, queries[0], repeat=1)
+    report(f"line scan {queries[0]!r}, no index", seconds, 1, "queries")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Callback instrumentation
+
+class _Callbacks:
+    def next_question(self):
+        return None
+
+
+def _call_repeatedly(callback, n_calls):
+    for _ in range(n_calls):
+        callback()
+
+
+def bench_latency(args):
+    n_calls = 1_000_000
+    print(f"Calling a do-nothing callback {n_calls:,} times")
+    plain = _Callbacks()
+    seconds, _ = timed(_call_repeatedly, plain.next_question, n_calls)
+    report("not instrumented", seconds, n_calls, "calls")
+    baseline = seconds
+
+    instrumented = _Callbacks()
+    recorder = mark_latency.LatencyRecorder()
+    recorder.instrument(instrumented, ["next_question"])
+    seconds, _ = timed(_call_repeatedly, instrumented.next_question, n_calls)
+    report("instrumented", seconds, n_calls, "calls")
+    print(f"  {'  overhead per call':<40} {(seconds - baseline) / n_calls * 1e6:>10.3f} us")
+    histogram = recorder.histograms["next_question"]
+    print(f"  {'  histogram memory':<40} {len(histogram.buckets):>10} buckets, whatever the number of calls")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Diagnostics
+
+def _print_entries(n_entries):
+    for i in range(n_entries):
+        print(f"{i} remaining questions")
+
+
+def _log_entries(log, n_entries):
+    for i in range(n_entries):
+        log.debug("question", "{remaining} remaining questions", remaining=i)
+
+
+def bench_log(args):
+    n_entries = 200_000
+    print(f"Writing {n_entries:,} per-question entries")
+    with contextlib.redirect_stdout(io.StringIO()):
+        seconds, _ = timed(_print_entries, n_entries)
+    report("print() (what the question loop used to do)", seconds, n_entries, "entries")
+
+    log = mark_log.EventLog(mark_log.INFO, [mark_log.ConsoleSink(io.StringIO())])
+    seconds, _ = timed(_log_entries, log, n_entries)
+    report("log.debug, debug switched off", seconds, n_entries, "entries")
+
+    log.set_level(mark_log.DEBUG)
+    seconds, _ = timed(_log_entries, log, n_entries)
+    report("log.debug to the console", seconds, n_entries, "entries")
+
+    with tempfile.TemporaryDirectory() as directory:
+        sink = mark_log.JsonLinesSink(os.path.join(directory, mark_log.LOG_FILE))
+        log = mark_log.EventLog(mark_log.DEBUG, [sink])
+        seconds, _ = timed(_log_entries, log, n_entries)
+        log.close()
+    report("log.debug to a JSON-lines file", seconds, n_entries, "entries")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Answer history
+
+def _unbuffered_history(path, answers):
+    # One open + write per answer, what logging straight from the grading code would cost.
+    for mode, scene, correct, asked, answered in answers:
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(json.dumps({"mode": mode, "scene": scene, "correct": correct, "asked": asked,
+                                   "answered": answered, "ms": round((answered - asked) * 1000)}) + "\n")
+
+
+def _buffered_history(log, answers):
+    for answer in answers:
+        log.record(*answer)
+
+
+def bench_history(args):
+    n_answers = 50_000
+    now = time.time()
+    answers = [(mark_engine.FLASHCARDS, f"Scene {i % 1000}", i % 3 != 0, now + i, now + i + 2.5)
+               for i in range(n_answers)]
+    print(f"Logging {n_answers:,} answers")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, mark_history.HISTORY_FILE)
+        seconds, _ = timed(_unbuffered_history, path, answers, repeat=1)
+        report("write per answer, on the grading thread", seconds, n_answers, "answers")
+        os.remove(path)
+
+        log = mark_history.HistoryLog(path)
+        seconds, _ = timed(_buffered_history, log, answers, repeat=1)
+        report("HistoryLog.record, on the grading thread", seconds, n_answers, "answers")
+        seconds, _ = timed(log.close, repeat=1)
+        report("HistoryLog.close (drain the writer)", seconds, n_answers, "answers")
+
+        # Everything is "old" a year from now.
+        seconds, (rolled_up, _) = timed(mark_history.compact, path, 30, now + 365 * 24 * 60 * 60, repeat=1)
+        report(f"compact into {os.path.getsize(path) / 1000:.0f} kB of totals", seconds, rolled_up, "answers")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Startup imports
+
+# tkinter is listed for scale, it's what the non-GUI modules avoid paying for.
+IMPORT_TARGETS = ["mark_log", "mark_deck", "mark_engine", "mark_drama", "tkinter"]
+
+
+def import_times(module):
+    # Run `python -X importtime -c "import module"` in a fresh interpreter.
+    # Returns the module's cumulative import time and {direct or indirect import: cumulative us} for what it pulled in.
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=here, capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        indent = len(name) - len(name.lstrip())
+        entries.append((indent, name.strip(), int(cumulative_us)))
+    # Imports are reported as they finish, so everything the module pulled in is listed just before it, indented deeper.
+    position = max(i for i, (_, name, _) in enumerate(entries) if name == module)
+    module_indent = entries[position][0]
+    children = {}
+    for indent, name, cumulative_us in reversed(entries[:position]):
+        if indent <= module_indent:
+            break
+        children[name] = cumulative_us
+    return entries[position][2], children
+
+
+def bench_imports(args):
+    print("Cold import cost of each module, from python -X importtime (fresh interpreter per module)")
+    over_budget = []
+    for module in IMPORT_TARGETS:
+        total_us, children = import_times(module)
+        total_ms = total_us / 1000
+        heaviest = sorted(((cumulative, name) for name, cumulative in children.items()), reverse=True)[:3]
+        print(f"  {module:<20} {total_ms:>8.1f} ms   tkinter: {'yes' if 'tkinter' in children else 'no':<4}"
+              f"heaviest: {', '.join(f'{name} {cumulative / 1000:.1f} ms' for cumulative, name in heaviest) or '-'}")
+        if args.budget_ms is not None and total_ms > args.budget_ms:
+            over_budget.append(module)
+    if over_budget:
+        sys.exit(f"Over the {args.budget_ms} ms import budget: {', '.join(over_budget)}")
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Mode windows
+
+def _session_start_latencies(game, start, window_attr, n_sessions):
+    # Time start() up to the point the window has been drawn, then close it the way a finished session does.
+    latencies = []
+    for _ in range(n_sessions):
+        begin = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start()
+        game.root.update()
+        latencies.append(time.perf_counter() - begin)
+        game.close_mode_window(getattr(game, window_attr))
+        game.root.update()
+    return latencies
+
+
+def bench_windows(args):
+    import mark_drama
+    tk = mark_drama.load_tk()
+    try:
+        root = tk.Tk()
+    except tk.TclError as error:
+        print(f"Skipped, Tk can't open a window here: {error}")
+        return
+    root.withdraw()
+    engine = synthetic_engine(min(args.scenes, 1_000))
+    n_sessions = 100
+    print(f"Session start latency over {n_sessions} consecutive sessions (first session / median / p95 of the rest)")
+    for reuse in (False, True):
+        game = mark_drama.MarkDramaFlashcards(None, engine.dialogue, engine.events, engine.duplicate_scenes)
+        game.show(tk.Toplevel(root))
+        game.reuse_mode_windows = reuse
+        game.parts_to_include = [1, 2, 3]
+        for label, start, window_attr in (("flashcards", game.start_mode1, "mode1_window"),
+                                          ("multiple choice", game.start_mode2, "mode2_window")):
+            first, *rest = _session_start_latencies(game, start, window_attr, n_sessions)
+            rest.sort()
+            print(f"  {label + (', reused window' if reuse else ', new window'):<40} {first * 1000:>8.2f} ms"
+                  f" {rest[len(rest) // 2] * 1000:>8.2f} ms {rest[len(rest) * 95 // 100] * 1000:>8.2f} ms")
+        game.root.destroy()
+    root.destroy()
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Duplicate scene validation
+
+def _event_order_lines(n_scenes, n_duplicates):
+    lines = []
+    per_part = max(1, -(-n_scenes // len(PART_NAMES)))
+    for i in range(n_scenes):
+        if i % per_part == 0:
+            lines.append(f"{PART_NAMES[min(i // per_part, len(PART_NAMES) - 1)]}:\n")
+        # The last n_duplicates scenes reuse names from the start of the deck.
+        lines.append(f" - Scene {i if i < n_scenes - n_duplicates else i - (n_scenes - n_duplicates)}\n")
+    return lines
+
+
+def _validate(path):
+    # The load path: compile_deck's compile_events, the memory-mapped scan plus find_duplicate_scenes, and the
+    # streaming parser on top when there are duplicates to report with line numbers.
+    duplicates = {}
+    mark_deck.compile_events(path, duplicates)
+    return duplicates
+
+
+def _legacy_validate(lines):
+    event_sequence = [line.strip()[2:] for line in lines if line.startswith(" -")]
+    if any([event_sequence.count(i) >= 2 for i in event_sequence]):
+        return list(i for i in event_sequence if event_sequence.count(i) >= 2)
+
+
+LINEAR_GROWTH_LIMIT = 2.0  # Cost per scene at 4x the scenes, over the cost at 1x, that counts as not linear
+
+
+def bench_validate(args):
+    # Exits with an error if validation stops scaling linearly, so it can gate a change.
+    sizes = [args.scenes // 4, args.scenes // 2, args.scenes]
+    not_linear = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "events.txt")
+        for n_duplicates, label in ((0, "no duplicates"), (10, "10 duplicated scenes")):
+            print(f"Event order load + duplicate scene validation, {label}")
+            per_scene = []
+            for n in sizes:
+                with open(path, "w", encoding="utf-8") as file:
+                    file.writelines(_event_order_lines(n, n_duplicates))
+                seconds, duplicates = timed(_validate, path)
+                assert len(duplicates) == n_duplicates, duplicates
+                report(f"compile_events, {n:,} scenes", seconds, n, "scenes")
+                per_scene.append(seconds / n)
+            # Linear means the cost per scene stays flat as the deck grows. Quadratic would roughly quadruple it.
+            growth = per_scene[-1] / per_scene[0]
+            linear = growth < LINEAR_GROWTH_LIMIT
+            print(f"  cost per scene at {sizes[-1]:,} vs {sizes[0]:,} scenes: x{growth:.2f} "
+                  f"({'linear' if linear else 'NOT linear'})")
+            if not linear:
+                not_linear.append(label)
+    legacy_n = 2_000
+    seconds, _ = timed(_legacy_validate, _event_order_lines(legacy_n, 10), repeat=1)
+    report(f"list.count, {legacy_n:,} scenes (for scale)", seconds, legacy_n, "scenes")
+    if not_linear:
+        sys.exit(f"Validation doesn't scale linearly ({', '.join(not_linear)}): cost per scene grew by "
+                 f"{LINEAR_GROWTH_LIMIT}x or more")
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "cache": bench_cache,
+    "distractors": bench_distractors,
+    "bank": bench_bank,
+    "engine": bench_engine,
+    "export": bench_export,
+    "decks": bench_decks,
+    "grade": bench_grade,
+    "history": bench_history,
+    "search": bench_search,
+    "store": bench_store,
+    "reload": bench_reload,
+    "replay": bench_replay,
+    "reveal": bench_reveal,
+    "scan": bench_scan,
+    "imports": bench_imports,
+    "latency": bench_latency,
+    "log": bench_log,
+    "windows": bench_windows,
+    "pool": bench_pool,
+    "schedule": bench_schedule,
+    "sequence": bench_sequence,
+    "validate": bench_validate,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mark Drama benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS) + ["all"])
+    parser.add_argument("--scenes", type=int, default=100_000, help="number of scenes in the synthetic deck")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="imports: exit with an error if any module takes longer than this to import")
+    parser.add_argument("--decks", type=int, default=24, help="decks: number of decks in the synthetic deck directory")
+    args = parser.parse_args(argv)
+    names = sorted(BENCHMARKS) if args.benchmark == "all" else [args.benchmark]
+    for name in names:
+        BENCHMARKS[name](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,837 @@
+"""
+Deck compiler for the Mark Drama knowledge base files.
+
+Both text formats are read in a single streaming pass. Each line is classified once by its first character and
+turned into a small record, so callers can start consuming parts and scenes before the rest of the file is read.
+Compiling a whole file takes a quicker route (scan_deck_file): the file is memory-mapped, part headers are found by a
+byte search and each part is decoded and split in bulk, falling back to the streaming parser for anything unusual.
+
+Dialogue format (mark_learning_dialogue.txt):
+    [Part One]          -> part
+    - Scene name        -> scene
+    Anything else       -> line of dialogue / event notes for the current scene
+    Lines starting with "=" or "#" and blank lines are ignored.
+
+Event order format (mark_learning_event_order.txt):
+    Part One:           -> part
+     - Scene name       -> scene (in the order they happen)
+    Lines starting with "=" and blank lines are ignored.
+
+Compiled decks are cached in a small binary file next to the text files, named after the dialogue file
+(mark_learning_mark_deck.cache for the default deck). The cache records which files it was compiled from and is reused
+while they're the same files and their modification time and size are unchanged, or, if those changed, while their
+content hash still matches. Otherwise the text files are parsed again and the cache is rewritten.
+
+While the app is running, a DeckWatcher can poll the text files and patch the loaded deck in place when they're saved,
+re-parsing only the parts whose text actually changed.
+
+A directory can hold any number of decks, one pair of files each: <name>_dialogue.txt and <name>_event_order.txt
+(the default deck is just the one called mark_learning). DeckLoader loads all of a directory's decks in the background.
+
+Sessions play from a DialogueStore, a packed read-only copy of the dialogue with an integer id for every scene.
+"""
+import io
+import marshal
+import os
+import sys
+from array import array
+
+from mark_log import log
+
+DIALOGUE_FILE = "mark_learning_dialogue.txt"
+EVENT_ORDER_FILE = "mark_learning_event_order.txt"
+CACHE_FILE = "mark_deck.cache"
+
+# A deck called <name> in a deck directory is <name>_dialogue.txt plus <name>_event_order.txt
+DIALOGUE_SUFFIX = "_dialogue.txt"
+EVENT_ORDER_SUFFIX = "_event_order.txt"
+
+# Part headers in the knowledge base files, both ways round: 1 -> "Part One" and "Part One" -> 1
+NUMBER_MAP = {
+    1: "Part One",
+    2: "Part Two",
+    3: "Part Three",
+    4: "Part Four",
+    5: "Part Five",
+    6: "Part Six"
+}
+INVERTED_NUMBER_MAP = {v: k for k, v in NUMBER_MAP.items()}
+NUMBER_MAP = {**NUMBER_MAP, **INVERTED_NUMBER_MAP}
+
+# Bump the last byte whenever the parser or the cached layout changes, so old caches are thrown away.
+_CACHE_MAGIC = b"MDC\x03"
+
+DIALOGUE = "dialogue"
+EVENT_ORDER = "events"
+
+PART = "part"
+SCENE = "scene"
+LINE = "line"
+
+# Records are plain tuples, one per meaningful line of a deck file: (kind, part, scene, text, line_no)
+# kind is PART, SCENE or LINE. For a PART record, scene and text are None; for a SCENE record, text is None.
+
+
+class DeckError(ValueError):
+    def __init__(self, message, path=None, line_no=None):
+        self.path = path
+        self.line_no = line_no
+        where = f"{path or '<deck>'}, line {line_no}: " if line_no is not None else ""
+        super().__init__(f"{where}{message}")
+
+
+def _part_name(text, fmt):
+    # The part a header line (already stripped) starts: "[Part One]" or "Part One:" -> "Part One"
+    return text.strip("[]").strip() if fmt == DIALOGUE else text.replace(":", "").strip()
+
+
+def iter_deck(lines, fmt=DIALOGUE, path=None, first_line_no=1):
+    # Stream a deck, one record at a time. lines can be any iterable of strings (an open file, a list, a generator).
+    # first_line_no is the line number of the first of those lines in the file, for error messages.
+    if fmt not in (DIALOGUE, EVENT_ORDER):
+        raise ValueError(f"Unknown deck format: {fmt!r}")
+    dialogue = fmt == DIALOGUE
+    current_part = None
+    current_scene = None
+
+    for line_no, line in enumerate(lines, start=first_line_no):
+        text = line.strip()
+        if not text:
+            continue
+        first = line[0]
+        if first == "=" or (dialogue and first == "#"):
+            continue
+
+        if dialogue:
+            if first == "[":
+                current_part = _part_name(text, fmt)
+                current_scene = None
+                yield (PART, current_part, None, None, line_no)
+            elif first == "-" or line.startswith(" -"):
+                if current_part is None:
+                    raise DeckError(f"Scene {text!r} appears before any [Part ...] header.", path, line_no)
+                current_scene = text[1:].strip()
+                yield (SCENE, current_part, current_scene, None, line_no)
+            else:
+                if current_scene is None:
+                    raise DeckError(f"Dialogue {text!r} appears before any '- Scene' line.", path, line_no)
+                yield (LINE, current_part, current_scene, text, line_no)
+        else:
+            if line.startswith(" -"):
+                if current_part is None:
+                    raise DeckError(f"Scene {text!r} appears before any 'Part ...:' header.", path, line_no)
+                yield (SCENE, current_part, text[2:], None, line_no)
+            else:
+                current_part = _part_name(text, fmt)
+                yield (PART, current_part, None, None, line_no)
+
+
+def iter_deck_file(path, fmt=DIALOGUE):
+    # The file is read lazily, line by line, and closed as soon as the generator finishes or is discarded.
+    with open(path, "r", encoding="utf-8") as file:
+        yield from iter_deck(file, fmt, path)
+
+
+def build_dialogue(records):
+    # {part: {scene: [lines]}}, filled in as the records stream past.
+    entries = {}
+    scene_lines = None
+    for kind, part, scene, text, _ in records:
+        if kind == LINE:
+            scene_lines.append(text)
+        elif kind == SCENE:
+            # Interned, so the dialogue and the event order share one copy of each scene name.
+            scene_lines = entries[part][sys.intern(scene)] = []
+        else:
+            entries[part] = {}
+    return entries
+
+
+def build_events(records, duplicates=None):
+    # {part: [scenes in order]}
+    # If a duplicates dict is passed in, it's filled in the same pass with every scene name that appears more than
+    # once: {scene: [(part, line_no), ...]}, one entry per appearance.
+    entries = {}
+    scenes = None
+    first_seen = {}
+    for kind, part, scene, _, line_no in records:
+        if kind == SCENE:
+            scene = sys.intern(scene)
+            scenes.append(scene)
+            if duplicates is not None:
+                first = first_seen.setdefault(scene, (part, line_no))
+                if first[1] != line_no:
+                    duplicates.setdefault(scene, [first]).append((part, line_no))
+        elif kind == PART:
+            scenes = entries[part] = []
+    return entries
+
+
+def find_duplicate_scenes(events):
+    # Same duplicates dict as build_events, for an events dict that's already been built (no line numbers).
+    if len({scene for scenes in events.values() for scene in scenes}) == sum(map(len, events.values())):
+        # Nearly always the case, and a set is much quicker than tracking where each scene was first seen.
+        return {}
+    duplicates = {}
+    first_seen = {}
+    for part, scenes in events.items():
+        for position, scene in enumerate(scenes):
+            first = first_seen.setdefault(scene, (part, position))
+            if first != (part, position):
+                duplicates.setdefault(scene, [(first[0], None)]).append((part, None))
+    return duplicates
+
+
+def describe_duplicates(duplicates):
+    # "'Scene' (Part One line 12, Part Three line 40)", one per line.
+    problems = []
+    for scene, places in duplicates.items():
+        where = ", ".join(part if line_no is None else f"{part} line {line_no}" for part, line_no in places)
+        problems.append(f"'{scene}' ({where})")
+    return "\n".join(problems)
+
+
+def warn_duplicates(duplicates, path):
+    # Log the scenes the event order file at path has more than once, if any, when a deck is loaded.
+    if duplicates:
+        log.warning("duplicate_scenes", "These scenes appear more than once in {path}, multiple choice will refuse "
+                    "parts that share them:\n{scenes}", path=path, scenes=describe_duplicates(duplicates))
+
+
+def compile_dialogue(path=DIALOGUE_FILE):
+    # A whole file is scanned memory-mapped (see scan_deck_file). Anything the scan isn't sure of goes through the
+    # streaming parser instead, which knows the line numbers for the error message.
+    entries = scan_deck_file(path, DIALOGUE)
+    return entries if entries is not None else build_dialogue(iter_deck_file(path, DIALOGUE))
+
+
+def compile_events(path=EVENT_ORDER_FILE, duplicates=None):
+    entries = scan_deck_file(path, EVENT_ORDER)
+    if entries is not None and duplicates is not None and find_duplicate_scenes(entries):
+        # Only the streaming parser has the line numbers the duplicates are reported with.
+        entries = None
+    return entries if entries is not None else build_events(iter_deck_file(path, EVENT_ORDER), duplicates)
+
+
+def compile_deck(dialogue_path=DIALOGUE_FILE, events_path=EVENT_ORDER_FILE):
+    # Returns (dialogue, events, duplicate_scenes), ready to hand to MarkDramaFlashcards.
+    # The event order is checked for duplicate scene names while it's parsed, see build_events.
+    duplicates = {}
+    events = compile_events(events_path, duplicates)
+    return compile_dialogue(dialogue_path), events, duplicates
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Memory-mapped parsing
+
+# Byte patterns for the start of a part header line, just after the newline that ends the line before.
+_DIALOGUE_PART = rb"\n\["
+_EVENT_ORDER_PART = rb"\n(?! -|=|[ \t\r\f\v]*(?:\n|\Z))"  # Anything but a scene, a "=" line or a blank line
+# Where a part's text is cut into scenes: before every scene header line.
+_DIALOGUE_SCENE = r"\n(?=-| -)"
+
+
+def _content_lines(text):
+    # The stripped lines of a piece of a dialogue file, leaving out blank lines and "=" and "#" lines. Without any
+    # "=" or "#" lines (nearly always) it's one pass of C: split, strip, drop the blanks.
+    if "\n=" not in text and "\n#" not in text and text[:1] not in ("=", "#"):
+        return list(filter(None, map(str.strip, text.split("\n"))))
+    return [stripped for line in text.split("\n") if (stripped := line.strip()) and line[0] not in "=#"]
+
+
+def _scan_dialogue(view):
+    import re
+
+    # Part headers are found by a byte search over the whole file. Each part is decoded in one go and cut into scenes
+    # at the scene headers, and each scene's lines are split and stripped in one go.
+    starts = [match.start() + 1 for match in re.finditer(_DIALOGUE_PART, view)]
+    if view[:1] == b"[":
+        starts.insert(0, 0)
+    if _content_lines(str(view[:starts[0] if starts else len(view)], "utf-8")):
+        return None  # Dialogue or a scene before the first part
+    entries = {}
+    for start, end in zip(starts, starts[1:] + [len(view)]):
+        header, *scene_texts = re.split(_DIALOGUE_SCENE, str(view[start:end], "utf-8"))
+        header, _, text = header.partition("\n")
+        if _content_lines(text):
+            return None  # Dialogue before the part's first scene
+        scenes = entries[_part_name(header.strip(), DIALOGUE)] = {}
+        for scene_text in scene_texts:
+            scene, _, text = scene_text.partition("\n")
+            scenes[sys.intern(scene.strip()[1:].strip())] = _content_lines(text)
+    return entries
+
+
+def _scan_events(view):
+    import re
+
+    # Part headers are found by a byte search, and each part's scenes (every other line that isn't blank or "=")
+    # decoded in one go.
+    bounds = [0] + [match.start() + 1 for match in re.finditer(_EVENT_ORDER_PART, view)] + [len(view)]
+    entries = {}
+    scenes = None
+    for start, end in zip(bounds, bounds[1:]):
+        lines = str(view[start:end], "utf-8").split("\n")
+        header = lines[0]
+        # Only the very start of the file, or a line of whitespace the byte search doesn't know is blank, isn't a part.
+        if not header.startswith(" -") and header[:1] != "=" and header.strip():
+            part = _part_name(header.strip(), EVENT_ORDER)
+            if part in entries:
+                return None  # A part listed twice: its first scenes are dropped, but still count as duplicates
+            scenes = entries[part] = []
+            lines = lines[1:]
+        names = [sys.intern(stripped[2:]) for line in lines if line[:1] != "=" and (stripped := line.strip())]
+        if names:
+            if scenes is None:
+                return None  # A scene before the first part
+            scenes.extend(names)
+    return entries
+
+
+def scan_deck_file(path, fmt=DIALOGUE):
+    # Parse a whole deck file the quick way: memory-mapped, with part headers found by searching the bytes and the
+    # text decoded as UTF-8 a part at a time. Returns the same dict as build_dialogue or build_events, or None if the
+    # file is anything but well-formed (including old Mac "\r" line endings), for the streaming parser (iter_deck),
+    # which has the line numbers for the error message.
+    import mmap
+
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return {}
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return scan_deck_data(data, fmt)
+
+
+def scan_deck_data(data, fmt=DIALOGUE):
+    # scan_deck_file over a file's bytes, an mmap or already read into memory.
+    import re
+
+    if not data:
+        return {}
+    if data.find(b"\r") != -1 and re.search(rb"\r(?!\n)", data):
+        return None
+    view = memoryview(data)
+    try:
+        return _scan_dialogue(view) if fmt == DIALOGUE else _scan_events(view)
+    finally:
+        view.release()
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Compiled deck cache
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_digest(path):
+    # hashlib is imported here rather than at the top, it's only needed when the cache is being built or checked
+    import hashlib
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path_for(dialogue_path):
+    # A deck's compiled cache is named after its dialogue file, like the decks of a deck directory (see
+    # deck_cache_path), so decks kept side by side don't take turns overwriting one cache.
+    directory, filename = os.path.split(dialogue_path)
+    if filename.endswith(DIALOGUE_SUFFIX):
+        name = filename[:-len(DIALOGUE_SUFFIX)]
+    else:
+        name = os.path.splitext(filename)[0]
+    return deck_cache_path(directory, name)
+
+
+def _source_paths(paths):
+    # Stored in the cache and compared on load, so a cache is only ever served for the files it was compiled from.
+    return [os.path.realpath(path) for path in paths]
+
+
+def _read_cache(cache_path):
+    # Returns the cached (source paths, sources, dialogue, events, duplicates), or None if there is no usable cache.
+    try:
+        with open(cache_path, "rb") as file:
+            data = file.read()
+        if not data.startswith(_CACHE_MAGIC):
+            return None
+        # loads on one bytes object is far quicker than marshal.load pulling from the file in small reads.
+        python_version, *cached = marshal.loads(memoryview(data)[len(_CACHE_MAGIC):])
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    # marshal's format belongs to the interpreter that wrote it.
+    if python_version != list(sys.version_info[:2]):
+        return None
+    return cached
+
+
+def _write_cache(cache_path, source_paths, sources, dialogue, events, duplicates):
+    # Written to a temporary file first so a half-written cache is never picked up.
+    temp_path = f"{cache_path}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            payload = (list(sys.version_info[:2]), source_paths, sources, dialogue, events, duplicates)
+            file.write(_CACHE_MAGIC + marshal.dumps(payload))
+        os.replace(temp_path, cache_path)
+    except OSError:
+        # A read-only install just means no cache, it should never stop the app from starting.
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def _cache_is_fresh(cached_sources, paths):
+    # Each source is [mtime_ns, size, sha1]. Returns (fresh, refreshed_sources).
+    # A matching stamp is trusted without reading the file; otherwise the content hash decides.
+    if len(cached_sources) != len(paths):
+        return False, None
+    refreshed = []
+    for (mtime_ns, size, digest), path in zip(cached_sources, paths):
+        stamp = _file_stamp(path)
+        if stamp == (mtime_ns, size):
+            refreshed.append([mtime_ns, size, digest])
+            continue
+        if stamp[1] != size or _file_digest(path) != digest:
+            return False, None
+        refreshed.append([*stamp, digest])
+    return True, refreshed
+
+
+def load_deck(dialogue_path=DIALOGUE_FILE, events_path=EVENT_ORDER_FILE, cache_path=None, use_cache=True):
+    # Same result as compile_deck, but served from the compiled cache when the text files haven't changed.
+    return _load_deck(dialogue_path, events_path, cache_path, use_cache)[0]
+
+
+def load_watched_deck(dialogue_path=DIALOGUE_FILE, events_path=EVENT_ORDER_FILE, cache_path=None, use_cache=True):
+    # load_deck plus a DeckWatcher over the loaded deck, as (deck, watcher). The watcher starts from the stamps and
+    # hashes the load already took, so it doesn't read the files again.
+    deck, sources = _load_deck(dialogue_path, events_path, cache_path, use_cache)
+    return deck, DeckWatcher(*deck, dialogue_path, events_path, cache_path, use_cache, sources)
+
+
+def _load_deck(dialogue_path, events_path, cache_path, use_cache):
+    # (deck, sources): sources are the files' [mtime_ns, size, sha1] as they were when the deck was loaded, the sha1
+    # None if there's no cache to need it.
+    if not use_cache:
+        # Stamp before parsing, as below.
+        sources = [[*_file_stamp(path), None] for path in (dialogue_path, events_path)]
+        return compile_deck(dialogue_path, events_path), sources
+    if cache_path is None:
+        cache_path = cache_path_for(dialogue_path)
+    paths = (dialogue_path, events_path)
+    source_paths = _source_paths(paths)
+
+    cached = _read_cache(cache_path)
+    # A cache compiled from other files (the same cache_path passed for another deck, say) is a miss.
+    if cached is not None and cached[0] == source_paths:
+        _, cached_sources, dialogue, events, duplicates = cached
+        fresh, sources = _cache_is_fresh(cached_sources, paths)
+        if fresh:
+            if sources != cached_sources:
+                # Touched but not edited: store the new stamps so the next start skips the hash again.
+                _write_cache(cache_path, source_paths, sources, dialogue, events, duplicates)
+            return (dialogue, events, duplicates), sources
+
+    # Stamp before parsing, so an edit made while we parse is picked up next time rather than hidden.
+    stamps = [_file_stamp(path) for path in paths]
+    sources = [[*stamp, _file_digest(path)] for stamp, path in zip(stamps, paths)]
+    dialogue, events, duplicates = compile_deck(dialogue_path, events_path)
+    _write_cache(cache_path, source_paths, sources, dialogue, events, duplicates)
+    return (dialogue, events, duplicates), sources
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Compact dialogue store
+
+class DialogueStore:
+    # A packed, read-only copy of a dialogue dict ({part: {scene: [lines]}}) for sessions to play from. Every scene
+    # has an integer id, its position in deck order, so a session is a few arrays of ids rather than a copy of the
+    # selected parts' dicts. All the lines are in one UTF-8 buffer, each scene's one after another with a "\n" after
+    # each line, found through an array of byte offsets, and only decoded when the scene is shown. A few bytes of
+    # offsets per scene replace a list object and a str object per line. The buffer is laid out the way the flashcard
+    # window shows an answer, so revealing one is a single slice (see reveal_text).
+    # A scene name that's in more than one part is one card (as it is to the scheduler and the history), with the
+    # lines of its last appearance in the parts being played, see select.
+    def __init__(self, dialogue):
+        self.names = []  # [scene name], indexed by id. Interned, so shared with the dialogue and events dicts.
+        self.ids = {}  # {scene name: id}, the last appearance in the whole deck
+        self.part_ranges = {}  # {part: range of the part's ids}
+        self.offsets = array("Q", [0])  # Byte offset of each scene's lines in buffer, plus the end of the last one
+        self.line_counts = array("L")  # To tell a scene with no lines from one with a single empty line
+        self.blank = bytearray()  # 1 for a scene with nothing to show (no lines, or only whitespace)
+        chunks = []
+        position = 0
+        for part, scenes in dialogue.items():
+            start = len(self.names)
+            for scene, lines in scenes.items():
+                scene = sys.intern(scene)
+                self.ids[scene] = len(self.names)
+                self.names.append(scene)
+                chunk = ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+                chunks.append(chunk)
+                position += len(chunk)
+                self.offsets.append(position)
+                self.line_counts.append(len(lines))
+                self.blank.append(not chunk.strip())
+            self.part_ranges[part] = range(start, len(self.names))
+        self.buffer = b"".join(chunks)
+        self._view = memoryview(self.buffer)
+        self.unique = len(self.ids) == len(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, scene):
+        return scene in self.ids
+
+    def select(self, parts, scenes=None):
+        # The ids of the selected part numbers' scenes, in deck order, as an array. With scenes (names), only those
+        # of them that are in the selected parts, in that order.
+        ids = array("q")
+        for part, part_ids in self.part_ranges.items():
+            if NUMBER_MAP.get(part) in parts:
+                ids.extend(part_ids)
+        if not self.unique:
+            # Each name once, where it first appears in the selected parts, with the id of its last appearance in them:
+            # the card merging the parts' dicts in order gives, whatever other parts of the deck have the name too.
+            ids = array("q", self.id_map(ids).values())
+        if scenes is not None:
+            selected = self.id_map(ids)
+            ids = array("q", (selected[scene] for scene in scenes if scene in selected))
+        return ids
+
+    def id_map(self, ids):
+        # {scene name: id} for some ids, a name that's there more than once going to the last of them.
+        names = self.names
+        return {names[scene_id]: scene_id for scene_id in ids}
+
+    def text(self, scene_id):
+        # The scene's lines joined with "\n", decoded straight out of the buffer.
+        if not self.line_counts[scene_id]:
+            return ""
+        return str(self._view[self.offsets[scene_id]:self.offsets[scene_id + 1] - 1], "utf-8")
+
+    def reveal_text(self, scene_id):
+        # The scene's lines with a "\n" after each, ready for the answer box, or None if the scene is blank.
+        if self.blank[scene_id]:
+            return None
+        return str(self._view[self.offsets[scene_id]:self.offsets[scene_id + 1]], "utf-8")
+
+    def lines(self, scene_id):
+        return self.text(scene_id).split("\n") if self.line_counts[scene_id] else []
+
+    def to_dialogue(self):
+        # Back to {part: {scene: [lines]}}.
+        return {part: {self.names[i]: self.lines(i) for i in part_ids} for part, part_ids in self.part_ranges.items()}
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Hot reload
+
+def _header_offsets(text, fmt):
+    # Where each part header line starts in text. The same first-character rules as iter_deck, but only as much of
+    # them as it takes to spot a header.
+    if fmt == DIALOGUE:
+        # The dialogue file is the big one, so its "[" headers are found with str.find rather than line by line.
+        offsets = [0] if text.startswith("[") else []
+        position = text.find("\n[")
+        while position != -1:
+            offsets.append(position + 1)
+            position = text.find("\n[", position + 1)
+        return offsets
+    # Event order headers are any non-blank line that isn't a " -" scene or an "=" banner. re is imported here rather
+    # than at the top, like hashlib, so loading the deck at startup doesn't pay for it.
+    import re
+    return [match.start() for match in re.finditer(r"^(?!=| -)[^\S\n]*\S", text, re.MULTILINE)]
+
+
+def split_sections(text, fmt=DIALOGUE):
+    # Cut a deck file's text (newlines already turned into "\n") into its parts without parsing them:
+    # [(part, first line_no, text of the part)], in file order. Anything before the first part header (the "====="
+    # banner, comments) comes out as a section with part None.
+    offsets = _header_offsets(text, fmt)
+    sections = []
+    first = offsets[0] if offsets else len(text)
+    if first:
+        sections.append((None, 1, text[:first]))
+    line_no = 1
+    previous = 0
+    for i, start in enumerate(offsets):
+        line_no += text.count("\n", previous, start)
+        previous = start
+        end = offsets[i + 1] if i + 1 < len(offsets) else len(text)
+        header_end = text.find("\n", start, end)
+        header = text[start:end if header_end == -1 else header_end]
+        sections.append((_part_name(header.strip(), fmt), line_no, text[start:end]))
+    return sections
+
+
+class DeckWatcher:
+    # Keeps a loaded deck in step with its text files while the app runs. Call poll() every second or so: it stats the
+    # two files, and when one has been saved it cuts it into parts and re-parses only the parts whose text differs
+    # from last time. The dialogue/events dicts (and duplicates) are patched in place, so everything holding them,
+    # like a QuizEngine, sees the edit; running sessions are brought up to date with QuizEngine.reload_session.
+    # Make the watcher straight after load_deck, it takes the files as they are then to match the loaded deck, or
+    # better, with load_watched_deck, which hands it the sources (see _load_deck) the deck was loaded from. Then it
+    # doesn't read anything until prepare() is called, which can be on another thread, or a file is saved.
+    def __init__(self, dialogue, events, duplicates, dialogue_path=DIALOGUE_FILE, events_path=EVENT_ORDER_FILE,
+                 cache_path=None, use_cache=True, sources=None):
+        self.dialogue = dialogue
+        self.events = events
+        self.duplicates = duplicates
+        self.paths = {DIALOGUE: dialogue_path, EVENT_ORDER: events_path}
+        if cache_path is None and use_cache:
+            cache_path = cache_path_for(dialogue_path)
+        self.cache_path = cache_path
+        self._source_paths = _source_paths([dialogue_path, events_path])
+        self._sources = {}  # {fmt: [mtime_ns, size, sha1]}, as in the cache
+        self._sections = {}  # {fmt: {part: text of the part as it was last parsed}}, None until it's first changed
+        if sources is not None:
+            # threading is imported here rather than at the top, like hashlib, only a seeded watcher needs the lock.
+            import threading
+            self._lock = threading.Lock()  # Held to fill in _sections, which prepare may be doing on another thread
+            for fmt, source in zip(self.paths, sources):
+                self._sources[fmt] = list(source)
+                self._sections[fmt] = None
+            return
+        for fmt, path in self.paths.items():
+            stamp = _file_stamp(path)
+            data = self._read(path)
+            self._sources[fmt] = [*stamp, self._digest(data)]
+            self._sections[fmt] = self._section_texts(split_sections(self._text(data), fmt))
+
+    def prepare(self):
+        # Cut the files of a watcher made from sources into parts ahead of the first save, so that save is re-parsed a
+        # part at a time like every later one rather than whole (see _reload_all). Safe to run on another thread while
+        # poll runs on this one. A file that's been saved since the deck was loaded is left for poll.
+        for fmt, path in self.paths.items():
+            if self._sections[fmt] is not None:
+                continue
+            try:
+                data = self._read(path)
+                # Stamped after reading: the same stamp the deck was loaded with means these are the same bytes.
+                stamp = _file_stamp(path)
+                texts = self._section_texts(split_sections(self._text(data), fmt))
+            except (OSError, UnicodeDecodeError):
+                continue
+            with self._lock:
+                if self._sections[fmt] is None and stamp == tuple(self._sources[fmt][:2]):
+                    self._sections[fmt] = texts
+
+    @staticmethod
+    def _read(path):
+        with open(path, "rb") as file:
+            return file.read()
+
+    @staticmethod
+    def _digest(data):
+        import hashlib
+        return hashlib.sha1(data).hexdigest()
+
+    @staticmethod
+    def _text(data):
+        # Universal newlines, the same text reading the file in text mode gives.
+        text = data.decode("utf-8")
+        return text.replace("\r\n", "\n").replace("\r", "\n") if "\r" in text else text
+
+    @staticmethod
+    def _section_texts(sections):
+        # A part header that appears twice replaces the first one's scenes, as in build_dialogue/build_events.
+        return {part: text for part, _, text in sections}
+
+    def poll(self):
+        # Returns {DIALOGUE: [parts], EVENT_ORDER: [parts]} for the files that changed (parts that were edited, added,
+        # removed or moved), or None if the deck is as it was. A file that doesn't parse leaves the deck untouched.
+        changes = {}
+        for fmt, path in self.paths.items():
+            stamp = None
+            try:
+                stamp = _file_stamp(path)
+                if stamp == tuple(self._sources[fmt][:2]):
+                    continue
+                # Stamp before reading, so a save that lands while we read is picked up on the next poll.
+                data = self._read(path)
+                parts = self._reload(fmt, path, data)
+            except FileNotFoundError:
+                # Some editors delete and recreate the file on save, it'll be back by the next poll.
+                continue
+            except (OSError, UnicodeDecodeError, DeckError) as error:
+                # Most likely saved halfway through an edit. Keep the deck as it was and try again after the next save.
+                log.warning("deck_reload_failed", "Couldn't reload {path}, keeping the deck as it was: {error}",
+                            path=path, error=str(error))
+                if stamp is not None:
+                    # Not tried again until it's saved again. A file that couldn't even be stat'ed is tried every poll.
+                    self._sources[fmt][:2] = stamp
+                continue
+            self._sources[fmt] = [*stamp, self._digest(data)]
+            if parts:
+                changes[fmt] = parts
+        if not changes:
+            return None
+
+        if EVENT_ORDER in changes:
+            self.duplicates.clear()
+            self.duplicates.update(find_duplicate_scenes(self.events))
+        if self.cache_path is not None:
+            _write_cache(self.cache_path, self._source_paths, [self._sources[DIALOGUE], self._sources[EVENT_ORDER]],
+                         self.dialogue, self.events, self.duplicates)
+        return changes
+
+    def _reload(self, fmt, path, data):
+        # Re-parse the parts of one file that changed and patch its dict. Returns the parts that changed.
+        old_texts = self._sections[fmt]
+        if old_texts is None:
+            return self._reload_all(fmt, path, data)
+        entries = self.dialogue if fmt == DIALOGUE else self.events
+        build = build_dialogue if fmt == DIALOGUE else build_events
+        sections = split_sections(self._text(data), fmt)
+        texts = self._section_texts(sections)
+
+        # Every changed part is parsed before anything is patched, so an error leaves the whole deck as it was.
+        parsed = {}
+        for part, first_line_no, text in sections:
+            if old_texts.get(part) == text or texts[part] is not text:
+                # Unchanged, or a part whose header appears again further down and replaces it.
+                continue
+            # newline="\n" splits on "\n" only, like the file itself would be (str.splitlines also splits on \f etc.)
+            records = iter_deck(io.StringIO(text, newline="\n"), fmt, path, first_line_no)
+            if part is None:
+                # Nothing before the first header ends up in the deck, but it still has to be valid.
+                for _ in records:
+                    pass
+            else:
+                parsed[part] = build(records)[part]
+
+        removed = [part for part in old_texts if part not in texts and part is not None]
+        new_entries = {part: parsed[part] if part in parsed else entries[part] for part in texts if part is not None}
+        self._sections[fmt] = texts
+        if parsed or removed:
+            changed = [*parsed, *removed]
+        elif list(new_entries) != list(entries):
+            changed = list(new_entries)
+        else:
+            return []
+        entries.clear()
+        entries.update(new_entries)
+        return changed
+
+    def _reload_all(self, fmt, path, data):
+        # _reload for a file that hasn't been cut into parts yet (see __init__), so there's no old text to compare:
+        # the whole file is parsed, the quick way if it can be, and compared part by part with the loaded deck. Parts
+        # that are the same keep their entries, so they're untouched as far as anything holding them can tell.
+        entries = self.dialogue if fmt == DIALOGUE else self.events
+        text = self._text(data)
+        parsed = scan_deck_data(data, fmt)
+        if parsed is None:
+            build = build_dialogue if fmt == DIALOGUE else build_events
+            parsed = build(iter_deck(io.StringIO(text, newline="\n"), fmt, path))
+        with self._lock:
+            self._sections[fmt] = self._section_texts(split_sections(text, fmt))
+        new_entries = {}
+        changed = []
+        for part, value in parsed.items():
+            if entries.get(part) == value:
+                new_entries[part] = entries[part]
+            else:
+                new_entries[part] = value
+                changed.append(part)
+        changed += [part for part in entries if part not in parsed]
+        if not changed:
+            if list(new_entries) == list(entries):
+                return []
+            changed = list(new_entries)
+        entries.clear()
+        entries.update(new_entries)
+        return changed
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Deck directories
+
+def find_decks(directory):
+    # Every deck in a directory, {name: (dialogue_path, events_path)} sorted by name. A dialogue file without its event
+    # order file (or the other way round) isn't a deck.
+    decks = {}
+    names = sorted(entry.name[:-len(DIALOGUE_SUFFIX)] for entry in os.scandir(directory)
+                   if entry.name.endswith(DIALOGUE_SUFFIX) and entry.is_file())
+    for name in names:
+        events_path = os.path.join(directory, name + EVENT_ORDER_SUFFIX)
+        if os.path.isfile(events_path):
+            decks[name] = (os.path.join(directory, name + DIALOGUE_SUFFIX), events_path)
+    return decks
+
+
+def deck_cache_path(directory, name):
+    # Each deck in a directory gets its own compiled cache, <name>_mark_deck.cache
+    return os.path.join(directory, f"{name}_{CACHE_FILE}")
+
+
+class DeckLoader:
+    # Loads every deck in a directory with load_deck on a pool of threads, so a front end can list the decks straight
+    # away and fill them in as they arrive. Workers only load; finished decks are handed over by poll(), which is meant
+    # to be called from the UI thread every so often and never blocks unless asked to.
+    # Parsing holds the GIL, so the threads mostly overlap reading, hashing and cache loading rather than the parsing
+    # itself. What matters is that the UI never waits on a deck.
+    # With watch=True each worker also makes the deck's DeckWatcher as it loads it (see load_watched_deck), so picking
+    # a deck on the UI thread is just installing what the worker made. A watcher that
+    # isn't polled for a while catches up on its next poll, however long the deck sat unselected.
+    def __init__(self, directory, use_cache=True, max_workers=None, watch=False):
+        self.directory = directory
+        self.use_cache = use_cache
+        self.max_workers = max_workers
+        self.watch = watch
+        self.decks = find_decks(directory)
+        self.loaded = {}  # {name: (dialogue, events, duplicate_scenes)}
+        self.watchers = {}  # {name: DeckWatcher over the loaded deck}, with watch=True
+        self.errors = {}  # {name: the exception load_deck raised}
+        self._pending = {}  # {name: future}
+
+    def __len__(self):
+        return len(self.decks)
+
+    @property
+    def finished(self):
+        return len(self.loaded) + len(self.errors) == len(self.decks)
+
+    def cache_path(self, name):
+        return deck_cache_path(self.directory, name) if self.use_cache else None
+
+    def start(self):
+        # concurrent.futures is imported here rather than at the top, single-deck startup doesn't need it.
+        from concurrent.futures import ThreadPoolExecutor
+        executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="deck-loader")
+        for name, (dialogue_path, events_path) in self.decks.items():
+            self._pending[name] = executor.submit(self._load, dialogue_path, events_path, self.cache_path(name))
+        # The workers carry on with what's been submitted and exit once it's done.
+        executor.shutdown(wait=False)
+        return self
+
+    def _load(self, dialogue_path, events_path, cache_path):
+        # Runs on a worker: (deck, watcher or None).
+        if not self.watch:
+            return load_deck(dialogue_path, events_path, cache_path, self.use_cache), None
+        deck, watcher = load_watched_deck(dialogue_path, events_path, cache_path, self.use_cache)
+        # Already off the UI thread, so the watcher may as well be made ready for the first save here.
+        watcher.prepare()
+        return deck, watcher
+
+    def poll(self, wait=False):
+        # Names of the decks that finished (loaded or failed) since the last poll. wait=True blocks until all have.
+        if wait:
+            from concurrent.futures import wait as wait_for
+            wait_for(self._pending.values())
+        names = [name for name, future in self._pending.items() if future.done()]
+        for name in names:
+            future = self._pending.pop(name)
+            error = future.exception()
+            if error is None:
+                self.loaded[name], watcher = future.result()
+                if watcher is not None:
+                    self.watchers[name] = watcher
+            else:
+                self.errors[name] = error
+        return names
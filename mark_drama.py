@@ -6,53 +6,84 @@ It has two game modes:
 
 User Notes:
 You can update the knowledge base in a text editor like Notepad.
+Changes show up in the game as soon as you save the file, even in the middle of a session, no need to restart.
+To keep several decks (one per course, say) in one folder, name each pair <name>_dialogue.txt and
+<name>_event_order.txt and start the game with --decks <folder>; the decks are listed on the title screen.
+For a whole class drilling the same deck from their browsers, run mark_server.py instead (see its notes).
 
 
 Code Notes:
  - Mode1 is "Flashcards"
  - Mode2 is "Multiple Choice"
+ - The game logic (sessions, picking questions, grading, scoring) lives in mark_engine.py and doesn't need tkinter.
+   MarkDramaFlashcards is just the window on top of it.
+ - Diagnostics go through mark_log (--log-level, --log-file). The windowed build has no console, so it writes them to
+   mark_drama_log.jsonl instead.
+ - Runs can be reproduced: --seed seeds every session (and the feedback messages), and --record writes each session's
+   seed and answers to a file that mark_replay.py plays back through the engine.
 
 """
-import tkinter as tk
-import tkinter.messagebox as msg
-from tkinter import *
-
-from copy import deepcopy
+import os
 import random
+import sys
+import time
+
+from mark_deck import (DIALOGUE, DIALOGUE_FILE, EVENT_ORDER_FILE, NUMBER_MAP, DeckLoader, compile_dialogue,
+                       compile_events, load_watched_deck, warn_duplicates)
+from mark_engine import (AFTER, BEFORE, LETTERS, MAX_OPTIONS, MIN_OPTIONS, DuplicateScenesError, NotEnoughScenesError,
+                         QuizEngine, check_option_count, new_seed)
+from mark_history import HISTORY_FILE, HistoryLog
+from mark_latency import LatencyRecorder
+from mark_log import LEVELS, LOG_FILE, configure, log
+from mark_schedule import USER_DATA_FILE, Scheduler
 
 UNEXPECTED_ERROR_MSG = "Unexpected error, sorry! Tell Josh or someone who knows python."
+BLANK_SCENE_MSG = "Entry is blank, Jesus probably has no dialogue in this scene."
+NO_SCENE_MSG = "(Entry is Blank, does nothing happen?)"
+
+# tkinter is only imported once a window is actually needed (see load_tk), so parsing, validation, the engine and the
+# benchmarks can all use this module without paying for it.
+tk = None
+msg = None
+
+
+def load_tk():
+    global tk, msg
+    if tk is None:
+        import tkinter
+        import tkinter.messagebox
+        tk = tkinter
+        msg = tkinter.messagebox
+    return tk
 
 
 class MarkDramaFlashcards:
-    def __init__(self, root, _dialogue, _events):
+    # Everything Tk calls back into (buttons, list selections, the search box, after() loops), timed by --latency
+    CALLBACKS = ("start_mode1", "start_mode2", "toggle_part", "configure_order", "configure_auto_grade", "run_search",
+                 "study_search_results", "study_search_result", "on_deck_selected", "poll_deck_loader", "reload_deck",
+                 "reveal_mode1_answer", "correct_mode1_answer", "wrong_mode1_answer", "update_mode1_question",
+                 "check_mode2_answer", "next_mode2_question", "update_mode2_question", "close_mode_window")
+
+    def __init__(self, root, _dialogue, _events, _duplicate_scenes=None):
+        # root can be None, in which case nothing touches tkinter until run() is called.
         self.remaining_label = None
-        self.questions = dict()
-        self.mode1_questions = dict()
+        self.engine = QuizEngine(_dialogue, _events, _duplicate_scenes)
         self.dialogue = _dialogue
-        self.mode1_current_question = None
         self.events = _events
-        self.event_sequence = []
-        self.root = root
-        self.root.title("Mark Drama Game")
-        self.root.geometry("800x600")  # Set default window size
+        self.session = None  # The FlashcardSession or MultipleChoiceSession being played
+        self.root = None
         self.parts_to_include = []
-        self.order_config_option = tk.StringVar()
-        self.create_title_screen()
-        self.score = dict()
-        self.reset_score()
+        self.order_config_option = None
 
         # Initialize everything else as per PEP-8 style guide (well, almost everything)
         self.feedback_text_frame = None
         self.mode2_answer_buttons = None
         self.mode2_question_number = None
         self.mode2_answer_label = None
-        self.mode2_correct_answer = None
         self.score_label = None
 
         self.mode2_window = None
         self.mode2_question_label = None
-        self.mode2_question = None
-        self.mode2_answer_options = None
         self.next_question_button = None
         self.correct_button = None
         self.wrong_button = None
@@ -67,20 +98,361 @@ class MarkDramaFlashcards:
         self.mode1_next_button = None
         self.selected_dialogue = None
         self.selected_parts = None
-        self.total_questions = 0
-        self.remaining_questions = None
 
         self.before_only = False
         self.after_only = True
         self.mode_ordered = True
+        self.mode_spaced = False  # Spaced repetition, most overdue cards first
+        self.study_ahead = False  # and once none are due, carry on with the ones due soonest instead of stopping
+        self.study_ahead_option = None
+        self.mode1_auto_grade = False  # Mark flashcards from what's typed in the box instead of asking
+        self.auto_grade_option = None
+
+        # Search box on the title screen, see run_search
+        self.search_text = None
+        self.search_listbox = None
+        self.search_results = []  # [(part, scene, line, score)], best first
+        self.search_result_limit = 50
+
+        self.latency = None  # A mark_latency.LatencyRecorder timing CALLBACKS, see instrument_callbacks
+        self.latency_report_path = None  # Where the latency report goes on quit, printed if None
+        self.scheduler = None  # Loaded from user_data the first time spaced repetition is played
+        self.user_data_path = USER_DATA_FILE
+        self.history_path = HISTORY_FILE
+        self.history = None  # Every answer is logged to history.txt once the window is up, see show()
         self.mode2_index = 0
-
-    def reset_score(self):
-        self.score = {"correct": 0, "total": 0}  # Initialize score
+        self.mode2_option_count = 4  # Number of answers to choose from in multiple choice, A, B, C, D...
+
+        # Reproducible runs, see record_sessions. Sessions are only seeded (and recorded) once that's been called.
+        self.rng = random.Random()  # For the feedback messages, sessions have their own
+        self.session_seeds = None  # random.Random giving each session its seed
+        self.record_path = None  # Where finished sessions' recordings are appended, see mark_replay.py
+
+        # Each mode's window is built the first time it's needed, then hidden at the end of a session and shown and
+        # reset again for the next one, rather than rebuilding dozens of widgets every time.
+        self.reuse_mode_windows = True
+        self.mode1_labels = None  # (score_label, remaining_label) in the flashcards window
+        self.mode2_labels = None  # (score_label, remaining_label) in the multiple choice window
+
+        self.deck_watcher = None  # Set by watch_deck to pick up edits to the knowledge base files
+        self.reload_interval_ms = 1000
+
+        # Deck directory mode, see load_decks. Otherwise the deck is the one passed in and these stay None.
+        self.deck_loader = None
+        self.deck_name = None
+        self.deck_listbox = None
+        self.deck_progress_label = None
+        self.deck_poll_interval_ms = 50
+        self.reload_decks = True  # Watch the selected deck's files for edits, like watch_deck
+
+        if root is not None:
+            self.show(root)
+
+    def show(self, root=None):
+        # Build the title screen, in a new Tk root unless one is given.
+        if self.root is not None:
+            return self.root
+        load_tk()
+        self.root = root if root is not None else tk.Tk()
+        self.root.title("Mark Drama Game")
+        self.root.geometry("800x800")  # Set default window size
+        if self.latency is not None:
+            self.latency.root = self.root
+        self.order_config_option = tk.StringVar()
+        self.auto_grade_option = tk.BooleanVar(value=self.mode1_auto_grade)
+        self.study_ahead_option = tk.BooleanVar(value=self.study_ahead)
+        self.search_text = tk.StringVar()
+        self.create_title_screen()
+        if self.deck_loader is not None:
+            self.create_deck_list()
+        self.root.protocol("WM_DELETE_WINDOW", self.quit)
+        # Tk prints callback errors to stderr, which the windowed build doesn't have.
+        self.root.report_callback_exception = self.report_callback_exception
+        self.history = HistoryLog(self.history_path)
+        # Build the search index and the dialogue store once the title screen is up, so the first search and the first
+        # flashcard session are as quick as the rest.
+        self.root.after_idle(self.engine.search_index)
+        self.root.after_idle(self.engine.dialogue_store)
+        return self.root
+
+    def quit(self):
+        self.save_progress()
+        self.save_recording()
+        self.history.close()
+        if self.latency is not None:
+            self.report_latency()
+        self.root.destroy()
+
+    def report_callback_exception(self, error_type, error, error_traceback):
+        import traceback
+
+        log.error("callback_failed", "{error}\n{traceback}", error=repr(error),
+                  traceback="".join(traceback.format_exception(error_type, error, error_traceback)).rstrip())
+        msg.showerror("Oops", UNEXPECTED_ERROR_MSG)
+
+    def instrument_callbacks(self, recorder=None, report_path=None):
+        # Time every callback in CALLBACKS from now on. Call before show(), so the widgets get the timed versions.
+        # Nothing is wrapped unless this is called, so it costs nothing otherwise.
+        self.latency = recorder if recorder is not None else LatencyRecorder(self.root)
+        self.latency_report_path = report_path
+        self.latency.instrument(self, self.CALLBACKS)
+        return self.latency
+
+    def report_latency(self):
+        if self.latency_report_path is None:
+            log.info("latency_report", "{report}", report=self.latency.report())
+            return
+        try:
+            self.latency.dump(self.latency_report_path)
+        except OSError as error:
+            log.error("latency_report_failed", "Couldn't write the latency report to {path}: {error}",
+                      path=self.latency_report_path, error=str(error))
+
+    def record_sessions(self, seed=None, path=None):
+        # With a seed, every session is seeded from it in turn, so the same seed and the same clicks give the same game.
+        # With a path, each session's seed and answers are appended to it when the session ends. Spaced repetition
+        # sessions aren't recorded, their order comes from the saved progress.
+        self.rng = random.Random(seed)
+        self.session_seeds = random.Random(seed) if seed is not None else None
+        self.record_path = path
+
+    def next_seed(self):
+        if self.session_seeds is not None:
+            return self.session_seeds.getrandbits(63)
+        return new_seed() if self.record_path is not None else None
+
+    def save_recording(self):
+        recording = self.session.recording if self.session is not None else None
+        if self.record_path is None or not recording:
+            return
+        # Only ever written once, however many ways the session ends.
+        self.session.recording = None
+        from mark_replay import append_recording
+        try:
+            append_recording(self.record_path, recording)
+        except OSError as error:
+            log.error("recording_write_failed", "Couldn't save the session recording to {path}: {error}",
+                      path=self.record_path, error=str(error))
+
+    def set_option_count(self, n_options):
+        # Multiple choice options per question, MIN_OPTIONS to MAX_OPTIONS (one letter each), ValueError otherwise.
+        self.mode2_option_count = check_option_count(n_options)
+
+    def get_scheduler(self):
+        # Only used for spaced repetition sessions, None otherwise.
+        if not self.mode_spaced:
+            return None
+        if self.scheduler is None:
+            self.scheduler = Scheduler.load(self.user_data_path)
+        self.scheduler.study_ahead = self.study_ahead
+        return self.scheduler
+
+    def save_progress(self):
+        if self.scheduler is not None:
+            try:
+                self.scheduler.save()
+            except OSError as error:
+                msg.showerror("Oops", f"Couldn't save your spaced repetition progress to {self.user_data_path}: "
+                                      f"{error}")
+
+    def run(self):
+        self.show().mainloop()
+
+    def watch_deck(self, watcher):
+        # Check the knowledge base files for edits every reload_interval_ms, see mark_deck.DeckWatcher.
+        self.deck_watcher = watcher
+        root = self.show()
+        root.after_idle(self.prepare_deck_watcher)
+        root.after(self.reload_interval_ms, self.reload_deck)
+
+    def prepare_deck_watcher(self):
+        # Once the window is up, the watcher reads the files in ready for the first save (see DeckWatcher.prepare) on a
+        # thread of its own, rather than holding up the first window.
+        import threading
+        threading.Thread(target=self.deck_watcher.prepare, name="deck-watcher", daemon=True).start()
+
+    def reload_deck(self):
+        try:
+            changes = self.deck_watcher.poll()
+            if changes:
+                self.apply_deck_changes(changes)
+        finally:
+            self.root.after(self.reload_interval_ms, self.reload_deck)
+
+    def load_decks(self, loader):
+        # Deck directory mode: the decks in loader (a mark_deck.DeckLoader) are loaded in the background and listed
+        # on the title screen, and the first one to finish is selected. Call before show(). Selected decks are
+        # watched for edits if the loader was made with watch=True and reload_decks is on.
+        self.deck_loader = loader.start()
+
+    def deck_label(self, name):
+        if name in self.deck_loader.loaded:
+            return name
+        if name in self.deck_loader.errors:
+            return f"{name} (couldn't load)"
+        return f"{name} (loading...)"
+
+    def poll_deck_loader(self):
+        # Runs on the Tk loop until every deck is in, so the window stays responsive while they load.
+        loader = self.deck_loader
+        rows = list(loader.decks)
+        for name in loader.poll():
+            row = rows.index(name)
+            self.deck_listbox.delete(row)
+            self.deck_listbox.insert(row, self.deck_label(name))
+            if name in loader.errors:
+                log.error("deck_load_failed", "Couldn't load the {deck} deck: {error}", deck=name,
+                          error=str(loader.errors[name]))
+            elif self.deck_name is None:
+                self.select_deck(name)
+        if not loader.decks:
+            progress = f"No decks found in {loader.directory}"
+        else:
+            progress = f"Loaded {len(loader.loaded)}/{len(loader)} decks"
+            if loader.errors:
+                progress += f", {len(loader.errors)} couldn't be loaded"
+        self.deck_progress_label.config(text=progress)
+        if not loader.finished:
+            self.root.after(self.deck_poll_interval_ms, self.poll_deck_loader)
+
+    def select_deck(self, name):
+        loader = self.deck_loader
+        if name not in loader.loaded:
+            if name in loader.errors:
+                msg.showerror("Oops", f"Couldn't load the {name} deck:\n{loader.errors[name]}")
+            else:
+                msg.showinfo("Hang on", f"The {name} deck is still loading.")
+            return
+        # A session carries on over the deck it was started on, and the new deck's watcher would reload it with the
+        # new deck's scenes, so the deck being played goes with the deck.
+        self.end_session()
+        self.save_progress()
+        _, events_path = loader.decks[name]
+        dialogue, events, duplicate_scenes = loader.loaded[name]
+        warn_duplicates(duplicate_scenes, events_path)
+
+        self.deck_name = name
+        self.dialogue = dialogue
+        self.events = events
+        self.engine = QuizEngine(dialogue, events, duplicate_scenes)
+        if self.mode1_auto_grade:
+            self.root.after_idle(self.engine.answer_index)
+        self.root.after_idle(self.engine.search_index)
+        self.root.after_idle(self.engine.dialogue_store)
+        self.run_search()
+        # Spaced repetition progress is kept per deck, <name>_user_data next to the deck.
+        self.user_data_path = os.path.join(loader.directory, f"{name}_{USER_DATA_FILE}")
+        self.scheduler = None
+        # The loader made the watcher along with the deck, off the Tk thread. Edits saved since then are picked up
+        # by its next poll.
+        watcher = loader.watchers.get(name) if self.reload_decks else None
+        if watcher is not None:
+            if self.deck_watcher is None:
+                self.watch_deck(watcher)
+            else:
+                self.deck_watcher = watcher
+
+        self.root.title(f"Mark Drama Game - {name}")
+        row = list(loader.decks).index(name)
+        self.deck_listbox.selection_clear(0, tk.END)
+        self.deck_listbox.selection_set(row)
+
+    def on_deck_selected(self, _event):
+        selection = self.deck_listbox.curselection()
+        if selection:
+            name = list(self.deck_loader.decks)[selection[0]]
+            if name != self.deck_name:
+                self.select_deck(name)
+
+    def deck_ready(self, quiet=False):
+        # Sessions can't start in deck directory mode until a deck has been picked.
+        if self.deck_loader is not None and self.deck_name is None:
+            if quiet:
+                return False
+            msg.showinfo("Hang on", "Pick a deck first (they're still loading if the list is empty).")
+            return False
+        return True
+
+    def apply_deck_changes(self, changes):
+        # The watcher has already patched self.dialogue and self.events, only the running session needs telling.
+        log.info("deck_reloaded", "Reloaded {parts} from the knowledge base",
+                 parts=", ".join(part for parts in changes.values() for part in parts))
+        self.engine.duplicate_scenes = self.deck_watcher.duplicates
+        if DIALOGUE in changes:
+            self.engine.dialogue_changed()
+            self.run_search()
+        if self.session is None:
+            return
+        try:
+            added, removed = self.engine.reload_session(self.session)
+        except (DuplicateScenesError, NotEnoughScenesError) as error:
+            # Half-way through an edit, most likely. Carry on with the event order the session already had.
+            log.warning("session_reload_refused", "Multiple choice is carrying on with the old event order: {error}",
+                        error=str(error))
+            return
+        if added or removed:
+            log.info("session_reloaded", "{added} scenes added to and {removed} removed from this session",
+                     added=len(added), removed=len(removed))
+        if self.score_label is not None:
+            self.update_score_label()
 
     def update_score_label(self):
-        self.score_label.config(text=f"Score for this Session: {self.score['correct']}/{self.score['total']} correct")
-        self.remaining_label.config(text=f"Remaining: {len(self.remaining_questions)}/{self.total_questions}")
+        score = self.session.score
+        self.score_label.config(text=f"Score for this Session: {score['correct']}/{score['total']} correct")
+        self.remaining_label.config(text=self.remaining_text())
+
+    def remaining_text(self):
+        return f"Remaining: {len(self.session.remaining)}/{self.session.total_questions}"
+
+    def show_session_complete(self, window):
+        score = self.session.score
+        if self.session.remaining:
+            # Spaced repetition, and the cards left aren't due yet.
+            due = time.strftime("%H:%M", time.localtime(self.session.due_queue.next_due()))
+            msg.showinfo("All done for now", f"Nothing else is due until {due}, "
+                                             f"come back then for the other {len(self.session.remaining)} cards.\n"
+                                             f"Your score was: {score['correct']}/{score['total']}.")
+        else:
+            msg.showinfo("Yay", f"You got through all the questions :) \n"
+                                f"Your score was: {score['correct']}/{score['total']}.\n"
+                                f"You were playing with Parts: {self.session.parts}.")
+        self.close_mode_window(window)
+
+    def open_mode_window(self, window, create):
+        # Show the pooled window for a mode, building it with create() if it doesn't exist yet (or was destroyed).
+        # Returns True if the window was built from scratch.
+        if window is not None and window.winfo_exists():
+            if self.reuse_mode_windows:
+                window.deiconify()
+                window.lift()
+                return False
+            window.destroy()
+        create()
+        return True
+
+    def close_mode_window(self, window):
+        self.save_progress()
+        self.save_recording()
+        if self.history is not None:
+            self.history.flush()
+        if self.reuse_mode_windows:
+            window.withdraw()
+        else:
+            window.destroy()
+
+    def end_session(self):
+        # Close the mode window being played, as if the player had, and drop its session.
+        if self.session is None:
+            return
+        for window in (self.mode1_window, self.mode2_window):
+            if window is not None and window.winfo_exists():
+                self.close_mode_window(window)
+        self.session = None
+
+    def reset_score_labels(self, labels):
+        # Point the score/remaining labels at the window being played and show the new session's numbers.
+        self.score_label, self.remaining_label = labels
+        self.update_score_label()
 
     # ---------------------------------------------------------------------------------------------------------------- #
     # Title Screen Starts Here
@@ -137,6 +509,12 @@ class MarkDramaFlashcards:
                                         value="Ordered",
                                         command=self.configure_order,
                                         font=("Helvetica", 12))
+        spaced_button = tk.Radiobutton(mode2_config_frame,
+                                       text="Spaced Repetition",
+                                       variable=self.order_config_option,
+                                       value="Spaced",
+                                       command=self.configure_order,
+                                       font=("Helvetica", 12))
         ordered_button.select()
 
         # Pack the radio buttons within the frame
@@ -144,10 +522,54 @@ class MarkDramaFlashcards:
         # radio_button2.pack()
         ordered_button.pack()
         randomized_button.pack()
+        spaced_button.pack()
+
+        auto_grade_button = tk.Checkbutton(self.root, text="Flashcards: mark my typed answers for me",
+                                           variable=self.auto_grade_option, command=self.configure_auto_grade,
+                                           font=("Helvetica", 12))
+        auto_grade_button.pack(pady=5)
+        study_ahead_button = tk.Checkbutton(self.root, text="Spaced Repetition: study cards before they're due",
+                                            variable=self.study_ahead_option, command=self.configure_study_ahead,
+                                            font=("Helvetica", 12))
+        study_ahead_button.pack()
+
+        search_frame = tk.LabelFrame(self.root, text="Search Scenes and Dialogue", font=("Helvetica", 13, "bold"))
+        search_frame.pack(padx=20, pady=10)
+        search_entry = tk.Entry(search_frame, textvariable=self.search_text, font=("Helvetica", 12), width=60)
+        search_entry.pack(padx=10, pady=5)
+        # Results update on every keystroke.
+        self.search_text.trace_add("write", lambda *_: self.run_search())
+
+        self.search_listbox = tk.Listbox(search_frame, font=("Helvetica", 11), height=6, width=80)
+        self.search_listbox.pack(padx=10)
+        # Double-click a result to study just that scene.
+        self.search_listbox.bind("<Double-Button-1>", self.study_search_result)
+        study_button = tk.Button(search_frame, text="Study these scenes (Flashcards)", font=("Helvetica", 12),
+                                 command=self.study_search_results)
+        study_button.pack(pady=5)
+
+    def create_deck_list(self):
+        # Deck directory mode only: every deck in the directory, filled in as they finish loading.
+        deck_frame = tk.LabelFrame(self.root, text="Deck", font=("Helvetica", 13, "bold"))
+        deck_frame.pack(padx=20, pady=10)
+
+        self.deck_listbox = tk.Listbox(deck_frame, font=("Helvetica", 12), height=5, width=40, exportselection=False)
+        self.deck_listbox.pack(side=tk.LEFT)
+        scrollbar = tk.Scrollbar(deck_frame, command=self.deck_listbox.yview)
+        scrollbar.pack(side=tk.LEFT, fill=tk.Y)
+        self.deck_listbox.config(yscrollcommand=scrollbar.set)
+        for name in self.deck_loader.decks:
+            self.deck_listbox.insert(tk.END, self.deck_label(name))
+        self.deck_listbox.bind("<<ListboxSelect>>", self.on_deck_selected)
+
+        self.deck_progress_label = tk.Label(self.root, text="Loading decks...", font=("Helvetica", 11))
+        self.deck_progress_label.pack()
+        self.poll_deck_loader()
 
 
     def configure_order(self):
         self.mode_ordered = False
+        self.mode_spaced = False
         if self.order_config_option.get() == "Before":
             self.after_only = False
             self.before_only = True
@@ -161,6 +583,42 @@ class MarkDramaFlashcards:
             self.mode_ordered = True
             self.after_only = True
             self.before_only = False
+        if self.order_config_option.get() == "Spaced":
+            self.mode_spaced = True
+            self.after_only = True
+            self.before_only = False
+
+    def configure_study_ahead(self):
+        self.study_ahead = self.study_ahead_option.get()
+
+    def configure_auto_grade(self):
+        self.mode1_auto_grade = self.auto_grade_option.get()
+        if self.mode1_auto_grade:
+            # Build the deck's answer index now, while the player is still on the title screen.
+            self.root.after_idle(self.engine.answer_index)
+
+    def run_search(self):
+        if self.search_listbox is None:
+            return
+        query = self.search_text.get()
+        self.search_results = []
+        if query.strip() and self.deck_ready(quiet=True):
+            self.search_results = self.engine.search_index().search(query, self.search_result_limit)
+        self.search_listbox.delete(0, tk.END)
+        for part, scene, line, _ in self.search_results:
+            self.search_listbox.insert(tk.END, f"{scene}  ({part})" + (f":  {line}" if line else ""))
+
+    def study_search_results(self):
+        if not self.search_results:
+            msg.showinfo("Nothing to study", "Search for a scene or a line first, then study the scenes it finds.")
+            return
+        self.start_mode1(scenes=[(part, scene) for part, scene, _, _ in self.search_results])
+
+    def study_search_result(self, _event):
+        selection = self.search_listbox.curselection()
+        if selection:
+            part, scene, _, _ = self.search_results[selection[0]]
+            self.start_mode1(scenes=[(part, scene)])
 
     def toggle_part(self, part_number):
         if part_number in self.parts_to_include:
@@ -168,34 +626,13 @@ class MarkDramaFlashcards:
         else:
             self.parts_to_include.append(part_number)
 
-    def get_questions(self, mode=1):
-        questions = dict()
-        mode_name = "Flashcards" if mode == 1 else "Multichoice"
-        print(f"Launching {mode_name} with parts: {self.parts_to_include}")
-
-        # Mode is 1
-        if mode == 1:
-            for k in self.dialogue.keys():
-                part_num = NUMBER_MAP[k]
-                if part_num in self.parts_to_include:
-                    questions[k] = self.dialogue[k]
-            return questions
-        # Mode is 2
-        event_sequence = []
-        for k in self.events.keys():
-            part_num = NUMBER_MAP[k]
-            if part_num in self.parts_to_include:
-                questions[k] = self.events[k]
-                for i in self.events[k]:
-                    event_sequence.append(i)
-        if any([event_sequence.count(i) >= 2 for i in event_sequence]):
-            duped_scenes = list()
-            duped_scenes.append(list(i for i in event_sequence if event_sequence.count(i) >= 2))
-            problem = f"Hey! Please make sure your scene names in the event order text file are unique. " \
-                      f"I found these ones at least twice: {duped_scenes}"
-            msg.showerror("Error with your Event Order TextFile", problem)
-            raise KeyError(problem)
-        return questions, event_sequence
+    def mode2_direction(self):
+        # AFTER or BEFORE, or None to let the session pick one at random for each question.
+        if self.after_only:
+            return AFTER
+        if self.before_only:
+            return BEFORE
+        return None
 
     # ---------------------------------------------------------------------------------------------------------------- #
     # Mode 1 Starts Here
@@ -205,86 +642,88 @@ class MarkDramaFlashcards:
         self.mode1_user_answer.set("")
         self.mode1_correct_answer = "The correct answer has appeared."
 
-    def start_mode1(self):
-        if not self.parts_to_include:
+    def start_mode1(self, scenes=None):
+        # scenes, [(part, scene)], limits the session to those scenes (search results), whichever parts they're in.
+        if not self.deck_ready():
+            return
+        if scenes is not None:
+            parts = sorted({NUMBER_MAP[part] for part, _ in scenes if part in NUMBER_MAP})
+            scenes = [scene for _, scene in scenes]
+        else:
+            parts = self.parts_to_include
+        if not parts:
             msg.showerror("Oops", "You've not selected any parts!")
             return
-        questions = self.get_questions()
-        self.mode1_questions = dict()
-        self.remaining_questions = dict()
-        for part in questions.values():
-            self.mode1_questions.update(part)
-            self.remaining_questions.update(part)
-        self.total_questions = len(self.remaining_questions)
-        self.reset_score()
+        log.info("session_started", "Launching Flashcards with parts: {parts}", mode="flashcards", parts=parts,
+                 scenes=len(scenes) if scenes is not None else None)
+        self.save_recording()
+        self.session = self.engine.start_flashcards(parts, ordered=self.mode_ordered, scheduler=self.get_scheduler(),
+                                                    history=self.history, auto_grade=self.mode1_auto_grade,
+                                                    scenes=scenes, seed=self.next_seed())
         self.reset_mode1()
-        self.create_mode1_window()
+        self.open_mode_window(self.mode1_window, self.create_mode1_window)
+        self.reset_score_labels(self.mode1_labels)
+        self.update_mode1_question()
 
     def create_mode1_window(self):
-        self.reset_score()
-        self.mode1_window = Toplevel(self.root)
+        self.mode1_window = tk.Toplevel(self.root)
+        self.mode1_window.protocol("WM_DELETE_WINDOW", lambda: self.close_mode_window(self.mode1_window))
         self.mode1_window.title("Mark Drama Flashcards")
         self.mode1_window.geometry("800x800")  # Set default window size
 
         # Create a frame to hold widgets that use grid
-        grid_frame = Frame(self.mode1_window)
+        grid_frame = tk.Frame(self.mode1_window)
         grid_frame.pack()
 
         # Add an empty column on the left for padding
         grid_frame.grid_columnconfigure(0, weight=1)
 
-        self.mode1_question_label = Label(grid_frame, text="This is a question.", font=("Helvetica", 14))
+        self.mode1_question_label = tk.Label(grid_frame, text="This is a question.", font=("Helvetica", 14))
         self.mode1_question_label.grid(row=0, column=1, pady=(10, 0), columnspan=2)
 
-        self.mode1_entry = Text(grid_frame, font=("Helvetica", 12), wrap=WORD, height=6, width=60)
+        self.mode1_entry = tk.Text(grid_frame, font=("Helvetica", 12), wrap=tk.WORD, height=6, width=60)
         self.mode1_entry.grid(row=1, column=1, pady=10, columnspan=2)
 
-        self.reveal_answer_button = Button(grid_frame, text="Reveal Answer", font=("Helvetica", 12),
+        self.reveal_answer_button = tk.Button(grid_frame, text="Reveal Answer", font=("Helvetica", 12),
                                            command=self.reveal_mode1_answer)
         self.reveal_answer_button.grid(row=2, column=1, pady=10, columnspan=2)
 
-        self.mode1_feedback_text = Text(grid_frame, font=("Helvetica", 12), wrap=WORD, height=16, width=60)
+        self.mode1_feedback_text = tk.Text(grid_frame, font=("Helvetica", 12), wrap=tk.WORD, height=16, width=60)
         self.mode1_feedback_text.grid(row=4, column=1, pady=10, columnspan=2)
 
         # Create a scrollbar for the feedback text widget
-        scrollbar = Scrollbar(grid_frame, command=self.mode1_feedback_text.yview)
+        scrollbar = tk.Scrollbar(grid_frame, command=self.mode1_feedback_text.yview)
         scrollbar.grid(row=4, column=3, sticky='ns')  # Place scrollbar next to text widget
         self.mode1_feedback_text.config(yscrollcommand=scrollbar.set)
 
-        self.correct_button = Button(grid_frame, text="I got it right", font=("Helvetica", 12),
+        self.correct_button = tk.Button(grid_frame, text="I got it right", font=("Helvetica", 12),
                                      command=self.correct_mode1_answer)
         self.correct_button.grid(row=5, column=1, padx=10)
 
-        self.wrong_button = Button(grid_frame, text="I got it wrong", font=("Helvetica", 12),
+        self.wrong_button = tk.Button(grid_frame, text="I got it wrong", font=("Helvetica", 12),
                                    command=self.wrong_mode1_answer)
         self.wrong_button.grid(row=5, column=2, padx=10)
 
-        self.mode1_next_button = Button(grid_frame, text="Next Question", font=("Helvetica", 12),
+        self.mode1_next_button = tk.Button(grid_frame, text="Next Question", font=("Helvetica", 12),
                                         command=self.update_mode1_question)
         self.mode1_next_button.grid(row=6, column=1, pady=10, columnspan=2)
-        self.mode1_next_button.config(state=DISABLED)  # Initially disabled
+        self.mode1_next_button.config(state=tk.DISABLED)  # Initially disabled
 
         self.score_label = tk.Label(grid_frame, text="Score for this Session: 0/0 correct", font=("Helvetica", 14))
         self.score_label.grid(row=7, column=0, columnspan=2, pady=10)
 
-        self.remaining_label = tk.Label(grid_frame, text=f"Remaining: "
-                                                         f"{len(self.remaining_questions)}/{self.total_questions}",
-                                        font=("Helvetica", 14))
+        self.remaining_label = tk.Label(grid_frame, text=self.remaining_text(), font=("Helvetica", 14))
         self.remaining_label.grid(row=8, column=0, columnspan=2, pady=10)
-
-        self.update_mode1_question()
+        self.mode1_labels = (self.score_label, self.remaining_label)
 
     def reveal_mode1_answer(self):
-        # Get the correct answer
-        if self.mode1_current_question:
-            answers = self.mode1_questions[self.mode1_current_question]
-            correct_answer = ""
-            for i in answers:
-                correct_answer += f"{i}\n"
-            if correct_answer[0].strip() == "":
-                correct_answer = ["Entry is blank, Jesus probably has no dialogue in this scene."]
+        # Get the correct answer, laid out once when the deck was loaded (see mark_deck.DialogueStore.reveal_text)
+        if self.session.current:
+            correct_answer = self.session.reveal_text()
+            if correct_answer is None:
+                correct_answer = BLANK_SCENE_MSG
         else:
-            correct_answer = ["(Entry is Blank, does nothing happen?)"]
+            correct_answer = NO_SCENE_MSG
 
         # Clear the feedback field and set the correct answer
         self.mode1_feedback_text.config(state=tk.NORMAL)
@@ -292,24 +731,41 @@ class MarkDramaFlashcards:
         self.mode1_feedback_text.insert(tk.END, correct_answer)
         self.mode1_feedback_text.config(state=tk.DISABLED)
 
+        self.reveal_answer_button.config(state=tk.DISABLED)
+        if self.auto_grade_mode1_answer():
+            return
+
         # Enable "Right/Wrong" button after revealing the answer
         self.correct_button.config(state=tk.NORMAL)
         self.wrong_button.config(state=tk.NORMAL)
-        self.reveal_answer_button.config(state=tk.DISABLED)
+
+    def auto_grade_mode1_answer(self):
+        # Mark the typed answer against the scene's lines. Returns False if the player has to mark it themselves
+        # (auto-grading is off, nothing was typed, or the scene has no lines).
+        typed = self.mode1_entry.get(1.0, tk.END)
+        if self.session.answer_index is None or not self.session.current or not typed.strip():
+            return False
+        result = self.session.auto_mark(typed)
+        if result is None:
+            return False
+        similarity, correct = result
+        verdict = "marked right" if correct else "marked wrong"
+        self.mode1_feedback_text.config(state=tk.NORMAL)
+        self.mode1_feedback_text.insert(1.0, f"Your answer is a {similarity:.0%} match, {verdict}.\n\n",
+                                        "green" if correct else "red")
+        self.mode1_feedback_text.tag_configure("red", foreground="red")
+        self.mode1_feedback_text.tag_configure("green", foreground="green")
+        self.mode1_feedback_text.config(state=tk.DISABLED)
+        self.mode1_next_button.config(state=tk.NORMAL)
+        self.update_score_label()
+        return True
 
     def update_mode1_question(self):
-        print(len(self.remaining_questions), "remaining questions")
-        if len(self.remaining_questions) == 0:
-            msg.showinfo("Yay", f"You got through all the questions :) \n"
-                                f"Your score was: {self.score['correct']}/{self.score['total']}.\n"
-                                f"You were playing with Parts: {self.parts_to_include}.")
-            self.mode1_window.destroy()
+        log.debug("question", "{remaining} remaining questions", remaining=len(self.session.remaining))
+        if self.session.finished:
+            self.show_session_complete(self.mode1_window)
             return
-        if self.mode_ordered:
-            self.mode1_current_question = list(self.remaining_questions.keys())[0]
-        else:
-            self.mode1_current_question = random.choice(list(self.remaining_questions.keys()))
-        new_question = f"'{self.mode1_current_question}'" + \
+        new_question = f"'{self.session.next_question()}'" + \
                        "\n What happens here?\n"
 
         # Clear the user's input field and update the question
@@ -328,16 +784,14 @@ class MarkDramaFlashcards:
         self.reveal_answer_button.config(state=tk.NORMAL)
 
     def correct_mode1_answer(self):
-        self.score["correct"] += 1
-        self.score["total"] += 1
+        self.session.mark(True)
         self.mode1_next_button.config(state=tk.NORMAL)
         self.correct_button.config(state=tk.DISABLED)
         self.wrong_button.config(state=tk.DISABLED)
-        self.remaining_questions.pop(self.mode1_current_question)
         self.update_score_label()
 
     def wrong_mode1_answer(self):
-        self.score["total"] += 1
+        self.session.mark(False)
         self.mode1_next_button.config(state=tk.NORMAL)
         self.update_score_label()
         self.correct_button.config(state=tk.DISABLED)
@@ -346,20 +800,38 @@ class MarkDramaFlashcards:
     # ---------------------------------------------------------------------------------------------------------------- #
     # Mode 2 Starts Here
     def start_mode2(self):
+        if not self.deck_ready():
+            return
         if not self.parts_to_include:
             msg.showerror("Oops", "You've not selected any parts!")
             return
-        # Select a random question from the dictionary
-        self.questions, self.event_sequence = self.get_questions(mode=2)
-        self.remaining_questions = deepcopy(self.event_sequence)
-        self.total_questions = len(self.remaining_questions)
-        self.mode2_question = random.choice(self.remaining_questions)
-        self.create_mode2_window()
+        log.info("session_started", "Launching Multichoice with parts: {parts}", mode="multiple_choice",
+                 parts=self.parts_to_include)
+        self.save_recording()
+        try:
+            self.session = self.engine.start_multiple_choice(self.parts_to_include, ordered=self.mode_ordered,
+                                                             direction=self.mode2_direction(),
+                                                             n_options=self.mode2_option_count,
+                                                             scheduler=self.get_scheduler(), history=self.history,
+                                                             seed=self.next_seed())
+        except DuplicateScenesError as error:
+            msg.showerror("Error with your Event Order TextFile", error.args[0])
+            return
+        except NotEnoughScenesError as error:
+            msg.showerror("Oops", str(error))
+            return
+        if self.mode2_answer_buttons is not None and len(self.mode2_answer_buttons) != self.mode2_option_count:
+            # The pooled window has the wrong number of answer buttons, so it has to be built again.
+            self.mode2_window.destroy()
+        self.open_mode_window(self.mode2_window, self.create_mode2_window)
+        self.reset_score_labels(self.mode2_labels)
+        # Through next_mode2_question, as a spaced repetition session can have nothing due from the start.
+        self.next_mode2_question()
 
     def create_mode2_window(self):
         row = 0
         self.mode2_window = tk.Toplevel(self.root)
-        self.reset_score()
+        self.mode2_window.protocol("WM_DELETE_WINDOW", lambda: self.close_mode_window(self.mode2_window))
         self.mode2_window.title("Mark Drama Multi-Choice")
         self.mode2_window.geometry("1100x680")
 
@@ -369,25 +841,22 @@ class MarkDramaFlashcards:
         self.mode2_question_label.grid(row=row, column=0, columnspan=2, pady=20)
         row += 1
 
-        potential_answers = ["A: A long piece of dialogue that is longer than most",
-                             "B: A long piece of dialogue that is longer than most",
-                             "C: A long piece of dialogue that is longer than most",
-                             "D: A long piece of dialogue that is longer than most"]
+        abcd = LETTERS[:self.mode2_option_count]
+        potential_answers = [f"{letter}: A long piece of dialogue that is longer than most" for letter in abcd]
         self.mode2_answer_label = tk.Label(self.mode2_window,
                                            text="\n".join(potential_answers),
                                            font=("Helvetica", 14))
         self.mode2_answer_label.grid(row=row, column=0, columnspan=2, pady=20)
         row += 1
-        abcd = ['A', 'B', 'C', 'D']
 
         self.mode2_answer_buttons = []
 
-        for i in range(4):
+        for i in range(self.mode2_option_count):
             answer_button = tk.Button(self.mode2_window, text=abcd[i], font=("Helvetica", 24),
-                                      command=lambda ans=abcd[i]: self.check_mode2_answer(ans), padx=80)
+                                      command=lambda ans=i: self.check_mode2_answer(ans), padx=80)
             answer_button.grid(row=i // 2 + row, column=i % 2, padx=20, pady=10)
             self.mode2_answer_buttons.append(answer_button)
-        row += 2
+        row += (self.mode2_option_count + 1) // 2
 
         # Text frame for answer feedback
         self.feedback_text_frame = tk.Text(self.mode2_window, font=("Helvetica", 10), wrap=tk.WORD, height=24, width=60)
@@ -404,46 +873,34 @@ class MarkDramaFlashcards:
                                     font=("Helvetica", 14))
         self.score_label.grid(row=row, column=0, columnspan=2, pady=10)
         row += 1
-        self.remaining_label = tk.Label(self.mode2_window,
-                                        text=f"Remaining: {len(self.remaining_questions)}/{self.total_questions}",
-                                        font=("Helvetica", 14))
+        self.remaining_label = tk.Label(self.mode2_window, text=self.remaining_text(), font=("Helvetica", 14))
         self.remaining_label.grid(row=row, column=0, columnspan=2, pady=10)
         row += 1
-        self.update_mode2_question()
+        self.mode2_labels = (self.score_label, self.remaining_label)
 
     def check_mode2_answer(self, user_answer):
         self.feedback_text_frame.config(state=tk.NORMAL)
         self.feedback_text_frame.delete(1.0, tk.END)  # Clear previous content
 
-        split = self.mode2_answer_options.split("\n")
-        letter_pairs = [(i[:1], i[3:].strip()) for i in split if i]
-        _answers = [{v: k} for k, v in letter_pairs]
-        answers = dict()
-        for answer in _answers:
-            answers.update(answer)
-        alternatives = {v: k for k, v in answers.items()}
-        correct_answer = answers[self.mode2_correct_answer]
-
-        if user_answer == correct_answer:
-            feedback = f"Correct! '{correct_answer}: {self.mode2_correct_answer}' is the right answer!\n"
-            feedback += random.choice(["You got it!", "Fantastic!"] * 3 +
+        # user_answer is the index of the option that was clicked.
+        question = self.session.current
+        correct_answer = LETTERS[question.correct_index]
+
+        if self.session.answer(user_answer):
+            feedback = f"Correct! '{correct_answer}: {question.correct_answer}' is the right answer!\n"
+            feedback += self.rng.choice(["You got it!", "Fantastic!"] * 3 +
                                       ["10 points to Gryffindor!", "Hallelujah!", "Yay!", "Woo-hoo!"])
             self.feedback_text_frame.insert(tk.END, feedback, "green")
-            self.score["correct"] += 1  # Increment correct score
-            # Pop the remaining questions
-            self.remaining_questions.pop(self.remaining_questions.index(self.mode2_question))
         else:
-            feedback_wrong = random.choice(["Don't stop, you can do it!\n", "Don't give up!\n",
+            feedback_wrong = self.rng.choice(["Don't stop, you can do it!\n", "Don't give up!\n",
                                             "Time for a cookie?\n"] + [""]*10)
-            feedback_correct = self.mode2_correct_answer
-            self.feedback_text_frame.insert(tk.END, f"'{user_answer}: {alternatives[user_answer]}' is incorrect.\n",
-                                            "red")
+            self.feedback_text_frame.insert(tk.END, f"'{LETTERS[user_answer]}: {question.options[user_answer]}' "
+                                                    f"is incorrect.\n", "red")
             self.feedback_text_frame.insert(tk.END, f'{feedback_wrong}', "red")
-            self.feedback_text_frame.insert(tk.END, f"'{correct_answer}: {self.mode2_correct_answer}' "
+            self.feedback_text_frame.insert(tk.END, f"'{correct_answer}: {question.correct_answer}' "
                                                     f"was the correct answer.", "green")
 
         # Update the performance record below the "Next Question" button
-        self.score["total"] += 1  # Increment total questions
         self.update_score_label()
 
         self.feedback_text_frame.config(state=tk.DISABLED)
@@ -458,70 +915,22 @@ class MarkDramaFlashcards:
             button.config(state=tk.DISABLED)
 
     def next_mode2_question(self):
-        # Select a new random question from the dictionary or terminate the game session if the player has done all.
-        if self.remaining_questions:
-            self.mode2_question = random.choice(self.remaining_questions)
-        else:
-            msg.showinfo("Yay", f"You got through all the questions :) \n"
-                                f"Your score was: {self.score['correct']}/{self.score['total']}.\n"
-                                f"You were playing with Parts: {self.parts_to_include}.")
-            self.mode2_window.destroy()
+        # Terminate the game session if the player has done all, otherwise on to the next question.
+        if self.session.finished:
+            self.show_session_complete(self.mode2_window)
             return
-
-        # Enable answer buttons
-        for button in self.mode2_answer_buttons:
-            button.config(state=tk.NORMAL)
         self.update_mode2_question()
 
     def update_mode2_question(self):
-        # Generate new question
-        if len(self.remaining_questions) > 2:
-            self.mode2_question = random.choice(self.remaining_questions[1:-1])
-        else:
-            self.mode2_question = self.remaining_questions[0]
-        if self.mode_ordered:
-            self.mode2_question = self.remaining_questions[0]
+        # Generate new question. The distractors include a couple of sneaky ones very close in sequence to the
+        # correct answer.
+        question = self.session.next_question()
+        self.mode2_question_label.config(text=question.prompt(), fg="black")
 
-        before_or_after = random.choice(["before", "after"])
-        if self.after_only:
-            before_or_after = "after"
-        elif self.before_only:
-            before_or_after = "before"
-        after_question = self.event_sequence.index(self.mode2_question) + 1
-        before_question = self.event_sequence.index(self.mode2_question) - 1
-
-        self.mode2_correct_answer = self.event_sequence[after_question] if before_or_after == "after" else \
-            self.event_sequence[before_question]
-        self.mode2_question_label.config(text=f"What comes immediately {before_or_after}...\n'{self.mode2_question}'",
-                                         fg="black")
-
-        # Generate the potential answers based on the selected parts.
-        four_options = [self.mode2_correct_answer]
-        if len(self.event_sequence) < 5:
-            msg.showerror("Oops", "You can't play multichoice with fewer than 5 options. Please add more to the"
-                                  " event order text file.")
-            exit()
-
-        sneaky = 0
-        while len(four_options) < 4:
-            # Ensure there's a sneaky one very close in sequence to the correct answer.
-            if sneaky >= 2:
-                _new = random.choice(self.event_sequence)
-            else:
-                offset = random.randint(-3, 3)
-                index_to_pick = self.event_sequence.index(self.mode2_correct_answer) + offset
-                # Ensure the index is within a valid range
-                index_to_pick = max(0, min(index_to_pick, len(self.event_sequence)-1))
-
-                _new = self.event_sequence[index_to_pick]
-                sneaky += 1
-            if _new not in four_options and _new not in self.mode2_question:
-                four_options.append(_new)
-        random.shuffle(four_options)
-
-        self.mode2_answer_options = "A: {}\nB: {}\nC: {} \nD: {}\n" \
-                                    .format(*[i for i in four_options])
-        self.mode2_answer_label.config(text=self.mode2_answer_options, justify='left')
+        # Enable answer buttons
+        for button in self.mode2_answer_buttons:
+            button.config(state=tk.NORMAL)
+        self.mode2_answer_label.config(text=question.render_options(), justify='left')
 
         self.feedback_text_frame.config(state=tk.NORMAL)
         self.feedback_text_frame.delete(1.0, tk.END)  # Clear previous content
@@ -529,72 +938,83 @@ class MarkDramaFlashcards:
         self.next_question_button.config(state=tk.DISABLED)  # Disable "Next Question" button for the new question
 
 
-def parse_event_order_to_dict():
-    # Take my event order notes and turn them into a dict.
-    # Initialize an empty dictionary to store the entries
-    entries = {}
-    current_part = None  # Initialize a variable to keep track of the current part
-
-    # Open the file for reading
-    with open('mark_learning_event_order.txt', 'r') as file:
-        for line in file:
-            # Check if the line starts with "="
-            if line.startswith('=') or not line.strip():
-                # Ignore lines starting with "="
-                continue
-            # Check if the line starts with " -"
-            elif line.startswith(' -'):
-                # If it starts with " -", add it to the current part
-                entries[current_part].append(line.strip()[2:])
-            else:
-                # If it doesn't start with " -", it's a new part
-                current_part = line.replace(":", "").strip()
-                entries[current_part] = []
-    return entries
-
-
-def parse_dialogue_to_dict():
-    # Take my dialogue notes for Jesus and turn them into a dict.
-    # Initialize an empty dictionary to store the entries
-    entries = {}
-    current_part = None
-    current_event = None
-
-    # Open the file for reading
-    with open('mark_learning_dialogue.txt', 'r') as file:
-        for line in file:
-            # Check if the line starts with "=" or "#"
-            if line.startswith('=') or not line.strip() or line.startswith("#"):
-                # Ignore lines starting with "="
-                continue
-            # Check if the line starts with " -"
-            elif line.startswith('['):
-                # If it doesn't start with " -", it's a new part
-                current_part = line.replace('[', "").replace(']', "").strip()
-                entries[current_part] = {}
-            elif line.startswith(' -') or line.startswith('-'):
-                current_event = line.replace("-", "").strip()
-                entries[current_part][current_event] = []
-            else:
-                # Its dialogue or event notes.
-                entries[current_part][current_event].append(line.strip())
-    return entries
+def parse_event_order_to_dict(path=EVENT_ORDER_FILE):
+    # Take my event order notes and turn them into a dict: {part: [scenes in order]}.
+    # The file is streamed through the deck compiler, so nothing is held in memory but the result.
+    return compile_events(path)
+
+
+def parse_dialogue_to_dict(path=DIALOGUE_FILE):
+    # Take my dialogue notes for Jesus and turn them into a dict: {part: {scene: [lines]}}.
+    return compile_dialogue(path)
 
 
 if __name__ == "__main__":
-    NUMBER_MAP = {
-        1: "Part One",
-        2: "Part Two",
-        3: "Part Three",
-        4: "Part Four",
-        5: "Part Five",
-        6: "Part Six"
-    }
-    INVERTED_NUMBER_MAP = {v: k for k, v in NUMBER_MAP.items()}
-    NUMBER_MAP = {**NUMBER_MAP, **INVERTED_NUMBER_MAP}
-
-    events = parse_event_order_to_dict()
-    dialogue = parse_dialogue_to_dict()
-    _root = tk.Tk()
-    game = MarkDramaFlashcards(_root, _dialogue=dialogue, _events=events)
-    _root.mainloop()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mark Drama Learning")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always re-parse the knowledge base text files instead of using the compiled deck cache")
+    parser.add_argument("--timing", action="store_true", help="print how long it took to get the first window up")
+    parser.add_argument("--no-reload", action="store_true",
+                        help="don't pick up edits to the knowledge base text files while the game is open")
+    parser.add_argument("--latency", nargs="?", const="-", metavar="FILE",
+                        help="time every button/callback and print a latency report on exit, or write it to FILE "
+                             "(as JSON if FILE ends in .json)")
+    parser.add_argument("--decks", metavar="DIR",
+                        help="list every deck in DIR (<name>_dialogue.txt + <name>_event_order.txt) on the title "
+                             "screen, loading them in the background")
+    parser.add_argument("--seed", type=int,
+                        help="seed every session from this, so the same seed and the same answers replay the same game")
+    parser.add_argument("--record", metavar="FILE",
+                        help="append each session's seed and answers to FILE, for python mark_replay.py FILE")
+    parser.add_argument("--options", type=int, default=4, metavar="N",
+                        help=f"multiple choice options per question, {MIN_OPTIONS} to {MAX_OPTIONS}")
+    parser.add_argument("--log-level", choices=list(LEVELS), default="info",
+                        help="the least serious diagnostics to show (debug includes every question asked)")
+    parser.add_argument("--log-file", metavar="FILE",
+                        help=f"also write diagnostics to FILE as JSON lines (the windowed build always writes them, "
+                             f"to {LOG_FILE} unless this says otherwise)")
+    args = parser.parse_args()
+    try:
+        check_option_count(args.options)
+    except ValueError as error:
+        parser.error(str(error))
+
+    # The windowed (console=False) build has no stdout, so without a file its diagnostics would go nowhere.
+    log_file = args.log_file if args.log_file or sys.stdout is not None else LOG_FILE
+    configure(LEVELS[args.log_level], log_file)
+
+    start_time = time.perf_counter()
+    if args.decks:
+        # Nothing is parsed up front, the window comes up straight away and the decks fill in behind it.
+        game = MarkDramaFlashcards(None, _dialogue={}, _events={}, _duplicate_scenes={})
+        if args.latency:
+            game.instrument_callbacks(report_path=None if args.latency == "-" else args.latency)
+        game.reload_decks = not args.no_reload
+        game.record_sessions(args.seed, args.record)
+        game.set_option_count(args.options)
+        game.load_decks(DeckLoader(args.decks, use_cache=not args.no_cache, watch=not args.no_reload))
+        deck_loaded_time = start_time
+        _root = game.show()
+    else:
+        # The watcher comes with the deck, from the stamps and hashes the load took, rather than reading both files
+        # again here before the window is up.
+        (dialogue, events, duplicate_scenes), watcher = load_watched_deck(use_cache=not args.no_cache)
+        deck_loaded_time = time.perf_counter()
+        warn_duplicates(duplicate_scenes, EVENT_ORDER_FILE)
+        game = MarkDramaFlashcards(None, _dialogue=dialogue, _events=events, _duplicate_scenes=duplicate_scenes)
+        game.record_sessions(args.seed, args.record)
+        game.set_option_count(args.options)
+        if args.latency:
+            game.instrument_callbacks(report_path=None if args.latency == "-" else args.latency)
+        _root = game.show()
+        if not args.no_reload:
+            game.watch_deck(watcher)
+    if args.timing:
+        # after_idle fires once the title screen has actually been drawn.
+        _root.after_idle(lambda: log.info("startup_timing", "Deck loaded in {deck_ms:.1f} ms ({cache}), first window "
+                                          "after {window_ms:.1f} ms", deck_ms=(deck_loaded_time - start_time) * 1000,
+                                          cache="no cache" if args.no_cache else "cache enabled",
+                                          window_ms=(time.perf_counter() - start_time) * 1000))
+    game.run()
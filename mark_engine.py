@@ -0,0 +1,836 @@
+"""
+The headless question engine for the Mark Drama game. Nothing in here touches tkinter, so sessions can be driven from
+scripts, benchmarks or any other front end; MarkDramaFlashcards in mark_drama.py is one view over it.
+
+QuizEngine holds a loaded deck and starts sessions for a selection of parts:
+ - FlashcardSession ("Mode1"): name a scene, the player says what happens and marks themselves right or wrong.
+ - MultipleChoiceSession ("Mode2"): what comes immediately before/after a scene, pick from the options.
+Sessions ask questions in order, at random, or most overdue first when given a spaced repetition scheduler
+(mark_schedule.Scheduler). Given a history log (mark_history.HistoryLog), every graded answer is recorded in it.
+Flashcards can also be graded automatically from a typed answer, with the deck's mark_grade.AnswerIndex, and played
+over just the scenes a search found (mark_search.SearchIndex).
+When the deck is edited while a session is running (see mark_deck.DeckWatcher), QuizEngine.reload_session brings the
+session up to date without starting it again: new scenes are added, deleted ones dropped, the score is kept.
+A session started with a seed draws everything from its own random.Random(seed) and keeps a SessionRecording of its
+answers, which QuizEngine.replay plays back to the same questions (see mark_replay.py).
+
+Building blocks:
+
+QuestionPool holds the questions still to be answered in a session, with O(1) random draws and removals.
+IdPool is the same for scene ids from a mark_deck.DialogueStore, which is what flashcard sessions play from.
+EventSequence holds the event order for the selected parts, with a scene -> position index so neighbour lookups
+("what comes immediately after...?") never scan the list, and a QuestionPool of the scenes still to be answered.
+DistractorEngine picks the wrong options for a multiple-choice question in bounded time.
+MultipleChoiceQuestion is the finished question: what's asked, the options and which one is right.
+QuestionBank is every multiple-choice question a selection of parts can ask, worked out once and kept by the
+QuizEngine for each selection, so starting a session is a copy of a pool and asking a question is a lookup.
+"""
+import random
+import time
+from array import array
+from bisect import insort
+
+from mark_deck import NUMBER_MAP, DialogueStore, describe_duplicates, find_duplicate_scenes
+from mark_grade import AnswerIndex
+from mark_search import SearchIndex
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"  # Spelled out rather than string.ascii_uppercase, string pulls in re
+MIN_OPTIONS = 2  # Multiple choice options per question, at least a right answer and one wrong one
+MAX_OPTIONS = len(LETTERS)  # and no more than there are letters to label them with
+AFTER = "after"
+BEFORE = "before"
+
+# Game modes, also the keys spaced repetition progress is saved under (see mark_schedule)
+FLASHCARDS = "flashcards"
+MULTIPLE_CHOICE = "multiple choice"
+
+
+def check_option_count(n_options):
+    # n_options back if it's a number of multiple choice options a question can be asked with, ValueError if not.
+    if type(n_options) is not int or not MIN_OPTIONS <= n_options <= MAX_OPTIONS:
+        raise ValueError(f"Multiple choice needs {MIN_OPTIONS} to {MAX_OPTIONS} options per question, "
+                         f"not {n_options!r}.")
+    return n_options
+
+
+class QuestionPool:
+    def __init__(self, questions):
+        # The original order, for "In Order" play.
+        self.order = list(questions)
+        # Remaining questions live in an array for O(1) random draws; _slots maps each one to its index in that array
+        # so it can be swap-removed in O(1). The array order is therefore not the original order, _first tracks the
+        # earliest question (in self.order) that might still be remaining.
+        self._items = list(self.order)
+        self._slots = {question: i for i, question in enumerate(self._items)}
+        if len(self._slots) != len(self._items):
+            raise KeyError("Questions in a pool must be unique.")
+        self._first = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __contains__(self, question):
+        return question in self._slots
+
+    def copy(self):
+        # A pool with the same questions remaining, without checking them again. order is shared, nothing changes it
+        # in place (sync replaces it).
+        pool = QuestionPool.__new__(QuestionPool)
+        pool.order = self.order
+        pool._items = self._items.copy()
+        pool._slots = self._slots.copy()
+        pool._first = self._first
+        return pool
+
+    def __iter__(self):
+        # Remaining questions in their original order.
+        return (question for question in self.order[self._first:] if question in self._slots)
+
+    def draw(self, rng=random):
+        # A uniformly random remaining question, or None once they're all answered.
+        return self._items[rng.randrange(len(self._items))] if self._items else None
+
+    def first(self):
+        # Earliest remaining question in the original order. Amortised O(1) over a session.
+        while self._first < len(self.order) and self.order[self._first] not in self._slots:
+            self._first += 1
+        return self.order[self._first] if self._first < len(self.order) else None
+
+    def remove(self, question):
+        # Move the last remaining question into the removed one's slot and drop the tail.
+        slot = self._slots.pop(question)
+        last = self._items.pop()
+        if slot < len(self._items):
+            self._items[slot] = last
+            self._slots[last] = slot
+
+    def sync(self, questions):
+        # Bring the pool in line with an edited list of questions. Questions that are new are remaining, ones that are
+        # gone are dropped, and the rest keep whether they've been answered. Returns (added, removed).
+        order = list(questions)
+        wanted = set(order)
+        if len(wanted) != len(order):
+            raise KeyError("Questions in a pool must be unique.")
+        known = set(self.order)
+        removed = [question for question in self.order if question not in wanted]
+        added = [question for question in order if question not in known]
+        for question in removed:
+            if question in self._slots:
+                self.remove(question)
+        for question in added:
+            self._slots[question] = len(self._items)
+            self._items.append(question)
+        self.order = order
+        self._first = 0
+        return added, removed
+
+
+class IdPool:
+    # A QuestionPool of scene ids (0 <= id < capacity, see mark_deck.DialogueStore), in arrays where QuestionPool has
+    # a list and a dict, so a session over a big deck costs a few bytes a question. There's no sync: ids change when
+    # the store is rebuilt, so FlashcardSession.reload builds a new pool instead.
+    def __init__(self, ids, capacity):
+        self.order = array("q", ids)
+        self._items = array("q", self.order)
+        self._slots = array("q", [-1]) * capacity  # Index in _items of each id that's still remaining, -1 otherwise
+        slots = self._slots
+        for slot, question in enumerate(self._items):
+            if slots[question] != -1:
+                raise KeyError("Questions in a pool must be unique.")
+            slots[question] = slot
+        self._first = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __contains__(self, question):
+        # None is a scene a reload has deleted from the deck, so it can't be remaining.
+        return question is not None and self._slots[question] != -1
+
+    def __iter__(self):
+        return (question for question in self.order[self._first:] if self._slots[question] != -1)
+
+    def draw(self, rng=random):
+        return self._items[rng.randrange(len(self._items))] if self._items else None
+
+    def first(self):
+        order = self.order
+        while self._first < len(order) and self._slots[order[self._first]] == -1:
+            self._first += 1
+        return order[self._first] if self._first < len(order) else None
+
+    def remove(self, question):
+        slot = self._slots[question]
+        if slot == -1:
+            raise KeyError(question)
+        self._slots[question] = -1
+        last = self._items.pop()
+        if slot < len(self._items):
+            self._items[slot] = last
+            self._slots[last] = slot
+
+
+class EventSequence:
+    def __init__(self, scenes):
+        self.scenes = list(scenes)
+        self.positions = {scene: i for i, scene in enumerate(self.scenes)}
+        if len(self.positions) != len(self.scenes):
+            raise KeyError("Scene names in an event sequence must be unique.")
+
+        # Scenes still to be answered.
+        self.remaining = QuestionPool(self.scenes)
+
+    @classmethod
+    def from_bank(cls, bank):
+        # A sequence over a QuestionBank's scenes, sharing its list and index (sync replaces them rather than
+        # editing them) with a fresh copy of its pool.
+        sequence = cls.__new__(cls)
+        sequence.scenes = bank.scenes
+        sequence.positions = bank.positions
+        sequence.remaining = bank.remaining.copy()
+        return sequence
+
+    def __len__(self):
+        return len(self.scenes)
+
+    def __iter__(self):
+        return iter(self.scenes)
+
+    def __getitem__(self, position):
+        return self.scenes[position]
+
+    def __contains__(self, scene):
+        return scene in self.positions
+
+    def index(self, scene):
+        return self.positions[scene]
+
+    def neighbour(self, scene, offset):
+        # The scene `offset` places away from `scene`, or None if that runs off either end.
+        position = self.positions[scene] + offset
+        if 0 <= position < len(self.scenes):
+            return self.scenes[position]
+        return None
+
+    def after(self, scene):
+        return self.neighbour(scene, 1)
+
+    def before(self, scene):
+        return self.neighbour(scene, -1)
+
+    def clamped(self, position):
+        # The scene at position, pulled back inside the sequence if it's out of range.
+        return self.scenes[max(0, min(position, len(self.scenes) - 1))]
+
+    def is_remaining(self, scene):
+        return scene in self.remaining
+
+    def remove(self, scene):
+        # Mark a scene as answered.
+        self.remaining.remove(scene)
+
+    def first_remaining(self):
+        return self.remaining.first()
+
+    def random_remaining(self, rng=random):
+        return self.remaining.draw(rng)
+
+    def sync(self, scenes):
+        # Take on an edited event order, keeping which scenes have been answered. Returns (added, removed).
+        scenes = list(scenes)
+        positions = {scene: i for i, scene in enumerate(scenes)}
+        if len(positions) != len(scenes):
+            raise KeyError("Scene names in an event sequence must be unique.")
+        added, removed = self.remaining.sync(scenes)
+        self.scenes = scenes
+        self.positions = positions
+        return added, removed
+
+
+class DistractorEngine:
+    # Wrong options for "What comes immediately after/before...?" questions.
+    # A few "sneaky" ones come from close to the correct answer in the event order, the rest from anywhere. Every pick
+    # is sampled without replacement, so the work per question is bounded by the window and the number of options no
+    # matter how small the selected parts are or how alike the scene names look.
+    def __init__(self, sequence, window=3, sneaky=2):
+        self.sequence = sequence
+        self.sneaky = sneaky
+        # The neighbourhood of a scene is the same shape everywhere, so it's worked out once as a list of offsets and
+        # just clamped to the ends of the sequence per question.
+        self.offsets = [offset for offset in range(-window, window + 1) if offset]
+
+    def max_options(self):
+        # The scene being asked about can never be one of its own options.
+        return max(0, len(self.sequence) - 1)
+
+    def options(self, question, correct_answer, n_options=4, rng=random):
+        # The correct answer plus up to n_options - 1 distinct distractors, shuffled.
+        question_position = self.sequence.index(question)
+        correct_position = self.sequence.index(correct_answer)
+        return self.options_near(question_position, correct_position,
+                                 self.candidates(question_position, correct_position), n_options, rng)
+
+    def candidates(self, question_position, correct_position):
+        # Where the sneaky distractors can come from: the in-range neighbourhood of the correct answer, minus the
+        # question itself.
+        size = len(self.sequence.scenes)
+        return tuple(position for position in (correct_position + offset for offset in self.offsets)
+                     if 0 <= position < size and position != question_position)
+
+    def options_near(self, question_position, correct_position, candidates, n_options=4, rng=random):
+        # options() with the positions and sneaky candidates already worked out, see QuestionBank.
+        scenes = self.sequence.scenes
+        size = len(scenes)
+        n_options = min(n_options, self.max_options())
+        random_ = rng.random
+        options = [scenes[correct_position]]
+
+        # Sneaky ones: a partial shuffle of the in-range neighbourhood, so no neighbour is drawn twice.
+        near = list(candidates)
+        sneaky = min(self.sneaky, len(near), n_options - 1)
+        for i in range(sneaky):
+            j = i + int(random_() * (len(near) - i))
+            near[i], near[j] = near[j], near[i]
+            options.append(scenes[near[i]])
+
+        # The rest: draw from the positions that aren't taken yet by drawing from a range that's shorter by the number
+        # taken, then stepping over each taken position at or below the draw. Never rejects, never retries.
+        taken = sorted([question_position, correct_position, *near[:sneaky]])
+        for _ in range(n_options - len(options)):
+            position = int(random_() * (size - len(taken)))
+            for taken_position in taken:
+                if position < taken_position:
+                    break
+                position += 1
+            insort(taken, position)
+            options.append(scenes[position])
+
+        rng.shuffle(options)
+        return options
+
+
+class MultipleChoiceQuestion:
+    # A read-only multiple-choice question. The correct option's index is worked out once when the question is made,
+    # so grading a click is a single comparison and the options never have to be parsed back out of the label text.
+    __slots__ = ("scene", "direction", "options", "correct_index")
+
+    def __init__(self, scene, direction, options, correct_index):
+        object.__setattr__(self, "scene", scene)
+        object.__setattr__(self, "direction", direction)
+        object.__setattr__(self, "options", tuple(options))
+        object.__setattr__(self, "correct_index", correct_index)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.scene!r}, {self.direction!r}, {self.options!r}, {self.correct_index!r})"
+
+    @property
+    def correct_answer(self):
+        return self.options[self.correct_index]
+
+    def is_correct(self, index):
+        return index == self.correct_index
+
+    def prompt(self):
+        return f"What comes immediately {self.direction}...\n'{self.scene}'"
+
+    def render_options(self):
+        # "A: ...\nB: ...\n", one line per option.
+        return "".join(f"{letter}: {option}\n" for letter, option in zip(LETTERS, self.options))
+
+
+def multiple_choice_question(sequence, distractors, scene, direction, n_options=4, rng=random):
+    # Ask what comes immediately before/after scene. Nothing comes after the last scene or before the first, so those
+    # are asked the other way round.
+    if sequence.after(scene) is None:
+        direction = BEFORE
+    elif sequence.before(scene) is None:
+        direction = AFTER
+    correct_answer = sequence.neighbour(scene, 1 if direction == AFTER else -1)
+    options = distractors.options(scene, correct_answer, n_options, rng)
+    return MultipleChoiceQuestion(scene, direction, options, options.index(correct_answer))
+
+
+class QuestionBank:
+    # Every (scene, direction) multiple-choice question of one selection of parts, worked out up front: which way
+    # round it's really asked (nothing comes after the last scene), the correct answer, and the neighbourhood its
+    # sneaky distractors are drawn from. Read-only once built and shared by every session over the same parts, so
+    # asking a question is a lookup plus the random draws, which are made exactly as multiple_choice_question makes
+    # them: the same rng gives the same questions either way.
+    def __init__(self, scenes, source=None, window=3, sneaky=2):
+        self.scenes = list(scenes)
+        self.positions = {scene: i for i, scene in enumerate(self.scenes)}
+        if len(self.positions) != len(self.scenes):
+            raise KeyError("Scene names in an event sequence must be unique.")
+        # What it was built from, ((part, scenes), ...) as select_parts gives it, see QuizEngine.question_bank
+        self.source = source
+        self.remaining = QuestionPool(self.scenes)  # Copied for each session, never played itself
+        self.distractors = DistractorEngine(self, window, sneaky)
+        # {direction asked for: [(direction asked, correct position, sneaky candidates)]}, one entry per scene.
+        self.questions = {AFTER: [], BEFORE: []}
+        last = len(self.scenes) - 1
+        if last < 1:
+            # Too few scenes to ask anything, sessions refuse to start.
+            return
+        for position in range(last + 1):
+            for direction, entries in self.questions.items():
+                if position == last:
+                    direction = BEFORE
+                elif position == 0:
+                    direction = AFTER
+                correct = position + 1 if direction == AFTER else position - 1
+                entries.append((direction, correct, self.distractors.candidates(position, correct)))
+
+    def __len__(self):
+        return len(self.scenes)
+
+    def index(self, scene):
+        return self.positions[scene]
+
+    def question(self, scene, direction, n_options=4, rng=random):
+        # The MultipleChoiceQuestion multiple_choice_question would make for scene.
+        position = self.positions[scene]
+        direction, correct, candidates = self.questions[direction][position]
+        options = self.distractors.options_near(position, correct, candidates, n_options, rng)
+        return MultipleChoiceQuestion(scene, direction, options, options.index(self.scenes[correct]))
+
+
+def part_mask(parts):
+    # A selection of part numbers as a bitmask, part 1 is bit 0. The same parts in any order give the same mask.
+    mask = 0
+    for part in parts:
+        mask |= 1 << (part - 1)
+    return mask
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Sessions
+
+class DuplicateScenesError(KeyError):
+    pass
+
+
+class NotEnoughScenesError(ValueError):
+    pass
+
+
+def select_parts(entries, parts):
+    # The entries (dialogue or events) for the selected part numbers, in deck order.
+    return {part: value for part, value in entries.items() if NUMBER_MAP.get(part) in parts}
+
+
+def unique_scenes(selected, events, duplicate_scenes=None):
+    # The scenes of the selected entries ({part: [scenes]}) in order, refusing scenes that appear in two of them.
+    if duplicate_scenes is None:
+        duplicate_scenes = find_duplicate_scenes(events)
+    # Only the duplicates that fall within the selected parts matter for a session.
+    duped_scenes = {scene: places for scene, places in duplicate_scenes.items()
+                    if sum(part in selected for part, _ in places) >= 2}
+    if duped_scenes:
+        raise DuplicateScenesError(f"Hey! Please make sure your scene names in the event order text file are "
+                                   f"unique. I found these ones at least twice:\n"
+                                   f"{describe_duplicates(duped_scenes)}")
+    return [scene for scenes in selected.values() for scene in scenes]
+
+
+def new_score():
+    return {"correct": 0, "total": 0}
+
+
+def new_seed():
+    # A fresh seed for a session, from the OS rather than the shared random module, so seeding never disturbs it.
+    return random.SystemRandom().getrandbits(63)
+
+
+class ReplayError(ValueError):
+    pass
+
+
+class SessionRecording:
+    # How a seeded session was started and every answer given in it, enough to play it again exactly: started the
+    # same way with the same seed, a session asks the same questions, so giving the same answers in order re-drives it
+    # through the same states. answers are [scene asked, answer, correct], where answer is the option index (multiple
+    # choice), True/False (a flashcard marked by the player) or the typed text (a flashcard graded automatically).
+    def __init__(self, mode, seed, settings, answers=None):
+        self.mode = mode
+        self.seed = seed
+        self.settings = settings  # The QuizEngine.start_* arguments, besides the seed
+        self.answers = [] if answers is None else answers
+
+    def __len__(self):
+        return len(self.answers)
+
+    def record(self, scene, answer, correct):
+        self.answers.append([scene, answer, correct])
+
+    def to_dict(self):
+        return {"mode": self.mode, "seed": self.seed, "settings": self.settings, "answers": self.answers}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["mode"], data["seed"], data["settings"], data["answers"])
+
+
+def pick_next(remaining, due_queue, ordered, rng):
+    # Spaced repetition order if there's a due queue, otherwise in order or at random from the QuestionPool.
+    if due_queue is not None:
+        return due_queue.next()
+    return remaining.first() if ordered else remaining.draw(rng)
+
+
+class Session:
+    # What flashcard and multiple choice sessions share: grading an answer and when the session is over. Subclasses set
+    # mode and have remaining, due_queue, history, score, recording and asked_at, and say how a scene is looked up in
+    # and taken out of their pool (_in_deck, _remove).
+    mode = None
+
+    @property
+    def finished(self):
+        # Spaced repetition sessions also finish when the cards left aren't due yet, see mark_schedule.DueQueue.next
+        return not self.remaining or (self.due_queue is not None and self.due_queue.next() is None)
+
+    def _answered(self, scene, answer, correct):
+        # Score an answer to scene, graded correct or not, and pass it on to the recording (which keeps answer), the
+        # spaced repetition schedule and the history. A scene only leaves the pool once it's been got right. Returns
+        # correct.
+        self.score["total"] += 1
+        if self.recording is not None:
+            self.recording.record(scene, answer, correct)
+        # Not in the deck any more if a reload deleted it while it was being asked.
+        in_deck = self._in_deck(scene)
+        if self.due_queue is not None and in_deck:
+            self.due_queue.answered(scene, correct)
+        if self.history is not None:
+            self.history.record(self.mode, scene, correct, self.asked_at, time.time())
+        if correct:
+            self.score["correct"] += 1
+            if in_deck:
+                self._remove(scene)
+        return correct
+
+
+class FlashcardSession(Session):
+    mode = FLASHCARDS
+
+    def __init__(self, deck, parts, ordered=True, rng=random, scheduler=None, history=None, answer_index=None,
+                 scenes=None):
+        # deck is a mark_deck.DialogueStore; the session keeps scene ids into it, never a copy of the lines.
+        # With a mark_schedule.Scheduler, cards are asked most overdue first instead of in order or at random.
+        # With a mark_grade.AnswerIndex, typed answers can be marked automatically, see auto_mark.
+        # With scenes (search results, say), only those scenes of the selected parts are asked, in that order.
+        self.parts = list(parts)
+        self.scenes = list(scenes) if scenes is not None else None
+        self.ordered = ordered
+        self.rng = rng
+        self.deck = deck
+        self.questions = deck.select(self.parts, self.scenes)
+        self.ids = self.question_ids(deck, self.questions)
+        self.remaining = IdPool(self.questions, len(deck))
+        self.due_queue = scheduler.queue(FLASHCARDS, self.scene_names()) if scheduler is not None else None
+        self.history = history
+        self.answer_index = answer_index
+        self.total_questions = len(self.remaining)
+        self.score = new_score()
+        self.current = None  # The scene being asked, by name
+        self.current_id = None  # and by id, None if a reload has deleted it from the deck
+        self._deleted_text = None  # The current scene's lines if a reload has deleted it, until it's been marked
+        self.asked_at = None
+        self.recording = None  # A SessionRecording, for sessions started with a seed
+
+    @staticmethod
+    def question_ids(deck, questions):
+        # {scene name: id} for the session's questions. Where a name is in more than one part, the deck's own ids
+        # point at its last appearance anywhere, which may not be one of the selected parts.
+        return deck.ids if deck.unique else deck.id_map(questions)
+
+    def scene_names(self, ids=None):
+        names = self.deck.names
+        return [names[scene_id] for scene_id in (self.questions if ids is None else ids)]
+
+    def reload(self, deck):
+        # Take on a DialogueStore built from the edited dialogue mid-session. Ids change between stores, so the new
+        # pool is built from names: scenes answered already stay answered. Returns (added, removed) scenes.
+        old_names = self.scene_names()
+        answered = {self.deck.names[scene_id] for scene_id in self.questions if scene_id not in self.remaining}
+        questions = deck.select(self.parts, self.scenes)
+        names = [deck.names[scene_id] for scene_id in questions]
+        known, wanted = set(old_names), set(names)
+        added = [scene for scene in names if scene not in known]
+        removed = [scene for scene in old_names if scene not in wanted]
+
+        remaining = IdPool(questions, len(deck))
+        for scene_id, scene in zip(questions, names):
+            if scene in answered:
+                remaining.remove(scene_id)
+        if self.current_id is not None and self.current not in wanted:
+            # Deleted but still on screen, so its lines stay available until it's been marked.
+            self._deleted_text = self.deck.text(self.current_id)
+        ids = self.question_ids(deck, questions)
+        self.current_id = ids[self.current] if self.current in wanted else None
+
+        if self.due_queue is not None:
+            self.due_queue.sync(added, removed)
+        self.deck = deck
+        self.questions = questions
+        self.ids = ids
+        self.remaining = remaining
+        self.total_questions += len(added) - len(removed)
+        return added, removed
+
+    def next_question(self):
+        # The next scene to ask about, or None once every card has been got right (or none of the rest are due yet).
+        self._deleted_text = None
+        if self.due_queue is not None:
+            self.current = self.due_queue.next()
+            self.current_id = self.ids[self.current] if self.current is not None else None
+        else:
+            self.current_id = self.remaining.first() if self.ordered else self.remaining.draw(self.rng)
+            self.current = self.deck.names[self.current_id] if self.current_id is not None else None
+        self.asked_at = time.time()
+        return self.current
+
+    def answer_text(self):
+        # The current scene's lines, joined with "\n".
+        if self.current_id is None:
+            return self._deleted_text or ""
+        return self.deck.text(self.current_id)
+
+    def reveal_text(self):
+        # The current scene's answer as the flashcard window shows it, or None if the scene is blank.
+        if self.current_id is None:
+            return self._deleted_text + "\n" if self._deleted_text and self._deleted_text.strip() else None
+        return self.deck.reveal_text(self.current_id)
+
+    def answer_lines(self):
+        text = self.answer_text()
+        return text.split("\n") if text else []
+
+    def mark(self, correct, typed=None):
+        # Flashcards are self-marked. typed is the answer auto_mark graded, if it was graded automatically.
+        return self._answered(self.current, correct if typed is None else typed, correct)
+
+    def _in_deck(self, scene):
+        # scene is always the current card, whose id says where it is in this deck (None if a reload deleted it).
+        return self.current_id in self.remaining
+
+    def _remove(self, scene):
+        self.remaining.remove(self.current_id)
+
+    def auto_mark(self, answer):
+        # Mark the current card from a typed answer. Returns (similarity, correct), or None (and marks nothing) if
+        # there's no answer index or the scene has no lines to compare against, so the player has to mark it.
+        if self.answer_index is None:
+            return None
+        result = self.answer_index.grade(self.current, self.answer_text(), answer)
+        if result is not None:
+            # Straight to _answered rather than through mark, so timing both (see mark_replay.py) counts each answer
+            # once.
+            self._answered(self.current, answer, result[1])
+        return result
+
+
+class MultipleChoiceSession(Session):
+    mode = MULTIPLE_CHOICE
+
+    def __init__(self, events, parts, ordered=True, direction=AFTER, n_options=4, rng=random, duplicate_scenes=None,
+                 scheduler=None, history=None, bank=None):
+        # direction is AFTER, BEFORE, or None to pick one at random for each question.
+        # With a mark_schedule.Scheduler, scenes are asked most overdue first instead of in order or at random.
+        # With the QuestionBank of these parts (see QuizEngine.question_bank), events isn't looked at again and the
+        # questions come from the bank.
+        self.parts = list(parts)
+        self.ordered = ordered
+        self.direction = direction
+        self.n_options = check_option_count(n_options)
+        self.rng = rng
+
+        if bank is None:
+            self.event_sequence = EventSequence(self.select_scenes(events, duplicate_scenes))
+        else:
+            self.check_enough_scenes(bank.scenes)
+            self.event_sequence = EventSequence.from_bank(bank)
+        self.bank = bank
+        self.distractors = DistractorEngine(self.event_sequence)
+        # The sequence keeps this pool up to date as scenes are answered, see EventSequence.remove
+        self.remaining = self.event_sequence.remaining
+        self.due_queue = scheduler.queue(MULTIPLE_CHOICE, self.event_sequence) if scheduler is not None else None
+        self.history = history
+        self.total_questions = len(self.remaining)
+        self.score = new_score()
+        self.current = None
+        self.asked_at = None
+        self.recording = None  # A SessionRecording, for sessions started with a seed
+
+    def select_scenes(self, events, duplicate_scenes=None):
+        # The scenes of the selected parts in order, checked for being playable.
+        scenes = unique_scenes(select_parts(events, self.parts), events, duplicate_scenes)
+        self.check_enough_scenes(scenes)
+        return scenes
+
+    def check_enough_scenes(self, scenes):
+        # The scene being asked about can never be one of its own options, see DistractorEngine.max_options
+        if len(scenes) - 1 < self.n_options:
+            raise NotEnoughScenesError(f"You can't play multichoice with fewer than {self.n_options + 1} options. "
+                                       f"Please add more to the event order text file.")
+
+    def reload(self, events, duplicate_scenes=None):
+        # Take on an edited events dict mid-session. Returns (added, removed) scenes. If the edit leaves the selected
+        # parts unplayable (duplicates, too few scenes) this raises like starting a session would, and the session
+        # carries on with the event order it had.
+        added, removed = self.event_sequence.sync(self.select_scenes(events, duplicate_scenes))
+        # The bank was built for the event order as it was, the rest of the session asks questions live.
+        self.bank = None
+        if self.due_queue is not None:
+            self.due_queue.sync(added, removed)
+        self.total_questions += len(added) - len(removed)
+        return added, removed
+
+    def next_question(self):
+        # The next MultipleChoiceQuestion, or None once every scene has been answered correctly (or none of the rest are
+        # due yet).
+        scene = pick_next(self.remaining, self.due_queue, self.ordered, self.rng)
+        if scene is None:
+            self.current = None
+            return None
+        direction = self.direction or self.rng.choice([BEFORE, AFTER])
+        if self.bank is not None:
+            self.current = self.bank.question(scene, direction, self.n_options, self.rng)
+        else:
+            self.current = multiple_choice_question(self.event_sequence, self.distractors, scene, direction,
+                                                    self.n_options, self.rng)
+        self.asked_at = time.time()
+        return self.current
+
+    def answer(self, index):
+        # Grade the option at index for the current question.
+        return self._answered(self.current.scene, index, self.current.is_correct(index))
+
+    def _in_deck(self, scene):
+        return scene in self.remaining
+
+    def _remove(self, scene):
+        self.event_sequence.remove(scene)
+
+
+def replay_step(session, scene, answer):
+    # Ask the next question, check it's the recorded one, and answer it as recorded. Returns whether it was right.
+    question = session.next_question()
+    asked = question.scene if isinstance(question, MultipleChoiceQuestion) else question
+    if asked != scene:
+        raise ReplayError(f"Expected to be asked {scene!r} but was asked {asked!r}")
+    if isinstance(session, MultipleChoiceSession):
+        return session.answer(answer)
+    if isinstance(answer, str):
+        result = session.auto_mark(answer)
+        return None if result is None else result[1]
+    return session.mark(answer)
+
+
+class QuizEngine:
+    def __init__(self, dialogue, events, duplicate_scenes=None):
+        self.dialogue = dialogue
+        self.events = events
+        # Checked once when the deck is loaded, {scene: [(part, line_no), ...]}, see mark_deck.build_events
+        self.duplicate_scenes = duplicate_scenes if duplicate_scenes is not None else find_duplicate_scenes(events)
+        self._answer_index = None
+        self._search_index = None
+        self._dialogue_store = None
+        self._question_banks = {}  # {part_mask(parts): QuestionBank}, at most one per selection of the six parts
+
+    def dialogue_store(self):
+        # The mark_deck.DialogueStore flashcard sessions play from, built the first time it's asked for.
+        if self._dialogue_store is None:
+            self._dialogue_store = DialogueStore(self.dialogue)
+        return self._dialogue_store
+
+    def search_index(self):
+        # The deck's mark_search.SearchIndex, built the first time it's asked for.
+        if self._search_index is None:
+            self._search_index = SearchIndex(self.dialogue)
+        return self._search_index
+
+    def dialogue_changed(self):
+        # Call after the dialogue dict has been edited in place (see mark_deck.DeckWatcher). The search index and the
+        # dialogue store are built again the next time they're needed; the answer index re-indexes changed scenes by
+        # itself.
+        self._search_index = None
+        self._dialogue_store = None
+
+    def answer_index(self):
+        # The deck's mark_grade.AnswerIndex, built the first time it's asked for and kept for the life of the deck.
+        if self._answer_index is None:
+            self._answer_index = AnswerIndex(self.dialogue)
+        return self._answer_index
+
+    def start_flashcards(self, parts, ordered=True, rng=random, scheduler=None, history=None, auto_grade=False,
+                         scenes=None, seed=None):
+        # With a seed (an int or str, see new_seed), the session gets random.Random(seed) instead of rng and records
+        # its answers, see SessionRecording. Spaced repetition sessions aren't recorded: the order they ask in comes
+        # from the scheduler's saved progress, which a recording can't bring back.
+        answer_index = self.answer_index() if auto_grade else None
+        if seed is not None:
+            rng = random.Random(seed)
+        session = FlashcardSession(self.dialogue_store(), parts, ordered, rng, scheduler, history, answer_index, scenes)
+        if seed is not None and scheduler is None:
+            session.recording = SessionRecording(FLASHCARDS, seed, {"parts": list(parts), "ordered": ordered,
+                                                                    "auto_grade": auto_grade, "scenes": scenes})
+        return session
+
+    def question_bank(self, parts):
+        # The QuestionBank of the selected parts, built the first time they're played together. The events dict is
+        # patched in place when the deck is edited, replacing the scene list of every part that changed, so a bank is
+        # still good as long as the selection is the same lists in the same order; comparing them is a few identity
+        # checks. Raises DuplicateScenesError like starting a session.
+        selected = select_parts(self.events, parts)
+        source = tuple(selected.items())
+        key = part_mask(parts)
+        bank = self._question_banks.get(key)
+        if bank is None or bank.source != source:
+            bank = QuestionBank(unique_scenes(selected, self.events, self.duplicate_scenes), source)
+            self._question_banks[key] = bank
+        return bank
+
+    def start_multiple_choice(self, parts, ordered=True, direction=AFTER, n_options=4, rng=random, scheduler=None,
+                              history=None, seed=None):
+        # seed as for start_flashcards.
+        if seed is not None:
+            rng = random.Random(seed)
+        session = MultipleChoiceSession(self.events, parts, ordered, direction, n_options, rng, self.duplicate_scenes,
+                                        scheduler, history, self.question_bank(parts))
+        if seed is not None and scheduler is None:
+            session.recording = SessionRecording(MULTIPLE_CHOICE, seed, {"parts": list(parts), "ordered": ordered,
+                                                                         "direction": direction,
+                                                                         "n_options": n_options})
+        return session
+
+    def start_recorded(self, recording, history=None):
+        # A new session started exactly as the recorded one was, recording afresh.
+        start = self.start_flashcards if recording.mode == FLASHCARDS else self.start_multiple_choice
+        return start(**recording.settings, history=history, seed=recording.seed)
+
+    def replay(self, recording, session=None):
+        # Play a SessionRecording again and return the session it was played through: session if given (from
+        # start_recorded, say to time its methods, see mark_replay.py), otherwise a new one. Raises ReplayError as soon
+        # as a question or a grade comes out different from the recording, which means the deck or the engine has
+        # changed what it does.
+        if session is None:
+            session = self.start_recorded(recording)
+        for number, (scene, answer, correct) in enumerate(recording.answers, 1):
+            if replay_step(session, scene, answer) != correct:
+                raise ReplayError(f"Answer {number} to {scene!r} was marked {'right' if correct else 'wrong'} when "
+                                  f"it was recorded, but not this time")
+        return session
+
+    def reload_session(self, session):
+        # Bring a running session up to date once the deck dicts have been patched. Returns (added, removed) scenes.
+        if isinstance(session, FlashcardSession):
+            return session.reload(self.dialogue_store())
+        return session.reload(self.events, self.duplicate_scenes)
@@ -0,0 +1,307 @@
+"""
+Printable quiz sheets for the Mark Drama game: any number of randomised paper quizzes, each with its answer key.
+
+    python mark_export.py 1000 quizzes/ [--format text|html|csv] [--parts 1 2 3] [--multiple-choice 10]
+                          [--options 4] [--flashcards 5] [--seed 0] [--processes N]
+
+Every question is asked by the same sessions the game plays (mark_engine): multiple choice is the "What comes
+immediately after/before...?" of the Multiple Choice mode, with the same distractors, and the written questions are
+the Flashcards prompts with the scene's dialogue as the answer.
+
+Sheet n is drawn from a Random seeded with (seed, n) and nothing else, so the same command always writes the same
+sheets however many processes share the work. The sheets are made in chunks on a process pool and each chunk is
+appended to sheets.<ext> and answers.<ext> as soon as it's done, in order, with only a few chunks in flight at once, so
+memory stays flat however many are asked for. A sheet that asks exactly the same questions as an earlier one is drawn
+again from (seed, n, attempt), in order as it's written, so the sheets stay the same from run to run. Only if the
+selected parts can't make a different sheet in MAX_REDRAWS tries is the repeat kept, and counted and reported.
+"""
+import csv
+import hashlib
+import html
+import os
+import random
+
+from mark_deck import DIALOGUE_FILE, EVENT_ORDER_FILE, NUMBER_MAP, load_deck
+from mark_engine import (LETTERS, MAX_OPTIONS, MIN_OPTIONS, DuplicateScenesError, NotEnoughScenesError, QuizEngine,
+                         check_option_count)
+
+FORMATS = {"text": "txt", "html": "html", "csv": "csv"}
+CHUNK_SIZE = 50  # Sheets per task handed to a worker process
+CHUNKS_IN_FLIGHT = 2  # per worker process, how far ahead of the writer the pool can get
+MAX_REDRAWS = 20  # Tries at a sheet unlike every earlier one before a repeat is let through
+BLANK_ANSWER = "(Jesus has no dialogue in this scene)"
+
+HTML_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>body{{font-family:Helvetica,sans-serif}}section{{page-break-after:always;margin-bottom:2em}}
+ol{{padding-left:1.5em}}li{{margin-bottom:1em}}ol.options{{list-style:upper-alpha}}.lines{{height:5em}}
+pre{{white-space:pre-wrap;font-family:inherit}}</style></head><body>
+"""
+HTML_TAIL = "</body></html>\n"
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Making sheets
+
+def sheet_rng(seed, number, attempt=0):
+    # Seeding with a str hashes it with SHA-512, so neighbouring sheets get unrelated draws, and unlike hash() it's
+    # the same in every process. attempt > 0 draws the sheet again when the first one repeated an earlier sheet.
+    return random.Random(f"{seed}:{number}:{attempt}" if attempt else f"{seed}:{number}")
+
+
+def make_sheet(engine, number, seed, parts, n_choice=10, n_written=5, direction=None, n_options=4, attempt=0):
+    # The questions of sheet `number`, [(prompt, options, answer)]: n_choice multiple choice (n_options options each)
+    # then n_written flashcards, no scene asked twice in either, fewer if the parts don't have enough scenes.
+    rng = sheet_rng(seed, number, attempt)
+    questions = []
+    if n_choice:
+        session = engine.start_multiple_choice(parts, ordered=False, direction=direction, n_options=n_options, rng=rng)
+        for _ in range(n_choice):
+            question = session.next_question()
+            if question is None:
+                break
+            # Answered right so it leaves the pool, exactly as a player getting it right would.
+            session.answer(question.correct_index)
+            answer = f"{LETTERS[question.correct_index]}: {question.correct_answer}"
+            questions.append((question.prompt(), question.options, answer))
+    if n_written:
+        session = engine.start_flashcards(parts, ordered=False, rng=rng)
+        for _ in range(n_written):
+            scene = session.next_question()
+            if scene is None:
+                break
+            text = session.reveal_text()
+            session.mark(True)
+            questions.append((f"'{scene}'\nWhat happens here?", (), text.rstrip("\n") if text else BLANK_ANSWER))
+    return questions
+
+
+def fingerprint(questions):
+    # The same for two sheets that ask the same questions with the same options in the same order, in any process.
+    data = repr([(prompt, options) for prompt, options, _ in questions]).encode()
+    return hashlib.blake2b(data, digest_size=8).digest()
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Rendering
+# Every renderer takes the sheet's number, its questions and the number of options multiple choice questions have
+# (the csv has a column for each).
+
+def csv_header(n_options):
+    return ["sheet", "question", "kind", "prompt", *(f"option {letter}" for letter in LETTERS[:n_options]), "answer"]
+
+
+def render_text(number, questions, n_options):
+    sheet = [f"Mark Drama Quiz - Sheet {number}", "Name: ______________________________", ""]
+    key = [f"Mark Drama Quiz - Sheet {number} answers", ""]
+    for i, (prompt, options, answer) in enumerate(questions, 1):
+        sheet.append(f"{i}. " + prompt.replace("\n", "\n   "))
+        if options:
+            sheet.extend(f"   {letter}: {option}" for letter, option in zip(LETTERS, options))
+        else:
+            sheet.extend(["   ________________________________________"] * 3)
+        sheet.append("")
+        key.append(f"{i}. " + answer.replace("\n", "\n   "))
+    # A form feed starts each sheet on a new page when it's printed.
+    return "\n".join(sheet) + "\n\f", "\n".join(key) + "\n\f"
+
+
+def render_html(number, questions, n_options):
+    sheet = [f"<section><h1>Mark Drama Quiz - Sheet {number}</h1><p>Name: </p><ol>"]
+    key = [f"<section><h1>Mark Drama Quiz - Sheet {number} answers</h1><ol>"]
+    for prompt, options, answer in questions:
+        sheet.append(f"<li><pre>{html.escape(prompt)}</pre>")
+        if options:
+            sheet.append("<ol class=\"options\">" + "".join(f"<li>{html.escape(option)}</li>" for option in options)
+                         + "</ol>")
+        else:
+            sheet.append("<div class=\"lines\"></div>")
+        sheet.append("</li>")
+        key.append(f"<li><pre>{html.escape(answer)}</pre></li>")
+    sheet.append("</ol></section>\n")
+    key.append("</ol></section>\n")
+    return "".join(sheet), "".join(key)
+
+
+def render_csv(number, questions, n_options):
+    # Rows rather than text, the csv module does the quoting when they're written.
+    sheet, key = [], []
+    for i, (prompt, options, answer) in enumerate(questions, 1):
+        kind = "multiple choice" if options else "written"
+        padded = [*options, *[""] * (n_options - len(options))]
+        sheet.append([number, i, kind, prompt, *padded, ""])
+        key.append([number, i, kind, prompt, *padded, answer])
+    return sheet, key
+
+
+RENDERERS = {"text": render_text, "html": render_html, "csv": render_csv}
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# The pool
+
+_worker_engine = None
+
+
+def _init_worker(dialogue, events, duplicates):
+    # Each worker gets the deck once, when it starts, rather than with every chunk.
+    global _worker_engine
+    _worker_engine = QuizEngine(dialogue, events, duplicates)
+
+
+def make_chunk(task, engine=None):
+    # Sheets start..stop-1 rendered, as (sheet parts, key parts, fingerprints), one of each per sheet.
+    start, stop, fmt, seed, parts, n_choice, n_written, direction, n_options = task
+    engine = engine or _worker_engine
+    render = RENDERERS[fmt]
+    sheets, keys, fingerprints = [], [], []
+    for number in range(start, stop):
+        questions = make_sheet(engine, number, seed, parts, n_choice, n_written, direction, n_options)
+        sheet, key = render(number, questions, n_options)
+        sheets.append(sheet)
+        keys.append(key)
+        fingerprints.append(fingerprint(questions))
+    return sheets, keys, fingerprints
+
+
+def chunks_in_order(executor, tasks, in_flight):
+    # make_chunk over tasks on the executor, results in order. executor.map would submit every task at once and hold
+    # each finished chunk until the writer got to it, so only in_flight tasks are submitted ahead of the one written.
+    from collections import deque
+
+    pending = deque()
+    for task in tasks:
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+        pending.append(executor.submit(make_chunk, task))
+    while pending:
+        yield pending.popleft().result()
+
+
+class SheetWriter:
+    # sheets.<ext> and answers.<ext> in a directory, written a sheet at a time.
+    def __init__(self, directory, fmt, n_options=4):
+        os.makedirs(directory, exist_ok=True)
+        extension = FORMATS[fmt]
+        self.fmt = fmt
+        self.paths = [os.path.join(directory, f"sheets.{extension}"), os.path.join(directory, f"answers.{extension}")]
+        newline = "" if fmt == "csv" else None
+        self.files = [open(path, "w", encoding="utf-8", newline=newline) for path in self.paths]
+        if fmt == "csv":
+            self.writers = [csv.writer(file) for file in self.files]
+            for writer in self.writers:
+                writer.writerow(csv_header(n_options))
+        elif fmt == "html":
+            for file, title in zip(self.files, ["Mark Drama Quiz", "Mark Drama Quiz answers"]):
+                file.write(HTML_HEAD.format(title=title))
+
+    def write(self, sheet, key):
+        if self.fmt == "csv":
+            self.writers[0].writerows(sheet)
+            self.writers[1].writerows(key)
+        else:
+            self.files[0].write(sheet)
+            self.files[1].write(key)
+
+    def close(self):
+        for file in self.files:
+            if self.fmt == "html":
+                file.write(HTML_TAIL)
+            file.close()
+
+
+def export_sheets(deck, directory, n_sheets, fmt="text", parts=(1, 2, 3, 4, 5, 6), n_choice=10, n_written=5,
+                  direction=None, seed=0, processes=None, chunk_size=CHUNK_SIZE, n_options=4):
+    # Write n_sheets sheets (numbered from 1) and their answer keys for deck, (dialogue, events, duplicates) as
+    # load_deck returns it. processes=1 makes them in this process. Returns (paths, count of sheets that repeat an
+    # earlier one because no different sheet could be drawn).
+    dialogue, events, duplicates = deck
+    parts = sorted(set(parts))
+    check_option_count(n_options)
+    engine = QuizEngine(dialogue, events, duplicates)
+    # One sheet here first, so a deck that can't be played (NotEnoughScenesError etc.) fails before any workers start.
+    make_sheet(engine, 0, seed, parts, n_choice, n_written, direction, n_options)
+
+    tasks = [(start, min(start + chunk_size, n_sheets + 1), fmt, seed, parts, n_choice, n_written, direction, n_options)
+             for start in range(1, n_sheets + 1, chunk_size)]
+    writer = SheetWriter(directory, fmt, n_options)
+    seen = set()
+    duplicate_sheets = 0
+    executor = None
+    try:
+        if processes == 1 or len(tasks) <= 1:
+            chunks = (make_chunk(task, engine) for task in tasks)
+        else:
+            # concurrent.futures is imported here rather than at the top, like mark_deck.DeckLoader.
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(processes, initializer=_init_worker, initargs=(dialogue, events, duplicates))
+            chunks = chunks_in_order(executor, tasks, CHUNKS_IN_FLIGHT * (processes or os.cpu_count() or 1))
+        render = RENDERERS[fmt]
+        number = 0
+        for sheets, keys, fingerprints in chunks:
+            for sheet, key, digest in zip(sheets, keys, fingerprints):
+                number += 1
+                # Redrawn here, in sheet order, so which sheets get redrawn and how doesn't depend on the workers.
+                attempt = 0
+                while digest in seen and attempt < MAX_REDRAWS:
+                    attempt += 1
+                    questions = make_sheet(engine, number, seed, parts, n_choice, n_written, direction, n_options,
+                                           attempt)
+                    sheet, key = render(number, questions, n_options)
+                    digest = fingerprint(questions)
+                if digest in seen:
+                    duplicate_sheets += 1
+                seen.add(digest)
+                writer.write(sheet, key)
+    finally:
+        writer.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return writer.paths, duplicate_sheets
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from mark_log import log
+
+    parser = argparse.ArgumentParser(description="Mark Drama Learning, printable quiz sheets")
+    parser.add_argument("sheets", type=int,
+                        help="how many sheets to make, no two alike as long as the selected parts have enough scenes")
+    parser.add_argument("directory", help="where to write sheets.<ext> and answers.<ext>")
+    parser.add_argument("--format", choices=list(FORMATS), default="text")
+    parser.add_argument("--parts", type=int, nargs="+", choices=[part for part in NUMBER_MAP if isinstance(part, int)],
+                        default=[1, 2, 3, 4, 5, 6])
+    parser.add_argument("--multiple-choice", type=int, default=10, metavar="N",
+                        help="multiple choice questions per sheet")
+    parser.add_argument("--options", type=int, default=4, metavar="N",
+                        help=f"options per multiple choice question, {MIN_OPTIONS} to {MAX_OPTIONS}")
+    parser.add_argument("--flashcards", type=int, default=5, metavar="N",
+                        help="written questions (the flashcards prompt) per sheet")
+    parser.add_argument("--direction", choices=["after", "before", "random"], default="random",
+                        help="which way round multiple choice questions are asked")
+    parser.add_argument("--seed", type=int, default=0, help="the same seed always makes the same sheets")
+    parser.add_argument("--processes", type=int, help="worker processes (default: one per CPU, 1 for none)")
+    parser.add_argument("--dialogue", default=DIALOGUE_FILE, metavar="FILE")
+    parser.add_argument("--events", default=EVENT_ORDER_FILE, metavar="FILE")
+    args = parser.parse_args()
+    try:
+        check_option_count(args.options)
+    except ValueError as error:
+        parser.error(str(error))
+
+    start_time = time.perf_counter()
+    try:
+        paths, duplicate_sheets = export_sheets(load_deck(args.dialogue, args.events), args.directory, args.sheets,
+                                                args.format, args.parts, args.multiple_choice, args.flashcards,
+                                                None if args.direction == "random" else args.direction, args.seed,
+                                                args.processes, n_options=args.options)
+    except (DuplicateScenesError, NotEnoughScenesError) as error:
+        parser.exit(1, f"{error.args[0]}\n")
+    log.info("sheets_exported", "Wrote {sheets} sheets to {paths} in {seconds:.1f} s", sheets=args.sheets,
+             paths=" and ".join(paths), seconds=time.perf_counter() - start_time)
+    if duplicate_sheets:
+        log.warning("duplicate_sheets", "{count} sheets ask the same questions as an earlier one, the selected parts "
+                    "can't make that many different sheets: ask for fewer, or fewer questions per sheet, or select "
+                    "more parts", count=duplicate_sheets)
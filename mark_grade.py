@@ -0,0 +1,111 @@
+"""
+Automatic grading of typed flashcard answers for the Mark Drama game.
+
+Every scene's dialogue is turned into a vector once: the character trigrams of each word (so "fishers" and "fisher"
+still share most of their features, and a typo only spoils a couple of them), each weighted by how rare it is across
+the deck (tf-idf), so words every scene has, like "jesus" and "the", count for little. A typed answer is turned into
+the same kind of vector and compared against the scene's with cosine similarity. Building the answer's vector and the
+dot product are both linear in the length of the answer, whatever the length of the scene's speech, so grading takes
+well under a millisecond.
+"""
+import math
+
+PASS_MARK = 0.4  # Similarity (0 to 1) an answer needs to be marked right
+
+# Punctuation (including the curly quotes word processors put in) is treated as a gap between words.
+_PUNCTUATION = str.maketrans({character: " " for character in "!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~‘’“”…"})
+
+
+def words(text):
+    return text.lower().translate(_PUNCTUATION).split()
+
+
+def word_trigrams(word):
+    # Padded with a space each side so short words and word starts/ends count too.
+    padded = f" {word} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def trigram_counts(text, known_words=None):
+    # {trigram: count} over every word. known_words is a {word: trigrams} memo, so a word is only ever cut up once.
+    if known_words is None:
+        known_words = {}
+    word_counts = {}
+    for word in words(text):
+        word_counts[word] = word_counts.get(word, 0) + 1
+    counts = {}
+    for word, word_count in word_counts.items():
+        trigrams = known_words.get(word)
+        if trigrams is None:
+            trigrams = known_words[word] = word_trigrams(word)
+        for trigram in trigrams:
+            counts[trigram] = counts.get(trigram, 0) + word_count
+    return counts
+
+
+class AnswerIndex:
+    # The precomputed vector of every scene in a dialogue dict ({part: {scene: [lines]}}), for grading typed answers.
+    def __init__(self, dialogue):
+        # Answers are mostly made of words the deck already has, so their trigrams are kept from indexing the scenes.
+        self.known_words = {}
+        scene_counts = {}
+        for scenes in dialogue.values():
+            for scene, lines in scenes.items():
+                text = "\n".join(lines)
+                scene_counts[scene] = (text, trigram_counts(text, self.known_words))
+
+        # Inverse document frequency: a trigram in every scene weighs 1, one in a single scene weighs 1 + ln(scenes).
+        document_frequency = {}
+        for _, counts in scene_counts.values():
+            for trigram in counts:
+                document_frequency[trigram] = document_frequency.get(trigram, 0) + 1
+        n_scenes = max(1, len(scene_counts))
+        self.idf = {trigram: 1 + math.log(n_scenes / frequency) for trigram, frequency in document_frequency.items()}
+        # Trigrams no scene has are as rare as can be, so typing nonsense pulls the similarity down.
+        self.unseen_idf = 1 + math.log(n_scenes)
+
+        self.scenes = {}  # {scene: (text, {trigram: weight}, norm)}
+        for scene, (text, counts) in scene_counts.items():
+            self.scenes[scene] = (text, *self.weigh(counts))
+
+    def weigh(self, counts):
+        # Turn trigram counts into tf-idf weights and their vector length.
+        idf = self.idf
+        unseen_idf = self.unseen_idf
+        weights = {trigram: count * idf.get(trigram, unseen_idf) for trigram, count in counts.items()}
+        return weights, math.sqrt(sum(weight * weight for weight in weights.values()))
+
+    def vector(self, scene, text):
+        # The scene's precomputed vector, text being its lines joined with "\n". If the text has changed since the
+        # index was built (a hot reload, see mark_deck.DeckWatcher), the scene is indexed again, once. Comparing the
+        # text is a memcmp, far quicker than anything else grading does.
+        entry = self.scenes.get(scene)
+        if entry is None or entry[0] != text:
+            entry = self.scenes[scene] = (text, *self.weigh(trigram_counts(text, self.known_words)))
+        return entry[1], entry[2]
+
+    def similarity(self, scene, text, answer):
+        # Cosine similarity between a typed answer and the scene's text, from 0 (nothing alike) to 1. None if the
+        # scene has no lines to compare against.
+        scene_weights, scene_norm = self.vector(scene, text)
+        if not scene_norm:
+            return None
+        # The answer's weights, their length and the dot product, all in one pass over the answer's trigrams.
+        idf = self.idf
+        unseen_idf = self.unseen_idf
+        dot = 0.0
+        squares = 0.0
+        for trigram, count in trigram_counts(answer, self.known_words).items():
+            weight = count * idf.get(trigram, unseen_idf)
+            squares += weight * weight
+            dot += weight * scene_weights.get(trigram, 0.0)
+        if not squares:
+            return 0.0
+        return dot / (scene_norm * math.sqrt(squares))
+
+    def grade(self, scene, text, answer, pass_mark=PASS_MARK):
+        # (similarity, correct), or None if there's nothing to grade against.
+        similarity = self.similarity(scene, text, answer)
+        if similarity is None:
+            return None
+        return similarity, similarity >= pass_mark
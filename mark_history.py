@@ -0,0 +1,159 @@
+"""
+Answer history for the Mark Drama game, appended to history.txt.
+
+Every graded answer becomes one JSON line:
+    {"mode": "flashcards", "scene": "...", "correct": true, "asked": 1760000000.1, "answered": 1760000004.6, "ms": 4500}
+
+Answers are handed to a background writer thread through a queue, so grading never waits on the disk. The thread
+writes them in batches: when enough have built up, when the log has been idle for a couple of seconds, or on close.
+
+Old answers can be rolled up into per-scene totals to keep the file small:
+    python mark_history.py compact --days 30
+Compacted totals are kept in the same file as lines with "aggregate": true, in front of the answers that are left.
+"""
+import json
+import os
+import queue
+import threading
+import time
+
+from mark_log import log
+
+HISTORY_FILE = "history.txt"
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+class HistoryLog:
+    def __init__(self, path=HISTORY_FILE, batch_size=64, flush_interval=2.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, mode, scene, correct, asked, answered):
+        # Called on every graded answer, so it does nothing but queue the answer. asked/answered are time.time()s.
+        self._queue.put((mode, scene, correct, asked, answered))
+
+    def flush(self):
+        # Ask the writer to write whatever it has now. Doesn't wait for it.
+        self._queue.put(_FLUSH)
+
+    def close(self):
+        # Write everything still queued and stop the writer.
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+
+    def _run(self):
+        batch = []
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval if batch else None)
+            except queue.Empty:
+                item = _FLUSH
+            if item is _FLUSH or item is _CLOSE:
+                self._write(batch)
+                batch = []
+                if item is _CLOSE:
+                    return
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+
+    def _write(self, batch):
+        if not batch:
+            return
+        lines = [json.dumps({"mode": mode, "scene": scene, "correct": correct, "asked": round(asked, 3),
+                             "answered": round(answered, 3), "ms": round((answered - asked) * 1000)}) + "\n"
+                 for mode, scene, correct, asked, answered in batch]
+        try:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.writelines(lines)
+        except OSError as error:
+            log.error("history_write_failed", "Couldn't write {answers} answers to {path}: {error}",
+                      answers=len(lines), path=self.path, error=str(error))
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Compaction
+
+def read_history(path=HISTORY_FILE):
+    # Every entry in the log, oldest first. Lines that aren't valid JSON (say, cut off by a crash) are skipped.
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+
+def _add_to_totals(totals, entry):
+    if entry.get("aggregate"):
+        attempts, correct, total_ms = entry["attempts"], entry["correct"], entry["total_ms"]
+        first, last = entry["first"], entry["last"]
+    else:
+        attempts, correct, total_ms = 1, int(bool(entry["correct"])), entry["ms"]
+        first, last = entry["asked"], entry["answered"]
+    key = (entry["mode"], entry["scene"])
+    total = totals.get(key)
+    if total is None:
+        totals[key] = {"aggregate": True, "mode": key[0], "scene": key[1], "attempts": attempts, "correct": correct,
+                       "total_ms": total_ms, "first": first, "last": last}
+        return
+    total["attempts"] += attempts
+    total["correct"] += correct
+    total["total_ms"] += total_ms
+    total["first"] = min(total["first"], first)
+    total["last"] = max(total["last"], last)
+
+
+def compact(path=HISTORY_FILE, older_than_days=30, now=None):
+    # Roll answers older than the cut-off (and any earlier totals) into one total per mode and scene, keep newer
+    # answers as they are. Don't run this while the app is writing to the same file.
+    # Returns (answers rolled up, answers kept).
+    cutoff = (time.time() if now is None else now) - older_than_days * 24 * 60 * 60
+    totals = {}
+    kept = []
+    rolled_up = 0
+    for entry in read_history(path):
+        if entry.get("aggregate") or entry["answered"] < cutoff:
+            rolled_up += not entry.get("aggregate")
+            _add_to_totals(totals, entry)
+        else:
+            kept.append(entry)
+    if not totals and not kept:
+        return 0, 0
+
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        file.writelines(json.dumps(entry) + "\n" for entry in [*totals.values(), *kept])
+    os.replace(temp_path, path)
+    return rolled_up, len(kept)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mark Drama answer history")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="roll old answers up into per-scene totals")
+    compact_parser.add_argument("--days", type=float, default=30, help="keep answers newer than this as they are")
+    compact_parser.add_argument("--path", default=HISTORY_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        rolled_up, kept = compact(args.path, args.days)
+        print(f"Rolled {rolled_up} answers into per-scene totals, kept {kept} newer answers as they are.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Opt-in latency measurement for the Mark Drama game's Tk callbacks (python mark_drama.py --latency [FILE]).
+
+LatencyRecorder.instrument swaps chosen methods of an object for timed wrappers, as instance attributes, so nothing
+is wrapped (and nothing costs anything) unless it's switched on. Each callback gets a LatencyHistogram: log-scale
+buckets, four to every doubling, so recording a call is a frexp and a list increment, memory stays the same however
+many calls there are, and percentiles are good to within about 6%.
+
+Given the Tk root, the recorder also measures how long after the click the app was idle again, which includes
+redrawing the window; "stutter" that doesn't show up in the callback itself shows up there.
+"""
+import json
+import math
+import time
+
+SUB_BUCKETS = 4  # Buckets per doubling of latency
+N_BUCKETS = 40 * SUB_BUCKETS  # Up to 2^40 microseconds, far more than any callback will ever take
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        mantissa, exponent = math.frexp(seconds * 1e6)  # microseconds = mantissa * 2 ** exponent, 0.5 <= mantissa < 1
+        bucket = max(0, exponent * SUB_BUCKETS + int((mantissa - 0.5) * 2 * SUB_BUCKETS))
+        self.buckets[min(bucket, N_BUCKETS - 1)] += 1
+
+    @staticmethod
+    def bucket_limit(bucket):
+        # The top of a bucket, in seconds.
+        exponent, sub_bucket = divmod(bucket, SUB_BUCKETS)
+        return (0.5 + (sub_bucket + 1) / (2 * SUB_BUCKETS)) * 2.0 ** exponent / 1e6
+
+    def percentile(self, fraction):
+        # The latency `fraction` of calls took no longer than, in seconds: the middle of the bucket it falls in.
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                bottom = self.bucket_limit(bucket - 1) if bucket else 0.0
+                return min((bottom + self.bucket_limit(bucket)) / 2, self.max)
+        return self.max
+
+    def summary(self):
+        # Everything in milliseconds.
+        return {"calls": self.count, "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+                "p50_ms": self.percentile(0.5) * 1000, "p90_ms": self.percentile(0.9) * 1000,
+                "p99_ms": self.percentile(0.99) * 1000, "max_ms": self.max * 1000}
+
+
+class LatencyRecorder:
+    def __init__(self, root=None, clock=time.perf_counter):
+        # With a Tk root, each callback also gets a "<name> until idle" histogram.
+        self.root = root
+        self.clock = clock
+        self.histograms = {}  # {name: LatencyHistogram}
+
+    def histogram(self, name):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        return histogram
+
+    def wrap(self, name, func):
+        histogram = self.histogram(name)
+        clock = self.clock
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.record(clock() - start)
+                if self.root is not None:
+                    idle = self.histogram(f"{name} until idle")
+                    self.root.after_idle(lambda: idle.record(clock() - start))
+
+        timed.__wrapped__ = func
+        return timed
+
+    def instrument(self, obj, names):
+        # Replace obj.<name> with a timed wrapper for each name. Widgets must be given their commands afterwards,
+        # e.g. command=self.update_mode1_question, or look them up when called, e.g. lambda: self.check_mode2_answer(i).
+        for name in names:
+            setattr(obj, name, self.wrap(name, getattr(obj, name)))
+
+    def report(self):
+        lines = [f"{'Callback latency (ms)':<44} {'calls':>7} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}"]
+        for name, histogram in sorted(self.histograms.items()):
+            if histogram.count:
+                summary = histogram.summary()
+                lines.append(f"{name:<44} {summary['calls']:>7} {summary['mean_ms']:>8.2f} {summary['p50_ms']:>8.2f} "
+                             f"{summary['p90_ms']:>8.2f} {summary['p99_ms']:>8.2f} {summary['max_ms']:>8.2f}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        # The report as a table, or as JSON (summaries plus the raw buckets) if path ends in .json
+        if path.endswith(".json"):
+            data = {name: {**histogram.summary(), "buckets": histogram.buckets}
+                    for name, histogram in sorted(self.histograms.items()) if histogram.count}
+            text = json.dumps({"sub_buckets": SUB_BUCKETS, "callbacks": data})
+        else:
+            text = self.report() + "\n"
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
@@ -0,0 +1,172 @@
+"""
+Load test for the classroom server (mark_server.py): a class of simulated students drilling at once, each on a
+keep-alive connection of their own, asking for a question, answering it and asking for the next as fast as the server
+allows. Prints requests per second and latency percentiles for each kind of request.
+
+    python mark_loadtest.py [--clients 50] [--seconds 10] [--mode both] [--url http://127.0.0.1:8000]
+
+Without --url a server is started in a subprocess on a free port (with --no-reload, so it's only serving) and stopped
+afterwards. The students share one process and one core here, so with a lot of them the test itself can be the
+bottleneck; if the client CPU is pegged, run two of these against one --url and add the results up.
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from mark_latency import LatencyHistogram
+
+MODES = ("flashcards", "multiple_choice")
+
+
+class Client:
+    # The bare minimum of HTTP/1.1 to talk to mark_server over one keep-alive connection.
+    def __init__(self, host, port, histograms):
+        self.host = host
+        self.port = port
+        self.histograms = histograms  # {request kind: LatencyHistogram}, shared by every client
+        self.errors = 0
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, kind, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else b""
+        start = time.perf_counter()
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n\r\n"
+                          .encode("latin-1") + body)
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        length = 0
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        data = json.loads(await self.reader.readexactly(length)) if length else None
+        self.histograms[kind].record(time.perf_counter() - start)
+        status = int(status_line.split(" ")[1])
+        if status >= 400:
+            self.errors += 1
+        return status, data
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def student(client, parts, modes, rng, deadline):
+    # Start a session, answer every question (right or wrong at random), end it, start another, until the deadline.
+    await client.connect()
+    try:
+        while time.perf_counter() < deadline:
+            mode = rng.choice(modes)
+            status, created = await client.request("start", "POST", "/sessions",
+                                                   {"mode": mode, "parts": parts, "ordered": False,
+                                                    "seed": rng.getrandbits(63)})
+            if status != 201:
+                raise RuntimeError(f"Couldn't start a {mode} session: {created}")
+            path = f"/sessions/{created['session']}"
+            while time.perf_counter() < deadline:
+                _, question = await client.request("question", "GET", f"{path}/question")
+                if question.get("finished", True):
+                    break
+                if mode == "multiple_choice":
+                    answer = {"choice": rng.randrange(len(question["options"]))}
+                elif rng.random() < 0.5:
+                    answer = {"answer": question["scene"]}
+                else:
+                    answer = {"correct": rng.random() < 0.5}
+                await client.request("answer", "POST", f"{path}/answer", answer)
+            await client.request("end", "DELETE", path)
+    finally:
+        client.close()
+
+
+async def run(host, port, clients, seconds, modes, seed):
+    histograms = {kind: LatencyHistogram() for kind in ("start", "question", "answer", "end")}
+    deck = Client(host, port, {"deck": LatencyHistogram()})
+    await deck.connect()
+    _, info = await deck.request("deck", "GET", "/deck")
+    deck.close()
+    parts = [part["part"] for part in info["parts"]]
+    if not parts:
+        raise SystemExit("The server's deck is empty")
+
+    students = [Client(host, port, histograms) for _ in range(clients)]
+    rngs = [random.Random(seed + number) for number in range(clients)]
+    start = time.perf_counter()
+    deadline = start + seconds
+    await asyncio.gather(*(student(client, parts, modes, rng, deadline) for client, rng in zip(students, rngs)))
+    elapsed = time.perf_counter() - start
+
+    total = sum(histogram.count for histogram in histograms.values())
+    errors = sum(client.errors for client in students)
+    print(f"{clients} clients for {elapsed:.1f} s: {total} requests, {total / elapsed:,.0f} requests/s, "
+          f"{errors} errors")
+    print(f"{'latency (ms)':<12} {'requests':>9} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for kind, histogram in histograms.items():
+        if histogram.count:
+            summary = histogram.summary()
+            print(f"{kind:<12} {summary['calls']:>9} {summary['mean_ms']:>8.2f} {summary['p50_ms']:>8.2f} "
+                  f"{summary['p90_ms']:>8.2f} {summary['p99_ms']:>8.2f} {summary['max_ms']:>8.2f}")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, server_args):
+    # mark_server.py in a subprocess, once it's accepting connections.
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mark_server.py")
+    process = subprocess.Popen([sys.executable, script, "--port", str(port), "--no-reload", "--log-level", "warning",
+                                *server_args])
+    give_up = time.perf_counter() + 30
+    while True:
+        if process.poll() is not None:
+            raise SystemExit("The server didn't start")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            if time.perf_counter() > give_up:
+                process.kill()
+                raise SystemExit("The server didn't start")
+            time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test the Mark Drama classroom server")
+    parser.add_argument("--url", help="a running server, e.g. http://127.0.0.1:8000 (default: start one)")
+    parser.add_argument("--clients", type=int, default=50, help="how many students drill at once")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--mode", choices=[*MODES, "both"], default="both")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seeds the students' sessions and answers, so runs do the same work and are comparable")
+    parser.add_argument("server_args", nargs="*",
+                        help="passed on to the server this starts, after --, e.g. -- --dialogue FILE --events FILE")
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = "127.0.0.1", free_port()
+        server = start_server(port, args.server_args)
+    try:
+        asyncio.run(run(host, port, args.clients, args.seconds, MODES if args.mode == "both" else (args.mode,),
+                        args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
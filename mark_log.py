@@ -0,0 +1,127 @@
+"""
+Diagnostics for the Mark Drama game: a small structured event log instead of print().
+
+Every entry is an event name plus fields, e.g.
+    log.info("session_started", "Launching {mode} with parts: {parts}", mode="Flashcards", parts=[1, 2])
+The message is a str.format template that's only filled in if the entry is actually written, and a level that's
+switched off is a do-nothing function, so debug entries in the question loop cost a call and nothing more.
+
+Entries go to the console (message only, like print() used to) and optionally to a JSON-lines file, one object per
+entry with the time, level, event and fields. The windowed (console=False) build has no console, so it logs to
+LOG_FILE instead; see mark_drama.py.
+
+The stdlib logging module would do, but importing it costs more than this whole module, and startup time matters here
+(see mark_bench.py imports); json and threading are only imported once there's a file to write to.
+"""
+import sys
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning", ERROR: "error"}
+LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+
+LOG_FILE = "mark_drama_log.jsonl"
+
+
+def _ignore(*args, **kwargs):
+    pass
+
+
+class ConsoleSink:
+    # The message on its own, with "Warning: "/"Error: " in front for those levels. stream is looked up on every write
+    # (sys.stdout by default), so redirecting stdout works, and a windowed build with no stdout writes nothing.
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def write(self, entry, message):
+        stream = self.stream if self.stream is not None else sys.stdout
+        if stream is None:
+            return
+        level = entry["level"]
+        prefix = f"{level.capitalize()}: " if level in ("warning", "error") else ""
+        print(prefix + message, file=stream)
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink:
+    # One JSON object per line, appended to path. Line-buffered so a crash loses nothing, and locked because the
+    # history writer and deck loader threads log too. Fields that aren't JSON (exceptions, paths) are written as str().
+    def __init__(self, path):
+        import json
+        import threading
+
+        self._dumps = json.dumps
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def write(self, entry, message):
+        line = self._dumps({**entry, "message": message}, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class EventLog:
+    def __init__(self, level=INFO, sinks=None):
+        self.sinks = [ConsoleSink()] if sinks is None else list(sinks)
+        self.level = level
+        self.set_level(level)
+
+    def set_level(self, level):
+        # Levels below this one become _ignore, so callers never have to check whether they're switched on.
+        self.level = level
+        for value, name in LEVEL_NAMES.items():
+            setattr(self, name, self._emitter(value) if value >= level else _ignore)
+
+    def _emitter(self, level):
+        # event and message are positional-only, so any name can be a field.
+        def emit(event, message="", /, **fields):
+            self.write(level, event, message, fields)
+        return emit
+
+    def enabled(self, level):
+        # For the odd entry whose fields are expensive to work out in the first place.
+        return level >= self.level
+
+    def write(self, level, event, message, fields):
+        # time, level, event and message are the log's own keys, a field with one of those names isn't written out.
+        entry = {**fields, "time": round(time.time(), 3), "level": LEVEL_NAMES[level], "event": event}
+        # Formatted once, here, and only because something is going to be written.
+        text = message.format(**fields) if message else event
+        for sink in self.sinks:
+            try:
+                sink.write(entry, text)
+            except (OSError, ValueError):
+                # A closed or broken sink must never take a button click down with it.
+                pass
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+log = EventLog()
+
+
+def configure(level=INFO, json_path=None, console=True):
+    # Set up the shared log for the app: the level, a JSON-lines file if json_path is given, and the console unless
+    # console is False.
+    log.close()
+    log.sinks = [ConsoleSink()] if console else []
+    if json_path is not None:
+        log.add_sink(JsonLinesSink(json_path))
+    log.set_level(level)
+    return log
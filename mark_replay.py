@@ -0,0 +1,88 @@
+"""
+Replays recorded Mark Drama sessions through the engine, to time them and to catch changes in what they do.
+
+Record some sessions while playing, one JSON line each:
+    python mark_drama.py --record sessions.jsonl [--seed 42]
+then play them again, as often as you like, on the current deck and code:
+    python mark_replay.py sessions.jsonl [--repeat 5] [--latency FILE]
+
+A seeded session asks the same questions every time it's given the same answers (see mark_engine.SessionRecording),
+so every replay does exactly the same work and two runs, or two commits, can be compared like for like: check out each
+side of a latency regression and bisect on the numbers this prints. A recording that plays out differently (a
+different question, or an answer graded differently) is reported and the exit status is 1.
+"""
+import json
+import time
+
+from mark_engine import FLASHCARDS, MULTIPLE_CHOICE, ReplayError, SessionRecording
+from mark_latency import LatencyRecorder
+
+# The session methods whose time is recorded, per mode. Each answer is timed once: auto_mark doesn't go through mark.
+TIMED_METHODS = {FLASHCARDS: ["next_question", "mark", "auto_mark"], MULTIPLE_CHOICE: ["next_question", "answer"]}
+
+
+def append_recording(path, recording):
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(recording.to_dict()) + "\n")
+
+
+def load_recordings(path):
+    with open(path, encoding="utf-8") as file:
+        return [SessionRecording.from_dict(json.loads(line)) for line in file if line.strip()]
+
+
+def replay_all(engine, recordings, recorder=None):
+    # Replay every recording once, with the time spent in each session method going into recorder's histograms.
+    # Returns (seconds, [(recording number, ReplayError)]).
+    failures = []
+    start = time.perf_counter()
+    for number, recording in enumerate(recordings, 1):
+        session = engine.start_recorded(recording)
+        if recorder is not None:
+            recorder.instrument(session, TIMED_METHODS[recording.mode])
+        try:
+            engine.replay(recording, session)
+        except ReplayError as error:
+            failures.append((number, error))
+    return time.perf_counter() - start, failures
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    from mark_deck import DIALOGUE_FILE, EVENT_ORDER_FILE, load_deck
+    from mark_engine import QuizEngine
+
+    parser = argparse.ArgumentParser(description="Replay recorded Mark Drama sessions")
+    parser.add_argument("recordings", help="a file of recorded sessions, see mark_drama.py --record")
+    parser.add_argument("--repeat", type=int, default=5, help="replay them all this many times and report the best")
+    parser.add_argument("--latency", metavar="FILE",
+                        help="write the per-method latency report to FILE (as JSON if FILE ends in .json)")
+    parser.add_argument("--dialogue", default=DIALOGUE_FILE, metavar="FILE")
+    parser.add_argument("--events", default=EVENT_ORDER_FILE, metavar="FILE")
+    args = parser.parse_args()
+
+    recordings = load_recordings(args.recordings)
+    engine = QuizEngine(*load_deck(args.dialogue, args.events))
+    # Indexes are built up front, or the first run would be timing that.
+    engine.dialogue_store()
+    engine.answer_index()
+
+    recorder = LatencyRecorder()
+    runs = []
+    failures = []  # [(run, recording number, ReplayError)], from every run
+    for run in range(1, max(1, args.repeat) + 1):
+        seconds, run_failures = replay_all(engine, recordings, recorder)
+        runs.append(seconds)
+        failures.extend((run, number, error) for number, error in run_failures)
+    answers = sum(len(recording) for recording in recordings)
+    runs.sort()
+    print(f"Replayed {len(recordings)} sessions, {answers} answers, {len(runs)} times: best {runs[0] * 1000:.1f} ms, "
+          f"median {runs[len(runs) // 2] * 1000:.1f} ms")
+    print(recorder.report())
+    if args.latency:
+        recorder.dump(args.latency)
+    for run, number, error in failures:
+        print(f"Session {number} played out differently in run {run}: {error}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,140 @@
+"""
+Spaced repetition for the Mark Drama game, saved between runs in the user_data file.
+
+Every card (a scene, separately for each game mode) has a due time. Getting it right pushes the due time further out
+each time; getting it wrong brings it back to a minute from now. A session asks the most overdue card first and ends
+once nothing else is due, unless the player has chosen to study ahead, when cards that aren't due yet are asked too,
+soonest first. The cards for a session are kept in a heap keyed on due time, so picking the next one is O(log n)
+however big the deck.
+
+user_data is JSON: {"version": 1, "cards": {mode: {scene: [due, interval, streak]}}}, times in seconds since the epoch.
+"""
+import heapq
+import json
+import os
+import time
+
+from mark_log import log
+
+USER_DATA_FILE = "user_data"
+
+RETRY_DELAY = 60  # seconds until a card that was got wrong is due again
+FIRST_INTERVAL = 24 * 60 * 60  # a card got right for the first time is due again the next day
+INTERVAL_GROWTH = 2.5  # and after that the gap grows by this much each time it's got right
+
+
+class Scheduler:
+    def __init__(self, path=USER_DATA_FILE, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self.cards = {}  # {mode: {scene: [due, interval, streak]}}
+        self.dirty = False
+        self.study_ahead = False  # Ask cards before they're due instead of ending the session
+
+    @classmethod
+    def load(cls, path=USER_DATA_FILE, clock=time.time):
+        scheduler = cls(path, clock)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                text = file.read()
+        except FileNotFoundError:
+            return scheduler
+        if text.strip():
+            try:
+                data = json.loads(text)
+                scheduler.cards = {mode: {scene: list(state) for scene, state in cards.items()}
+                                   for mode, cards in data["cards"].items()}
+            except (ValueError, KeyError, TypeError, AttributeError) as error:
+                # Don't lose the rest of the app over a damaged progress file, just start the schedule again.
+                log.warning("schedule_damaged",
+                            "Couldn't read the spaced repetition schedule in {path}, starting a new one: {error}",
+                            path=path, error=str(error))
+        return scheduler
+
+    def save(self):
+        if not self.dirty:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            # dumps then one write, json.dump writes every little piece separately.
+            file.write(json.dumps({"version": 1, "cards": self.cards}, separators=(",", ":")))
+        os.replace(temp_path, self.path)
+        self.dirty = False
+
+    def due(self, mode, scene):
+        # New cards are due straight away (0 sorts before any real time).
+        state = self.cards.get(mode, {}).get(scene)
+        return state[0] if state else 0
+
+    def record(self, mode, scene, correct):
+        # Update a card after it's been answered and return its new due time.
+        now = self.clock()
+        state = self.cards.setdefault(mode, {}).setdefault(scene, [0, 0, 0])
+        if correct:
+            state[1] = FIRST_INTERVAL if state[1] <= 0 else state[1] * INTERVAL_GROWTH
+            state[2] += 1
+            state[0] = now + state[1]
+        else:
+            state[0], state[1], state[2] = now + RETRY_DELAY, 0, 0
+        self.dirty = True
+        return state[0]
+
+    def queue(self, mode, scenes):
+        return DueQueue(self, mode, scenes, self.study_ahead)
+
+
+class DueQueue:
+    # The cards of one session, most overdue first.
+    # Rescheduled cards are pushed again rather than moved inside the heap, so a heap entry only counts if its due time
+    # still matches _due; stale entries are dropped as they reach the top.
+    def __init__(self, scheduler, mode, scenes, ahead=False):
+        self.scheduler = scheduler
+        self.mode = mode
+        self.ahead = ahead
+        self._due = {}
+        self._heap = []
+        for order, scene in enumerate(scenes):
+            due = scheduler.due(mode, scene)
+            self._due[scene] = due
+            # order breaks ties (all the new cards) in deck order and keeps scenes themselves out of comparisons.
+            self._heap.append((due, order, scene))
+        heapq.heapify(self._heap)
+        self._pushes = len(self._heap)
+
+    def __len__(self):
+        return len(self._due)
+
+    def next_due(self):
+        # When the first card in the queue is (or was) due, None once they've all been got right.
+        heap = self._heap
+        while heap and self._due.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def next(self):
+        # The card that's been due longest, without taking it off the queue. None if none are due yet, unless studying
+        # ahead, when it's the one that will be due soonest.
+        due = self.next_due()
+        if due is None or (not self.ahead and due > self.scheduler.clock()):
+            return None
+        return self._heap[0][2]
+
+    def answered(self, scene, correct):
+        # Cards got right are done for this session. Cards got wrong go back in at their new due time.
+        due = self.scheduler.record(self.mode, scene, correct)
+        if correct:
+            self._due.pop(scene, None)
+        else:
+            self._due[scene] = due
+            self._pushes += 1
+            heapq.heappush(self._heap, (due, self._pushes, scene))
+
+    def sync(self, added, removed):
+        # Scenes added to or deleted from the deck mid-session (see mark_engine.QuestionPool.sync).
+        for scene in removed:
+            self._due.pop(scene, None)
+        for scene in added:
+            due = self.scheduler.due(self.mode, scene)
+            self._due[scene] = due
+            self._pushes += 1
+            heapq.heappush(self._heap, (due, self._pushes, scene))
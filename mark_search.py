@@ -0,0 +1,123 @@
+"""
+Full-text search over a deck's scene names and dialogue, for jumping to a scene or finding where a quote comes from.
+
+SearchIndex is an inverted index built once per deck: every word maps to the scenes it appears in and how often
+(a word in the scene's name counts TITLE_WEIGHT times), so a query only ever touches the scenes that contain its
+words, never the whole deck. Words are split the same way as for auto-grading (mark_grade.words). The last word of a
+query also matches as a prefix, so results come up while a word is still being typed.
+
+Results are ranked by tf-idf: rare words count for more than common ones, and a scene has to contain every word of
+the query to be listed.
+"""
+import heapq
+import math
+from bisect import bisect_left
+from collections import Counter
+
+from mark_grade import words
+
+TITLE_WEIGHT = 5  # A word in a scene's name counts as much as this many in its lines
+MAX_PREFIX_WORDS = 50  # The most words a prefix is expanded to, so a one-letter prefix can't match half the deck
+PREFIX_WEIGHT = 0.5  # A word that only starts with the last query word counts this much of an exact match
+
+
+class SearchIndex:
+    def __init__(self, dialogue):
+        # dialogue is {part: {scene: [lines]}}
+        self.dialogue = dialogue
+        self.scenes = []  # [(part, scene)], a scene's id is its position here
+        # {word: {scene id: term weight}}, the weight being 1 + ln(weighted count) so searching is only multiplying
+        self.postings = {}
+        postings = self.postings
+        for part, scenes in dialogue.items():
+            for scene, lines in scenes.items():
+                scene_id = len(self.scenes)
+                self.scenes.append((part, scene))
+                # Counter counts in C, so each word of a scene is only looked up in postings once.
+                counts = Counter(words("\n".join(lines)))
+                for word in words(scene):
+                    counts[word] += TITLE_WEIGHT
+                for word, count in counts.items():
+                    scene_weights = postings.get(word)
+                    if scene_weights is None:
+                        scene_weights = postings[word] = {}
+                    scene_weights[scene_id] = 1 + math.log(count)
+        # Sorted once, for prefix lookups with bisect.
+        self.vocabulary = sorted(postings)
+
+    def __len__(self):
+        return len(self.scenes)
+
+    def expand_prefix(self, prefix):
+        # Words in the deck starting with prefix, in alphabetical order, at most MAX_PREFIX_WORDS of them.
+        vocabulary = self.vocabulary
+        start = bisect_left(vocabulary, prefix)
+        matches = []
+        for word in vocabulary[start:start + MAX_PREFIX_WORDS]:
+            if not word.startswith(prefix):
+                break
+            matches.append(word)
+        return matches
+
+    def _term_weights(self, word, prefix):
+        # {scene id: term weight} for one query word. If it's a prefix, the best of the words it expands to, with a
+        # word that's only a prefix match worth PREFIX_WEIGHT of the whole word.
+        if not prefix:
+            return self.postings.get(word, {})
+        expansions = self.expand_prefix(word)
+        if expansions == [word]:
+            return self.postings[word]
+        merged = {}
+        for expansion in expansions:
+            factor = 1 if expansion == word else PREFIX_WEIGHT
+            for scene_id, weight in self.postings[expansion].items():
+                weight *= factor
+                if weight > merged.get(scene_id, 0):
+                    merged[scene_id] = weight
+        return merged
+
+    def search(self, query, limit=20):
+        # The best `limit` scenes for query, best first: [(part, scene, line, score)]. line is the scene's line that
+        # matches most of the query (or None if only the scene's name does).
+        query_words = words(query)
+        if not query_words:
+            return []
+        # Unless the query ends in a space, the last word might not be finished yet.
+        last_is_prefix = not query[-1:].isspace()
+        terms = [self._term_weights(word, last_is_prefix and i == len(query_words) - 1)
+                 for i, word in enumerate(query_words)]
+        if not all(terms):
+            return []
+
+        # Start from the word in the fewest scenes, so the candidates are as few as they'll ever be.
+        n_scenes = len(self.scenes)
+        terms.sort(key=len)
+        weighted = [(weights, 1 + math.log(n_scenes / len(weights))) for weights in terms]
+        rarest, rarest_idf = weighted[0]
+        others = weighted[1:]
+        scores = {}
+        for scene_id, weight in rarest.items():
+            score = rarest_idf * weight
+            for weights, idf in others:
+                other = weights.get(scene_id)
+                if other is None:
+                    break
+                score += idf * other
+            else:
+                scores[scene_id] = score
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [(*self.scenes[scene_id], self.best_line(scene_id, query_words), score) for scene_id, score in best]
+
+    def best_line(self, scene_id, query_words):
+        # Only run for the handful of results that are shown, so it can afford to look at each line.
+        part, scene = self.scenes[scene_id]
+        wanted = set(query_words[:-1])
+        last = query_words[-1]
+        best, best_hits = None, 0
+        for line in self.dialogue[part][scene]:
+            line_words = words(line)
+            hits = len(wanted.intersection(line_words)) + any(word.startswith(last) for word in line_words)
+            if hits > best_hits:
+                best, best_hits = line, hits
+        return best
@@ -0,0 +1,488 @@
+"""
+Classroom mode for the Mark Drama game: a small HTTP/JSON server so a whole class can drill the same deck from their
+browsers (python mark_server.py [--host 0.0.0.0] [--port 8000]), then open http://<host>:<port>/ in a browser.
+
+One deck is parsed when the server starts and shared by every session; each student gets their own FlashcardSession
+or MultipleChoiceSession from mark_engine, kept in memory under a random session id until it's ended or left idle
+for SESSION_IDLE_SECONDS. Everything runs on one asyncio loop, so the engine never sees two requests at once.
+
+The API, all JSON:
+    GET    /deck                       the parts, with how many scenes (flashcards) and events (multiple choice) each
+    POST   /sessions                   {"mode": "flashcards" | "multiple_choice", "parts": [1, 2], "ordered": false,
+                                        "direction": "after" | "before" | "random", "seed": optional}
+                                       -> {"session": id, "seed": seed, ...}
+    GET    /sessions/<id>              the score so far
+    DELETE /sessions/<id>              end the session
+    GET    /sessions/<id>/question     the question being asked, a new one once the last has been answered
+    GET    /sessions/<id>/answer       flashcards only: reveal the answer without marking anything
+    GET    /sessions/<id>/recording    the session's seed and answers so far, for mark_replay.py
+    POST   /sessions/<id>/answer       flashcards: {"answer": "typed text"} to grade it, or {"correct": true} to
+                                       self-mark; multiple choice: {"choice": index}
+
+Only the bits of HTTP/1.1 a browser or a load tester needs are spoken: Content-Length bodies, keep-alive, no TLS.
+It's for a classroom network, not the internet. See mark_loadtest.py for requests per second.
+"""
+import asyncio
+import json
+import secrets
+import time
+
+from mark_deck import DIALOGUE, DIALOGUE_FILE, EVENT_ORDER_FILE, NUMBER_MAP, load_watched_deck, warn_duplicates
+from mark_engine import AFTER, BEFORE, DuplicateScenesError, NotEnoughScenesError, QuizEngine, new_seed
+from mark_log import LEVELS, configure, log
+
+FLASHCARDS = "flashcards"
+MULTIPLE_CHOICE = "multiple_choice"
+DIRECTIONS = {"after": AFTER, "before": BEFORE, "random": None}
+
+SESSION_IDLE_SECONDS = 2 * 60 * 60  # Sessions nobody has touched for this long are thrown away
+MAX_SESSIONS = 10000
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error", 501: "Not Implemented",
+           503: "Service Unavailable"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Sessions
+
+class StudentSession:
+    # A session plus what the server needs to know about it: whether its question has been answered yet, so asking
+    # for the question twice (a page refresh, say) doesn't skip a card, and when it was last used.
+    __slots__ = ("mode", "session", "question", "pending", "last_used")
+
+    def __init__(self, mode, session):
+        self.mode = mode
+        self.session = session
+        self.question = None  # The scene (flashcards) or MultipleChoiceQuestion being asked
+        self.pending = False
+        self.last_used = time.monotonic()
+
+    def progress(self):
+        session = self.session
+        return {"mode": self.mode, "score": session.score, "total": session.total_questions,
+                "remaining": len(session.remaining), "finished": session.finished and not self.pending}
+
+
+def _flag(body, name, default):
+    value = body.get(name, default)
+    if not isinstance(value, bool):
+        raise HttpError(400, f"{name} must be true or false")
+    return value
+
+
+def _parts(body):
+    parts = body.get("parts")
+    if not isinstance(parts, list) or not parts:
+        raise HttpError(400, "parts must be a list of part numbers, e.g. [1, 2]")
+    for part in parts:
+        if type(part) is not int or part not in NUMBER_MAP:
+            raise HttpError(400, f"There's no part {part!r}")
+    return sorted(set(parts))
+
+
+class QuizServer:
+    def __init__(self, engine, watcher=None, reload_interval=1.0):
+        self.engine = engine
+        self.watcher = watcher  # A mark_deck.DeckWatcher, to pick up edits to the deck while the server runs
+        self.reload_interval = reload_interval
+        self.sessions = {}  # {session id: StudentSession}
+        self.requests = 0
+
+    # ---------------------------------------------------------------------------------------------------------------- #
+    # Routing
+
+    def dispatch(self, method, target, body):
+        # (status, payload) for one request. payload is a dict sent as JSON, or a str sent as the page.
+        path = target.partition("?")[0]
+        route = [segment for segment in path.split("/") if segment]
+        if not route:
+            self._allow(method, "GET")
+            return 200, PAGE
+        if route == ["deck"]:
+            self._allow(method, "GET")
+            return 200, self.deck_info()
+        if route[0] != "sessions" or len(route) > 3:
+            raise HttpError(404, f"Nothing at {path}")
+        if len(route) == 1:
+            self._allow(method, "POST")
+            return 201, self.create_session(self._json(body))
+
+        session_id = route[1]
+        student = self.sessions.get(session_id)
+        if student is None:
+            raise HttpError(404, "No such session, it may have ended or been idle too long")
+        student.last_used = time.monotonic()
+        if len(route) == 2:
+            self._allow(method, "GET", "DELETE")
+            if method == "DELETE":
+                del self.sessions[session_id]
+            return 200, student.progress()
+        if route[2] == "recording":
+            self._allow(method, "GET")
+            return 200, student.session.recording.to_dict()
+        if route[2] == "question":
+            self._allow(method, "GET")
+            return 200, self.question(student)
+        if route[2] == "answer":
+            self._allow(method, "GET", "POST")
+            if method == "GET":
+                return 200, self.reveal(student)
+            return 200, self.answer(student, self._json(body))
+        raise HttpError(404, f"Nothing at {path}")
+
+    @staticmethod
+    def _allow(method, *methods):
+        if method not in methods:
+            raise HttpError(405, f"Use {' or '.join(methods)} here")
+
+    @staticmethod
+    def _json(body):
+        try:
+            data = json.loads(body or b"{}")
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(400, "The request body isn't JSON") from None
+        if not isinstance(data, dict):
+            raise HttpError(400, "The request body must be a JSON object")
+        return data
+
+    # ---------------------------------------------------------------------------------------------------------------- #
+    # Handlers
+
+    def deck_info(self):
+        dialogue, events = self.engine.dialogue, self.engine.events
+        names = [name for name in NUMBER_MAP if isinstance(name, str) and (name in dialogue or name in events)]
+        return {"parts": [{"part": NUMBER_MAP[name], "name": name, "scenes": len(dialogue.get(name, ())),
+                           "events": len(events.get(name, ()))} for name in names]}
+
+    def create_session(self, body):
+        if len(self.sessions) >= MAX_SESSIONS:
+            self.expire_sessions()
+            if len(self.sessions) >= MAX_SESSIONS:
+                raise HttpError(503, "Too many sessions at once, try again later")
+        mode = body.get("mode", FLASHCARDS)
+        parts = _parts(body)
+        ordered = _flag(body, "ordered", False)
+        # Every session draws from a random.Random(seed) of its own and records its answers, see mark_replay.py
+        seed = body.get("seed")
+        if seed is None:
+            seed = new_seed()
+        elif type(seed) not in (int, str):
+            raise HttpError(400, "seed must be a number or a string")
+        try:
+            if mode == FLASHCARDS:
+                session = self.engine.start_flashcards(parts, ordered, auto_grade=True, seed=seed)
+            elif mode == MULTIPLE_CHOICE:
+                direction = body.get("direction", "after")
+                if direction not in DIRECTIONS:
+                    raise HttpError(400, f"direction must be one of {', '.join(DIRECTIONS)}")
+                session = self.engine.start_multiple_choice(parts, ordered, DIRECTIONS[direction], seed=seed)
+            else:
+                raise HttpError(400, f"mode must be {FLASHCARDS} or {MULTIPLE_CHOICE}")
+        except (DuplicateScenesError, NotEnoughScenesError) as error:
+            raise HttpError(409, error.args[0]) from None
+
+        session_id = secrets.token_urlsafe(12)
+        student = self.sessions[session_id] = StudentSession(mode, session)
+        log.debug("session_started", "Started {mode} session {session} with parts: {parts}", mode=mode,
+                  session=session_id, parts=parts)
+        return {"session": session_id, "seed": seed, **student.progress()}
+
+    def question(self, student):
+        session = student.session
+        if not student.pending:
+            student.question = session.next_question()
+            student.pending = student.question is not None
+        if not student.pending:
+            return {"finished": True, "score": session.score}
+        if student.mode == FLASHCARDS:
+            return {"finished": False, "scene": student.question}
+        question = student.question
+        return {"finished": False, "scene": question.scene, "direction": question.direction,
+                "prompt": question.prompt(), "options": question.options}
+
+    def reveal(self, student):
+        if student.mode != FLASHCARDS:
+            raise HttpError(405, "Only flashcards have an answer to reveal")
+        if not student.pending:
+            raise HttpError(409, "There's no question waiting for an answer, ask for one first")
+        text = student.session.reveal_text()
+        return {"answer": text or "", "blank": text is None}
+
+    def answer(self, student, body):
+        if not student.pending:
+            raise HttpError(409, "There's no question waiting for an answer, ask for one first")
+        session = student.session
+        if student.mode == MULTIPLE_CHOICE:
+            choice = body.get("choice")
+            if type(choice) is not int or not 0 <= choice < len(student.question.options):
+                raise HttpError(400, "choice must be the index of one of the options")
+            correct = session.answer(choice)
+            result = {"correct": correct, "correct_index": student.question.correct_index,
+                      "correct_answer": student.question.correct_answer}
+        elif "correct" in body:
+            correct = session.mark(_flag(body, "correct", False))
+            result = {"correct": correct, "similarity": None}
+        else:
+            answer = body.get("answer")
+            if not isinstance(answer, str):
+                raise HttpError(400, "Send the typed answer as {\"answer\": ...}, or mark it with {\"correct\": ...}")
+            graded = session.auto_mark(answer)
+            if graded is None:
+                # A blank scene, nothing to compare the answer with. The student has to mark it themselves.
+                return {"graded": False, **self.reveal(student)}
+            result = {"correct": graded[1], "similarity": round(graded[0], 3)}
+        student.pending = False
+        if student.mode == FLASHCARDS:
+            text = session.reveal_text()
+            result.update(answer=text or "", blank=text is None)
+        return {"graded": True, **result, "score": session.score, "finished": session.finished}
+
+    # ---------------------------------------------------------------------------------------------------------------- #
+    # Housekeeping
+
+    def expire_sessions(self):
+        cutoff = time.monotonic() - SESSION_IDLE_SECONDS
+        expired = [session_id for session_id, student in self.sessions.items() if student.last_used < cutoff]
+        for session_id in expired:
+            del self.sessions[session_id]
+        if expired:
+            log.info("sessions_expired", "Ended {count} idle sessions", count=len(expired))
+
+    def reload_deck(self):
+        # Like MarkDramaFlashcards.apply_deck_changes, for every session at once.
+        changes = self.watcher.poll()
+        if not changes:
+            return
+        log.info("deck_reloaded", "Reloaded {parts} from the knowledge base",
+                 parts=", ".join(part for parts in changes.values() for part in parts))
+        self.engine.duplicate_scenes = self.watcher.duplicates
+        if DIALOGUE in changes:
+            self.engine.dialogue_changed()
+        refused = 0
+        for student in self.sessions.values():
+            try:
+                self.engine.reload_session(student.session)
+            except (DuplicateScenesError, NotEnoughScenesError):
+                # Half-way through an edit, most likely. The session carries on with the event order it had.
+                refused += 1
+        if refused:
+            log.warning("session_reload_refused", "{count} multiple choice sessions are carrying on with the old "
+                        "event order", count=refused)
+
+    async def housekeeping(self):
+        last_expiry = time.monotonic()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            if self.watcher is not None:
+                try:
+                    self.reload_deck()
+                except Exception as error:
+                    log.error("deck_reload_failed", "Couldn't reload the deck: {error}", error=repr(error))
+            if time.monotonic() - last_expiry >= 60:
+                self.expire_sessions()
+                last_expiry = time.monotonic()
+
+    # ---------------------------------------------------------------------------------------------------------------- #
+    # HTTP
+
+    async def handle_connection(self, reader, writer):
+        # One connection, any number of requests on it (keep-alive) until the client closes it.
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    return
+                except asyncio.LimitOverrunError:
+                    writer.write(self.response(413, {"error": "Request headers too large"}, False))
+                    return
+                try:
+                    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                    method, target, version = request_line.split(" ")
+                except ValueError:
+                    writer.write(self.response(400, {"error": "Malformed request line"}, False))
+                    return
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                if "transfer-encoding" in headers:
+                    writer.write(self.response(501, {"error": "Send a Content-Length, not chunks"}, False))
+                    return
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= MAX_BODY_BYTES:
+                    writer.write(self.response(413 if length > 0 else 400, {"error": "Bad Content-Length"}, False))
+                    return
+                body = await reader.readexactly(length) if length else b""
+
+                writer.write(self.response(*self.handle(method, target, body), keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def handle(self, method, target, body):
+        self.requests += 1
+        try:
+            status, payload = self.dispatch(method, target, body)
+        except HttpError as error:
+            status, payload = error.status, {"error": error.message}
+        except Exception:
+            import traceback
+            log.error("request_failed", "{method} {target} failed:\n{traceback}", method=method, target=target,
+                      traceback=traceback.format_exc())
+            status, payload = 500, {"error": "Unexpected error, sorry!"}
+        log.debug("request", "{method} {target} -> {status}", method=method, target=target, status=status)
+        return status, payload
+
+    @staticmethod
+    def response(status, payload, keep_alive):
+        if isinstance(payload, str):
+            content_type, body = "text/html; charset=utf-8", payload.encode()
+        else:
+            content_type, body = "application/json", json.dumps(payload).encode()
+        head = (f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nCache-Control: no-store\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode("latin-1") + body
+
+    async def serve(self, host="127.0.0.1", port=8000):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+        housekeeping = asyncio.create_task(self.housekeeping())
+        address = server.sockets[0].getsockname()
+        log.info("server_started", "Serving the quiz on http://{host}:{port}/", host=address[0], port=address[1])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            housekeeping.cancel()
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# The page
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Mark Drama Game</title>
+<style>body{font-family:Helvetica,sans-serif;max-width:44em;margin:2em auto;padding:0 1em}
+textarea{width:100%;height:8em}pre{white-space:pre-wrap;background:#f4f4f4;padding:.5em}button{margin:.2em}</style>
+</head><body><h1>Mark Drama Game</h1>
+<div id="setup"><div id="parts"></div>
+<label><input type="checkbox" id="ordered"> In order</label>
+<p><button onclick="start('flashcards')">Flashcards</button>
+<button onclick="start('multiple_choice')">Multiple Choice</button></p></div>
+<div id="play" hidden><p id="score"></p><h2 id="prompt"></h2><div id="controls"></div><pre id="feedback" hidden></pre>
+<p><button id="next" onclick="ask()" hidden>Next Question</button></p></div>
+<script>
+let session = null;
+const $ = id => document.getElementById(id);
+async function call(method, path, body) {
+  const response = await fetch(path, {method, body: body && JSON.stringify(body)});
+  const data = await response.json();
+  if (!response.ok) { alert(data.error); throw new Error(data.error); }
+  return data;
+}
+function button(text, onclick) {
+  const b = document.createElement("button"); b.textContent = text; b.onclick = onclick; return b;
+}
+function show(text) { $("feedback").hidden = false; $("feedback").textContent = text; }
+function scored(data) {
+  $("score").textContent = `Score: ${data.score.correct}/${data.score.total}`;
+  $("controls").querySelectorAll("button,textarea").forEach(e => e.disabled = true);
+  $("next").hidden = false;
+}
+async function start(mode) {
+  const parts = [...document.querySelectorAll("#parts input:checked")].map(e => +e.value);
+  const data = await call("POST", "/sessions", {mode, parts, ordered: $("ordered").checked});
+  session = `/sessions/${data.session}`;
+  $("setup").hidden = true; $("play").hidden = false; $("score").textContent = "Score: 0/0";
+  ask();
+}
+async function ask() {
+  const q = await call("GET", `${session}/question`);
+  $("next").hidden = true; $("feedback").hidden = true; $("controls").replaceChildren();
+  if (q.finished) {
+    $("prompt").textContent = `Finished! ${q.score.correct}/${q.score.total}`;
+    $("controls").append(button("Play again", () => location.reload()));
+  } else if (q.options) {
+    $("prompt").textContent = q.prompt;
+    q.options.forEach((option, i) => $("controls").append(button(option, async () => {
+      const r = await call("POST", `${session}/answer`, {choice: i});
+      show(r.correct ? "Correct!" : `Wrong, it's ${r.correct_answer}`); scored(r);
+    })));
+  } else {
+    $("prompt").textContent = q.scene;
+    const typed = document.createElement("textarea");
+    const mark = correct => async () => { scored(await call("POST", `${session}/answer`, {correct})); };
+    $("controls").append(typed, button("Check", async () => {
+      const r = await call("POST", `${session}/answer`, {answer: typed.value});
+      if (!r.graded) { show(r.answer || "(Blank, nothing happens?)");
+        $("controls").append(button("I was right", mark(true)), button("I was wrong", mark(false))); return; }
+      show(`${r.correct ? "Correct" : "Not quite"} (${Math.round(r.similarity * 100)}% match)\\n\\n${r.answer}`);
+      scored(r);
+    }));
+  }
+}
+call("GET", "/deck").then(deck => deck.parts.forEach(p => {
+  const label = document.createElement("label");
+  label.innerHTML = `<input type="checkbox" value="${p.part}" checked> ${p.name} `; $("parts").append(label);
+}));
+</script></body></html>
+"""
+
+
+# -------------------------------------------------------------------------------------------------------------------- #
+# Running the server
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mark Drama Learning, classroom server")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="the address to listen on (0.0.0.0 to let the rest of the classroom network in)")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--dialogue", default=DIALOGUE_FILE, metavar="FILE")
+    parser.add_argument("--events", default=EVENT_ORDER_FILE, metavar="FILE")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always re-parse the knowledge base text files instead of using the compiled deck cache")
+    parser.add_argument("--no-reload", action="store_true",
+                        help="don't pick up edits to the knowledge base text files while the server is running")
+    parser.add_argument("--log-level", choices=list(LEVELS), default="info",
+                        help="the least serious diagnostics to show (debug includes every request)")
+    parser.add_argument("--log-file", metavar="FILE", help="also write diagnostics to FILE as JSON lines")
+    args = parser.parse_args()
+    configure(LEVELS[args.log_level], args.log_file)
+
+    (dialogue, events, duplicate_scenes), watcher = load_watched_deck(args.dialogue, args.events,
+                                                                      use_cache=not args.no_cache)
+    warn_duplicates(duplicate_scenes, args.events)
+    engine = QuizEngine(dialogue, events, duplicate_scenes)
+    # Built now rather than on the first student's request, or the first edit to the deck.
+    engine.dialogue_store()
+    engine.answer_index()
+    if args.no_reload:
+        watcher = None
+    else:
+        watcher.prepare()
+    try:
+        asyncio.run(QuizServer(engine, watcher).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass